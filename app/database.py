@@ -5,12 +5,17 @@ import os
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./youfyi.db")
 
-if DATABASE_URL.startswith("sqlite"):
+if DATABASE_URL.startswith("sqlite") and ":memory:" in DATABASE_URL:
+    # One shared connection, otherwise every connection sees its own empty database
     engine = create_engine(
         DATABASE_URL,
         connect_args={"check_same_thread": False},
         poolclass=StaticPool,
     )
+elif DATABASE_URL.startswith("sqlite"):
+    # A connection per session, so the background index dispatcher never
+    # shares a transaction with a request
+    engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
 else:
     engine = create_engine(DATABASE_URL, pool_pre_ping=True)
 
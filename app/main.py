@@ -1,8 +1,12 @@
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from app.database import Base, engine
-from app.routes import workspaces, assets, kits, sharing_links, rag
+from app.routes import workspaces, assets, uploads, kits, sharing_links, rag
+from app.services import indexing, jobs, stats  # noqa: F401  (register index and statistics maintenance handlers)
+from app.services import providers
 from fastapi.staticfiles import StaticFiles
+from starlette.concurrency import run_in_threadpool
 
 # Create tables
 Base.metadata.create_all(bind=engine)
@@ -21,11 +25,47 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
+@app.on_event("startup")
+def start_index_workers():
+    jobs.start_workers()
+
+
+@app.on_event("shutdown")
+def stop_index_workers():
+    jobs.stop_workers()
+
+
+@app.on_event("startup")
+async def warm_search_indexes():
+    # In the background, so the server accepts requests while the indexes fill
+    app.state.index_warmup = asyncio.create_task(run_in_threadpool(jobs.warm_up_indexes))
+
+
+@app.on_event("startup")
+async def start_upload_sweeper():
+    if uploads.UPLOAD_SWEEP_INTERVAL_SECONDS > 0:
+        app.state.upload_sweeper = asyncio.create_task(uploads.sweep_upload_sessions())
+
+
+@app.on_event("shutdown")
+async def stop_upload_sweeper():
+    sweeper = getattr(app.state, "upload_sweeper", None)
+    if sweeper is not None:
+        sweeper.cancel()
+
+
+@app.on_event("shutdown")
+async def close_llm_clients():
+    await providers.close_providers()
+
+
 # Include routers
 app.include_router(workspaces.router)
 app.include_router(assets.router)
+app.include_router(uploads.router)
 app.include_router(kits.router)
 app.include_router(sharing_links.router)
 app.include_router(rag.router)
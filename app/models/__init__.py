@@ -1,5 +1,5 @@
-from sqlalchemy import Column, String, Text, DateTime, Integer, ForeignKey, Boolean, Table
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, String, Text, DateTime, Integer, ForeignKey, Boolean, Table, UniqueConstraint, Index, JSON
+from sqlalchemy.orm import relationship, deferred
 from datetime import datetime
 import uuid
 from app.database import Base
@@ -16,6 +16,10 @@ asset_kit_association = Table(
 
 class Workspace(Base):
     __tablename__ = "workspaces"
+    __table_args__ = (
+        # Keyset pagination order
+        Index("ix_workspaces_created_id", "created_at", "id"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     name = Column(String, unique=True, index=True)
@@ -27,30 +31,91 @@ class Workspace(Base):
     assets = relationship("Asset", back_populates="workspace", cascade="all, delete-orphan")
     kits = relationship("Kit", back_populates="workspace", cascade="all, delete-orphan")
     sharing_links = relationship("WorkspaceSharingLink", back_populates="workspace", cascade="all, delete-orphan")
+    upload_sessions = relationship("UploadSession", cascade="all, delete-orphan")
 
 
 class Asset(Base):
     __tablename__ = "assets"
+    __table_args__ = (
+        # Keyset pagination order within a workspace, plus the common listing filters
+        Index("ix_assets_workspace_created_id", "workspace_id", "created_at", "id"),
+        Index("ix_assets_workspace_mime", "workspace_id", "mime_type"),
+        Index("ix_assets_workspace_type", "workspace_id", "asset_type"),
+        Index("ix_assets_workspace_size", "workspace_id", "file_size"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     workspace_id = Column(String, ForeignKey("workspaces.id"), nullable=False)
     name = Column(String, index=True)
     description = Column(Text, nullable=True)
-    content = Column(Text)  # File content or data (base64 for binary files)
+    content = deferred(Column(Text, nullable=True))  # Inline text content (uploaded files live in the blob store); loaded on access
+    blob_digest = Column(String(64), nullable=True, index=True)  # SHA-256 of the stored file bytes
+    text_content = deferred(Column(Text, nullable=True))  # Plain text extracted from an uploaded file at indexing time
     asset_type = Column(String)  # e.g., "document", "image", "video", "executable", "data"
     mime_type = Column(String, nullable=True)  # e.g., "image/png", "application/pdf", "video/mp4"
     file_size = Column(Integer, nullable=True)  # File size in bytes
     file_path = Column(String, nullable=True)  # Original file path or name
+    indexed_at = Column(DateTime, nullable=True)  # When the asset was last split into chunks
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     workspace = relationship("Workspace", back_populates="assets")
     kits = relationship("Kit", secondary=asset_kit_association, back_populates="assets")
+    chunks = relationship("Chunk", back_populates="asset", cascade="all, delete-orphan", order_by="Chunk.position")
+
+
+class Chunk(Base):
+    __tablename__ = "chunks"
+    __table_args__ = (
+        Index("ix_chunks_asset_position", "asset_id", "position"),
+    )
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    asset_id = Column(String, ForeignKey("assets.id"), nullable=False)
+    position = Column(Integer, nullable=False)  # Order of the chunk within the asset
+    start_offset = Column(Integer, nullable=False)  # Character offsets into the asset text
+    end_offset = Column(Integer, nullable=False)
+    token_count = Column(Integer, nullable=False)
+    text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    asset = relationship("Asset", back_populates="chunks")
+
+
+class IndexJob(Base):
+    __tablename__ = "index_jobs"
+    __table_args__ = (
+        # Dispatcher claims due jobs in order
+        Index("ix_index_jobs_status_run_after", "status", "run_after"),
+    )
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    asset_id = Column(String, nullable=False, index=True)  # Kept after the asset is deleted, like UploadSession.asset_id
+    status = Column(String, default="queued", nullable=False)  # "queued", "running", "done", "failed" or "cancelled"
+    attempts = Column(Integer, default=0, nullable=False)
+    error = Column(Text, nullable=True)  # Last failure, if any
+    run_after = Column(DateTime, default=datetime.utcnow, nullable=False)  # Retry backoff
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class Blob(Base):
+    __tablename__ = "blobs"
+    
+    digest = Column(String(64), primary_key=True)  # SHA-256, also the blob store key
+    size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, default=0, nullable=False)  # Number of assets pointing at this blob
+    created_at = Column(DateTime, default=datetime.utcnow)
 
 
 class Kit(Base):
     __tablename__ = "kits"
+    __table_args__ = (
+        # Keyset pagination order within a workspace
+        Index("ix_kits_workspace_created_id", "workspace_id", "created_at", "id"),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     workspace_id = Column(String, ForeignKey("workspaces.id"), nullable=False)
@@ -65,6 +130,21 @@ class Kit(Base):
     sharing_links = relationship("SharingLink", back_populates="kit", cascade="all, delete-orphan")
 
 
+class AssetStats(Base):
+    __tablename__ = "asset_stats"
+
+    # Maintained by app/services/stats.py whenever a flush changes a scope's assets or kits
+    scope = Column(String, primary_key=True)  # "workspace" or "kit"
+    scope_id = Column(String, primary_key=True)
+    asset_count = Column(Integer, default=0, nullable=False)
+    total_bytes = Column(Integer, default=0, nullable=False)
+    kit_count = Column(Integer, default=0, nullable=False)  # Kits in the workspace; 0 for a kit
+    mime_types = Column(JSON, nullable=False)  # [mime_type or null, count] pairs, most common first
+    largest = Column(JSON, nullable=False)  # Serialized assets, largest first (STATS_TOP_N)
+    newest = Column(JSON, nullable=False)  # Serialized assets, newest first (STATS_TOP_N)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
 class SharingLink(Base):
     __tablename__ = "sharing_links"
     
@@ -91,3 +171,36 @@ class WorkspaceSharingLink(Base):
     
     # Relationships
     workspace = relationship("Workspace", back_populates="sharing_links")
+
+
+class UploadSession(Base):
+    __tablename__ = "upload_sessions"
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    workspace_id = Column(String, ForeignKey("workspaces.id"), nullable=False)
+    filename = Column(String, nullable=False)
+    description = Column(Text, nullable=True)
+    mime_type = Column(String, nullable=True)
+    status = Column(String, default="open")  # "open", "committed" or "aborted"
+    asset_id = Column(String, nullable=True)  # Asset created on commit
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=True)
+
+    # Relationships
+    parts = relationship("UploadPart", back_populates="session", cascade="all, delete-orphan", order_by="UploadPart.part_number")
+
+
+class UploadPart(Base):
+    __tablename__ = "upload_parts"
+    __table_args__ = (UniqueConstraint("session_id", "part_number"),)
+
+    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    session_id = Column(String, ForeignKey("upload_sessions.id"), nullable=False)
+    part_number = Column(Integer, nullable=False)
+    size = Column(Integer, nullable=False)
+    digest = Column(String(64), nullable=False)  # SHA-256 of the part bytes
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    # Relationships
+    session = relationship("UploadSession", back_populates="parts")
@@ -1,22 +1,24 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Request, Response, Query
+from fastapi.responses import StreamingResponse, PlainTextResponse
+from sqlalchemy.orm import Session, undefer
 from app.database import get_db
-from app.models import Asset, Workspace
-from app.schemas import AssetCreate, AssetRead
-
-router = APIRouter(prefix="/assets", tags=["assets"])
-
-
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from app.database import get_db
-from app.models import Asset, Workspace
-from app.schemas import AssetCreate, AssetRead, AssetUpload
+from app.models import Asset, Workspace, Chunk, IndexJob
+from app.schemas import AssetCreate, AssetRead, AssetSummary, AssetUpload, IndexStatusRead
+from app.services.storage import blob_store, BlobNotFound, BlobWriter
+from app.services import events
+from app.services.blobs import acquire_written_blob, release_blob, collect_garbage
+from app.services import ranges
+from app.services.pagination import paginate, escape_like, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from app.services.sendfile import SendfileResponse, DOWNLOAD_MODE
+from starlette.concurrency import run_in_threadpool
 import base64
-from typing import Optional
+from typing import Optional, Union
 
 router = APIRouter(prefix="/assets", tags=["assets"])
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes read from the upload per iteration
+SNIFF_BYTES = 512  # Leading bytes inspected for mime type detection
+
 
 @router.post("/{workspace_id}", response_model=AssetRead, status_code=status.HTTP_201_CREATED)
 def create_asset(workspace_id: str, asset: AssetCreate, db: Session = Depends(get_db)):
@@ -28,6 +30,7 @@ def create_asset(workspace_id: str, asset: AssetCreate, db: Session = Depends(ge
     db_asset = Asset(workspace_id=workspace_id, **asset.model_dump())
     db.add(db_asset)
     db.commit()
+    events.emit(events.ASSET_CREATED, db=db, asset_id=db_asset.id)
     db.refresh(db_asset)
     return db_asset
 
@@ -49,18 +52,32 @@ async def upload_file(
     - Archives: .zip, .rar, .tar, .gz, .7z
     - Any other file type
     """
-    workspace = db.query(Workspace).filter(Workspace.id == workspace_id).first()
+    # Database and blob store calls are blocking, so they run in the threadpool
+    workspace = await run_in_threadpool(db.get, Workspace, workspace_id)
     if not workspace:
         raise HTTPException(status_code=404, detail="Workspace not found")
     
-    # Read file content
-    contents = await file.read()
-    
-    # Convert to base64 for storage
-    file_content_b64 = base64.b64encode(contents).decode('utf-8')
+    # Stream the upload into the blob store chunk by chunk so memory stays
+    # constant regardless of file size; digest and size are computed on the fly
+    writer = blob_store.writer()
+    head = b""
+    try:
+        while True:
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+            if not chunk:
+                break
+            if len(head) < SNIFF_BYTES:
+                head += chunk[:SNIFF_BYTES - len(head)]
+            await run_in_threadpool(writer.write, chunk)
+        digest = await run_in_threadpool(writer.commit, True)
+    except Exception:
+        await run_in_threadpool(writer.abort)
+        raise
     
-    # Determine asset type from mime type
+    # Determine asset type from mime type, sniffing content when the client didn't say
     mime_type = file.content_type or "application/octet-stream"
+    if mime_type == "application/octet-stream":
+        mime_type = _sniff_mime_type(head) or mime_type
     asset_type = _determine_asset_type(mime_type)
     
     # Create asset
@@ -68,27 +85,69 @@ async def upload_file(
         workspace_id=workspace_id,
         name=file.filename or "uploaded_file",
         description=description,
-        content=file_content_b64,
+        blob_digest=digest,
         asset_type=asset_type,
         mime_type=mime_type,
-        file_size=len(contents),
+        file_size=writer.size,
         file_path=file.filename
     )
     
     db.add(db_asset)
-    db.commit()
-    db.refresh(db_asset)
+    await run_in_threadpool(_commit_upload, db, writer)
+    await run_in_threadpool(events.emit, events.ASSET_CREATED, db=db, asset_id=db_asset.id)
+    await run_in_threadpool(db.refresh, db_asset)
     return db_asset
 
 
-@router.get("/{workspace_id}", response_model=list[AssetRead])
-def list_assets(workspace_id: str, db: Session = Depends(get_db)):
-    """List all assets in a workspace"""
+def _commit_upload(db: Session, writer: BlobWriter) -> None:
+    """Take the reference to the uploaded blob and commit the new asset."""
+    acquire_written_blob(db, writer)
+    db.commit()
+
+
+@router.get("/{workspace_id}", response_model=Union[list[AssetRead], list[AssetSummary]])
+def list_assets(
+    workspace_id: str,
+    response: Response,
+    include: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    asset_type: Optional[str] = None,
+    mime_type: Optional[str] = None,
+    min_size: Optional[int] = Query(None, ge=0),
+    max_size: Optional[int] = Query(None, ge=0),
+    name_prefix: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """List assets in a workspace, oldest first.
+    
+    Results are paginated: pass the `X-Next-Cursor` response header back as
+    `?cursor=` to get the next page. `mime_type` accepts a trailing wildcard
+    (e.g. `image/*`). Asset content is omitted unless requested with
+    `?include=content`.
+    """
     workspace = db.query(Workspace).filter(Workspace.id == workspace_id).first()
     if not workspace:
         raise HTTPException(status_code=404, detail="Workspace not found")
     
-    return db.query(Asset).filter(Asset.workspace_id == workspace_id).all()
+    query = db.query(Asset).filter(Asset.workspace_id == workspace_id)
+    if asset_type:
+        query = query.filter(Asset.asset_type == asset_type)
+    if mime_type:
+        if mime_type.endswith("/*"):
+            query = query.filter(Asset.mime_type.like(escape_like(mime_type[:-1]) + "%", escape="\\"))
+        else:
+            query = query.filter(Asset.mime_type == mime_type)
+    if min_size is not None:
+        query = query.filter(Asset.file_size >= min_size)
+    if max_size is not None:
+        query = query.filter(Asset.file_size <= max_size)
+    if name_prefix:
+        query = query.filter(Asset.name.like(escape_like(name_prefix) + "%", escape="\\"))
+    
+    if _include_content(include):
+        return paginate(query.options(undefer(Asset.content)), Asset, cursor, limit, response)
+    return [AssetSummary.model_validate(a) for a in paginate(query, Asset, cursor, limit, response)]
 
 
 @router.get("/asset/{asset_id}", response_model=AssetRead)
@@ -100,29 +159,130 @@ def get_asset(asset_id: str, db: Session = Depends(get_db)):
     return asset
 
 
+@router.get("/asset/{asset_id}/index", response_model=IndexStatusRead)
+def get_index_status(asset_id: str, db: Session = Depends(get_db)):
+    """Get the status of the asset's latest indexing job"""
+    indexed_at = db.query(Asset.indexed_at).filter(Asset.id == asset_id).scalar()
+    job = db.query(IndexJob).filter(IndexJob.asset_id == asset_id).order_by(IndexJob.created_at.desc()).first()
+    if job is None:
+        if not db.query(Asset.id).filter(Asset.id == asset_id).first():
+            raise HTTPException(status_code=404, detail="Asset not found")
+        return IndexStatusRead(asset_id=asset_id, status="none", indexed_at=indexed_at)
+    return IndexStatusRead(
+        asset_id=asset_id,
+        status=job.status,
+        attempts=job.attempts,
+        error=job.error,
+        indexed_at=indexed_at,
+        updated_at=job.updated_at
+    )
+
+
+@router.get("/asset/{asset_id}/text", response_class=PlainTextResponse)
+def get_asset_text(asset_id: str, db: Session = Depends(get_db)):
+    """Get the plain text of an asset, as extracted from its file at indexing time"""
+    asset = db.query(Asset).options(undefer(Asset.text_content)).filter(Asset.id == asset_id).first()
+    if not asset:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    if asset.file_path is None:
+        return asset.content or ""
+    if asset.indexed_at is None:
+        raise HTTPException(status_code=404, detail="Text has not been extracted yet")
+    return asset.text_content or ""
+
+
 @router.get("/asset/{asset_id}/download")
-def download_asset(asset_id: str, db: Session = Depends(get_db)):
-    """Download a file asset"""
-    from fastapi.responses import StreamingResponse
-    import io
-    
+def download_asset(asset_id: str, request: Request, db: Session = Depends(get_db)):
+    """Download a file asset.
+
+    Supports byte ranges (`Range`, `If-Range`; multiple ranges are returned as
+    multipart/byteranges) and conditional requests (`If-None-Match`,
+    `If-Modified-Since`) so clients can resume downloads and seek in media.
+    """
     asset = db.query(Asset).filter(Asset.id == asset_id).first()
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
     
-    # Decode base64 content
-    try:
-        file_content = base64.b64decode(asset.content)
-    except Exception as e:
-        raise HTTPException(status_code=500, detail="Failed to decode file content")
+    local_path = None
+    if asset.blob_digest:
+        digest = asset.blob_digest
+        try:
+            size = blob_store.size(digest)
+        except BlobNotFound:
+            raise HTTPException(status_code=500, detail="File content is missing from storage")
+        etag = f'"{digest}"'
+        read = lambda start, length: blob_store.iter_chunks(digest, start=start, length=length)
+        if DOWNLOAD_MODE == "sendfile":
+            # Filesystem blobs are served straight from the file descriptor
+            local_path = blob_store.local_path(digest)
+    else:
+        # Legacy rows keep base64 content inline
+        try:
+            file_content = base64.b64decode(asset.content)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail="Failed to decode file content")
+        size = len(file_content)
+        etag = f'W/"{asset.id}-{int(asset.updated_at.timestamp()) if asset.updated_at else 0}"'
+        read = lambda start, length: iter([file_content[start:start + length]])
+    
+    media_type = asset.mime_type or "application/octet-stream"
+    headers = {
+        "Accept-Ranges": "bytes",
+        "ETag": etag,
+        "Content-Disposition": f"attachment; filename={asset.file_path or asset.name}",
+    }
+    if asset.updated_at:
+        headers["Last-Modified"] = ranges.http_date(asset.updated_at)
     
-    # Create file-like object
-    file_obj = io.BytesIO(file_content)
+    if ranges.is_not_modified(request.headers, etag, asset.updated_at):
+        headers.pop("Content-Disposition")
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
     
+    range_header = request.headers.get("range")
+    if range_header and ranges.if_range_matches(request.headers.get("if-range"), etag, asset.updated_at):
+        try:
+            byte_ranges = ranges.parse_range_header(range_header, size)
+        except ranges.RangeNotSatisfiable:
+            return Response(
+                status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+                headers={"Content-Range": f"bytes */{size}", "Accept-Ranges": "bytes"}
+            )
+        if byte_ranges and len(byte_ranges) == 1:
+            start, end = byte_ranges[0]
+            headers["Content-Range"] = ranges.content_range(start, end, size)
+            headers["Content-Length"] = str(end - start + 1)
+            if local_path:
+                return SendfileResponse(
+                    local_path,
+                    offset=start,
+                    length=end - start + 1,
+                    status_code=status.HTTP_206_PARTIAL_CONTENT,
+                    media_type=media_type,
+                    headers=headers
+                )
+            return StreamingResponse(
+                read(start, end - start + 1),
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=media_type,
+                headers=headers
+            )
+        if byte_ranges:
+            boundary, length, body = ranges.multipart_byteranges(byte_ranges, size, media_type, read)
+            headers["Content-Length"] = str(length)
+            return StreamingResponse(
+                body,
+                status_code=status.HTTP_206_PARTIAL_CONTENT,
+                media_type=f"multipart/byteranges; boundary={boundary}",
+                headers=headers
+            )
+    
+    headers["Content-Length"] = str(size)
+    if local_path:
+        return SendfileResponse(local_path, length=size, media_type=media_type, headers=headers)
     return StreamingResponse(
-        iter([file_content]),
-        media_type=asset.mime_type or "application/octet-stream",
-        headers={"Content-Disposition": f"attachment; filename={asset.file_path or asset.name}"}
+        read(0, size),
+        media_type=media_type,
+        headers=headers
     )
 
 
@@ -132,11 +292,22 @@ def delete_asset(asset_id: str, db: Session = Depends(get_db)):
     asset = db.query(Asset).filter(Asset.id == asset_id).first()
     if not asset:
         raise HTTPException(status_code=404, detail="Asset not found")
+    digest = asset.blob_digest
+    workspace_id = asset.workspace_id
+    chunk_ids = [chunk_id for (chunk_id,) in db.query(Chunk.id).filter(Chunk.asset_id == asset_id)]
     db.delete(asset)
+    release_blob(db, digest)
     db.commit()
+    collect_garbage(db, [digest])
+    events.emit(events.ASSET_DELETED, db=db, asset_id=asset_id, workspace_id=workspace_id, chunk_ids=chunk_ids)
     return None
 
 
+def _include_content(include: Optional[str]) -> bool:
+    """Whether an `?include=` query parameter asks for asset content"""
+    return bool(include) and "content" in [part.strip() for part in include.split(",")]
+
+
 def _determine_asset_type(mime_type: str) -> str:
     """Determine asset type based on mime type"""
     if mime_type.startswith("image/"):
@@ -160,31 +331,42 @@ def _determine_asset_type(mime_type: str) -> str:
 
 
 
-@router.get("/{workspace_id}", response_model=list[AssetRead])
-def list_assets(workspace_id: str, db: Session = Depends(get_db)):
-    """List all assets in a workspace"""
-    workspace = db.query(Workspace).filter(Workspace.id == workspace_id).first()
-    if not workspace:
-        raise HTTPException(status_code=404, detail="Workspace not found")
-    
-    return db.query(Asset).filter(Asset.workspace_id == workspace_id).all()
-
-
-@router.get("/asset/{asset_id}", response_model=AssetRead)
-def get_asset(asset_id: str, db: Session = Depends(get_db)):
-    """Get a specific asset"""
-    asset = db.query(Asset).filter(Asset.id == asset_id).first()
-    if not asset:
-        raise HTTPException(status_code=404, detail="Asset not found")
-    return asset
+# Leading byte signatures for common formats, checked in order
+_MAGIC_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"%PDF-", "application/pdf"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\x1f\x8b", "application/gzip"),
+    (b"7z\xbc\xaf\x27\x1c", "application/x-7z-compressed"),
+    (b"Rar!\x1a\x07", "application/x-rar-compressed"),
+    (b"\x1aE\xdf\xa3", "video/webm"),
+    (b"ID3", "audio/mpeg"),
+    (b"OggS", "audio/ogg"),
+    (b"fLaC", "audio/flac"),
+    (b"MZ", "application/x-msdownload"),
+    (b"\x7fELF", "application/x-elf"),
+]
 
 
-@router.delete("/asset/{asset_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_asset(asset_id: str, db: Session = Depends(get_db)):
-    """Delete an asset"""
-    asset = db.query(Asset).filter(Asset.id == asset_id).first()
-    if not asset:
-        raise HTTPException(status_code=404, detail="Asset not found")
-    db.delete(asset)
-    db.commit()
+def _sniff_mime_type(head: bytes) -> Optional[str]:
+    """Guess a mime type from the first bytes of a file, or None if unknown"""
+    for signature, mime_type in _MAGIC_SIGNATURES:
+        if head.startswith(signature):
+            return mime_type
+    if head[4:8] == b"ftyp":
+        return "video/quicktime" if head[8:10] == b"qt" else "video/mp4"
+    if head.startswith(b"RIFF") and len(head) >= 12:
+        return {b"WEBP": "image/webp", b"WAVE": "audio/wav", b"AVI ": "video/x-msvideo"}.get(head[8:12])
+    if head and b"\x00" not in head:
+        # A full sniff window may end in the middle of a multi-byte character
+        sample = head[:-3] if len(head) >= SNIFF_BYTES else head
+        try:
+            sample.decode("utf-8")
+            return "text/plain"
+        except UnicodeDecodeError:
+            pass
     return None
@@ -1,8 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
+from sqlalchemy.orm import Session, selectinload
 from app.database import get_db
 from app.models import Kit, Asset, Workspace
-from app.schemas import KitCreate, KitUpdate, KitRead, KitMerge
+from app.schemas import KitCreate, KitUpdate, KitRead, KitReadWithContent, KitMerge
+from app.routes.assets import _include_content
+from app.services import events
+from app.services.pagination import paginate, escape_like, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from typing import Optional, Union
 
 router = APIRouter(prefix="/kits", tags=["kits"])
 
@@ -18,16 +22,19 @@ def merge_kits(merge_data: KitMerge, db: Session = Depends(get_db)):
     if not source_kits:
         raise HTTPException(status_code=404, detail="Source kits not found")
     
+    added = []
     for source in source_kits:
         # Add assets to target
         for asset in source.assets:
             if asset not in target.assets:
                 target.assets.append(asset)
+                added.append(asset.id)
         
         # Delete source
         db.delete(source)
     
     db.commit()
+    events.emit(events.KIT_ASSETS_CHANGED, db=db, kit_id=target.id, added=added, removed=[])
     db.refresh(target)
     return {"message": "Merge successful"}
 
@@ -52,23 +59,53 @@ def create_kit(workspace_id: str, kit: KitCreate, db: Session = Depends(get_db))
     return db_kit
 
 
-@router.get("/{workspace_id}", response_model=list[KitRead])
-def list_kits(workspace_id: str, db: Session = Depends(get_db)):
-    """List all kits in a workspace"""
+def _kit_assets_loader(include: Optional[str]):
+    """Eager-load kit assets in one query, with content only when requested"""
+    loader = selectinload(Kit.assets)
+    return loader.undefer(Asset.content) if _include_content(include) else loader
+
+
+@router.get("/{workspace_id}", response_model=Union[list[KitReadWithContent], list[KitRead]])
+def list_kits(
+    workspace_id: str,
+    response: Response,
+    include: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """List kits in a workspace, oldest first.
+    
+    Results are paginated via the `X-Next-Cursor` response header and
+    `?cursor=`. Asset content is omitted unless requested with
+    `?include=content`.
+    """
     workspace = db.query(Workspace).filter(Workspace.id == workspace_id).first()
     if not workspace:
         raise HTTPException(status_code=404, detail="Workspace not found")
     
-    return db.query(Kit).filter(Kit.workspace_id == workspace_id).all()
+    query = db.query(Kit).options(_kit_assets_loader(include)).filter(Kit.workspace_id == workspace_id)
+    if name_prefix:
+        query = query.filter(Kit.name.like(escape_like(name_prefix) + "%", escape="\\"))
+    kits = paginate(query, Kit, cursor, limit, response)
+    if _include_content(include):
+        return kits
+    return [KitRead.model_validate(k) for k in kits]
 
 
-@router.get("/kit/{kit_id}", response_model=KitRead)
-def get_kit(kit_id: str, db: Session = Depends(get_db)):
-    """Get a specific kit"""
-    kit = db.query(Kit).filter(Kit.id == kit_id).first()
+@router.get("/kit/{kit_id}", response_model=Union[KitReadWithContent, KitRead])
+def get_kit(kit_id: str, include: Optional[str] = None, db: Session = Depends(get_db)):
+    """Get a specific kit.
+    
+    Asset content is omitted unless requested with `?include=content`.
+    """
+    kit = db.query(Kit).options(_kit_assets_loader(include)).filter(Kit.id == kit_id).first()
     if not kit:
         raise HTTPException(status_code=404, detail="Kit not found")
-    return kit
+    if _include_content(include):
+        return kit
+    return KitRead.model_validate(kit)
 
 
 @router.put("/kit/{kit_id}", response_model=KitRead)
@@ -82,11 +119,17 @@ def update_kit(kit_id: str, kit_update: KitUpdate, db: Session = Depends(get_db)
         kit.name = kit_update.name
     if kit_update.description:
         kit.description = kit_update.description
+    added, removed = [], []
     if kit_update.asset_ids is not None:
         assets = db.query(Asset).filter(Asset.id.in_(kit_update.asset_ids)).all()
+        before = {asset.id for asset in kit.assets}
+        after = {asset.id for asset in assets}
+        added, removed = sorted(after - before), sorted(before - after)
         kit.assets = assets
     
     db.commit()
+    if added or removed:
+        events.emit(events.KIT_ASSETS_CHANGED, db=db, kit_id=kit.id, added=added, removed=removed)
     db.refresh(kit)
     return kit
 
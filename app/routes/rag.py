@@ -1,13 +1,29 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from app.database import get_db
-from app.models import Kit, SharingLink
-from app.schemas import RagQueryRequest, RagQueryResponse
-from app.services.rag import RAGService
+from app.models import Asset, Kit, SharingLink, Workspace, WorkspaceSharingLink
+from app.schemas import (
+    CacheStatsRead, ProviderStatusRead, RagBatchRequest, RagBatchResponse, RagBatchResult, RagQueryRequest, RagQueryResponse
+)
+from app.services.cache import CacheLookup, answer_cache, cache_key, content_version, normalize_query
+from app.services.coalescing import rag_flights
+from app.services.providers import llm_available, provider_status
+from app.services.rag import RAG_BATCH_MAX_QUERIES, Citation, RAGResult, RAGService, text_stream
+from app.services.retrieval import StageTimings
+from app.services.stats import get_stats, scope_summaries
 from datetime import datetime
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple
+import asyncio
+import json
 
 router = APIRouter(prefix="/rag", tags=["rag"])
 
+# Queries answered from asset metadata, without retrieval or an LLM
+QUICK_QUERIES = ["Count Assets", "File Types", "Recent Files", "Basic Summary", "Largest Files", "List PDFs", "List Images"]
+
+
 def fmt_size(n):
     """Format file size in human readable format"""
     if not n and n != 0:
@@ -19,267 +35,423 @@ def fmt_size(n):
     return f"{(n / 1024 / 1024):.2f} MB"
 
 
-# Helper to serialize asset
-def serialize_asset(a):
+class _Scope(NamedTuple):
+    """The assets a query is about: a kit's, or a whole workspace's via its sharing link"""
+    kind: str  # "kit" or "workspace"
+    id: str
+    kits_count: int  # Reported by "Basic Summary"; 0 via sharing links
+
+
+def _quick_answer(db: Session, query: str, scope: _Scope) -> Tuple[str, List[str]]:
+    """Answer one of the QUICK_QUERIES from the scope's precomputed statistics, without loading its assets"""
+    stats = get_stats(db, scope.kind, scope.id)
+    types = [mime_type for mime_type, _ in stats.mime_types if mime_type]
+
+    if query == "Count Assets":
+        answer = f"You have {stats.asset_count} assets in this workspace with a total size of {fmt_size(stats.total_bytes)}. File types include: {', '.join(types) or 'None'}"
+
+    elif query == "File Types":
+        answer = "Asset types in this workspace:\n\n"
+        for type_name, count in stats.mime_types:
+            answer += f"{type_name or 'Unknown'}: {count} files\n"
+
+    elif query == "Basic Summary":
+        more = stats.asset_count - len(stats.largest)
+        answer = f"Workspace Summary:\n\n" + \
+                f"• Total Assets: {stats.asset_count}\n" + \
+                f"• Total Size: {fmt_size(stats.total_bytes)}\n" + \
+                f"• File Types: {', '.join(types) or 'None'}\n" + \
+                f"• Kits Available: {scope.kits_count}\n\n" + \
+                "Largest Assets:\n" + \
+                "\n".join(f"• {a['name']} ({fmt_size(a['file_size'])}) - {a['mime_type'] or 'Unknown'}" for a in stats.largest) + \
+                (f"\n• ... and {more} more" if more > 0 else "")
+
+    # --- Structured Responses (JSON) ---
+    # Their sources are the assets they list
+    else:
+        if query == "Recent Files":
+            listed = stats.newest
+        elif query == "Largest Files":
+            listed = stats.largest
+        elif query == "List PDFs":
+            listed = scope_summaries(db, scope.kind, scope.id, Asset.mime_type == 'application/pdf')
+        else:  # "List Images"
+            listed = scope_summaries(db, scope.kind, scope.id, Asset.mime_type.like('image/%'))
+        return json.dumps(listed), [a["id"] for a in listed]
+
+    # Aggregates cite the largest assets, a bounded list kept with the statistics
+    return answer, [a["id"] for a in stats.largest]
+
+
+def _quick_answers(db: Session, queries: List[str], scope: _Scope) -> List[Tuple[str, List[str]]]:
+    return [_quick_answer(db, query, scope) for query in queries]
+
+
+def _scope_assets(db: Session, scope: _Scope) -> list:
+    """Load the assets of a scope, for retrieval"""
+    owner = db.get(Kit if scope.kind == "kit" else Workspace, scope.id)
+    return list(owner.assets)
+
+
+def _quick_response(query: str, answer: Tuple[str, List[str]], model: str) -> RagQueryResponse:
+    return RagQueryResponse(
+        query=query, answer=answer[0], sources=answer[1], model="quick-query" if model == "none" else model
+    )
+
+
+async def _cache_lookup(
+    query: str, use_llm: bool, bypass: bool, assets, model: str, version: Optional[str] = None
+) -> Optional[CacheLookup]:
+    """Look a retrieval query up in the answer cache; None if its answer shouldn't be cached.
+
+    Fallback answers given while no LLM provider is configured are not
+    cached, so they stop being served as soon as a key is set.
+    """
+    if not answer_cache.enabled or (use_llm and not llm_available(model)):
+        return None
+    return await answer_cache.lookup(query, model, use_llm, assets, bypass=bypass, version=version)
+
+
+def _cache_entry(result: RAGResult) -> dict:
     return {
-        "id": a.id,
-        "name": a.name,
-        "description": a.description,
-        "mime_type": a.mime_type,
-        "file_size": a.file_size,
-        "asset_type": a.asset_type,
-        "created_at": a.created_at.isoformat() if a.created_at else None
+        "answer": result.answer,
+        "sources": result.sources,
+        "citations": [citation._asdict() for citation in result.citations],
+        "tokens_used": result.tokens_used,
     }
 
-@router.post("/query", response_model=RagQueryResponse)
-def query_rag(request: RagQueryRequest, db: Session = Depends(get_db)):
+
+def _cached_result(entry: dict) -> RAGResult:
+    return RAGResult(
+        entry["answer"], entry["sources"], [Citation(**citation) for citation in entry["citations"]], entry["tokens_used"]
+    )
+
+
+def _response(query: str, result: RAGResult, model: str, cache: Optional[str] = None) -> RagQueryResponse:
+    return RagQueryResponse(
+        query=query,
+        answer=result.answer,
+        sources=result.sources,
+        citations=[citation._asdict() for citation in result.citations],
+        tokens_used=result.tokens_used,
+        timings=result.timings,
+        model="quick-query" if model == "none" else model,
+        cache=cache
+    )
+
+
+async def _answer(db: Session, request: RagQueryRequest, scope: _Scope, model: str) -> RagQueryResponse:
+    """Answer a query about the assets of `scope`: quick queries from its statistics, anything else by retrieval.
+
+    Database work runs in the threadpool and the LLM call is awaited, so a
+    query waiting on the provider does not hold a worker thread. Retrieval
+    answers are served from the answer cache while the assets are unchanged.
     """
-    Query a kit's assets using RAG with a selected LLM.
+    try:
+        if request.query in QUICK_QUERIES:
+            answer = await run_in_threadpool(_quick_answer, db, request.query, scope)
+            return _quick_response(request.query, answer, model)
+
+        assets = await run_in_threadpool(_scope_assets, db, scope)
+
+        # Fall back to LLM queries for other cases
+        lookup = await _cache_lookup(request.query, request.use_llm, request.bypass_cache, assets, model)
+        cache = lookup.outcome if lookup else None
+        if lookup and lookup.entry is not None:
+            result = _cached_result(lookup.entry)
+        else:
+            bind = db.get_bind()
+
+            async def compute() -> RAGResult:
+                # The shared work outlives a leader whose client disconnects, and
+                # the request's session is closed with it: use a session of its own
+                session = Session(bind=bind, autoflush=False)
+                try:
+                    own = [session.merge(asset, load=False) for asset in assets]
+                    result = await RAGService.answer_query_async(session, request.query, own, use_llm=request.use_llm, model=model)
+                finally:
+                    await run_in_threadpool(session.close)
+                if lookup:
+                    await answer_cache.store(lookup, _cache_entry(result))
+                return result
+
+            # Identical queries arriving while this one is answered wait for its answer
+            key = lookup.key if lookup else cache_key(request.query, model, request.use_llm, content_version(assets))
+            result, shared = await rag_flights.do(key, compute)
+            if shared:
+                cache = "coalesced"
+                answer_cache.stats.record("coalesced")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+
+    return _response(request.query, result, model, cache)
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _answer_events(
+    result: RAGResult,
+    pieces: AsyncIterator[str],
+    model: str,
+    cache: Optional[str] = None,
+    lookup: Optional[CacheLookup] = None
+) -> AsyncIterator[str]:
+    """Server-sent events for an answer: `sources`, a `token` per answer piece, then `done`.
+
+    A provider failure after the response has started is reported as an
+    `error` event, since the status code has already been sent. A completed
+    answer is stored in the answer cache for `lookup`.
+    """
+    yield _sse("sources", {
+        "sources": result.sources,
+        "citations": [citation._asdict() for citation in result.citations],
+        "tokens_used": result.tokens_used,
+        "timings": result.timings,
+        "model": model,
+        "cache": cache,
+    })
+    parts = []
+    try:
+        async for text in pieces:
+            parts.append(text)
+            yield _sse("token", {"text": text})
+    except Exception as e:
+        yield _sse("error", {"detail": f"Error processing query: {str(e)}"})
+        return
+    finally:
+        await pieces.aclose()
+    answer = "".join(parts)
+    if lookup:
+        await answer_cache.store(lookup, _cache_entry(result._replace(answer=answer)))
+    yield _sse("done", {"answer": answer})
+
+
+async def _stream_answer(db: Session, request: RagQueryRequest, scope: _Scope, model: str) -> StreamingResponse:
+    """Streaming counterpart of `_answer`: retrieval completes before the
+    response starts, then the answer streams as the provider generates it."""
+    lookup, cache = None, None
+    try:
+        if request.query in QUICK_QUERIES:
+            answer = await run_in_threadpool(_quick_answer, db, request.query, scope)
+            result, pieces = RAGResult("", answer[1], [], None), text_stream(answer[0])
+        else:
+            assets = await run_in_threadpool(_scope_assets, db, scope)
+            lookup = await _cache_lookup(request.query, request.use_llm, request.bypass_cache, assets, model)
+            cache = lookup.outcome if lookup else None
+            if lookup and lookup.entry is not None:
+                cached = _cached_result(lookup.entry)
+                result, pieces, lookup = cached._replace(answer=""), text_stream(cached.answer), None
+            else:
+                result, pieces = await RAGService.answer_query_stream(db, request.query, assets, use_llm=request.use_llm, model=model)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+
+    return StreamingResponse(
+        _answer_events(result, pieces, "quick-query" if model == "none" else model, cache, lookup),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def _batch(
+    db: Session, request: RagBatchRequest, scope: _Scope, model: str
+) -> Tuple[List[RagBatchResult], AsyncIterator[RagBatchResult], StageTimings]:
+    """Answer a batch of queries about `scope`: (results ready now, the rest as they complete, timings).
+
+    Database work is done before this returns: quick queries and cache hits
+    are answered, and one shared retrieval pass builds the contexts of all
+    other queries. Their LLM calls then run while the iterator is consumed,
+    RAG_BATCH_CONCURRENCY at a time, so it can be streamed after the
+    response has started. Repeats of a question in the batch are answered
+    once and report `coalesced`.
     """
-    if not request.kit_id:
+    def results(indices: List[int], result: RAGResult, cache: Optional[str]) -> List[RagBatchResult]:
+        if len(indices) > 1 and cache != "hit":
+            answer_cache.stats.record("coalesced")
+        return [
+            RagBatchResult(
+                index=index,
+                result=_response(request.queries[index], result, model, cache if n == 0 or cache == "hit" else "coalesced")
+            )
+            for n, index in enumerate(indices)
+        ]
+
+    async def prepare(indices: List[int]):
+        query = request.queries[indices[0]]
+        lookup = await _cache_lookup(query, request.use_llm, request.bypass_cache, assets, model, version)
+        if lookup and lookup.entry is not None:
+            return results(indices, _cached_result(lookup.entry), lookup.outcome)
+        return indices, lookup
+
+    timings = StageTimings()
+    quick = [index for index, query in enumerate(request.queries) if query in QUICK_QUERIES]
+    repeats: Dict[str, List[int]] = {}
+    for index, query in enumerate(request.queries):
+        if query not in QUICK_QUERIES:
+            repeats.setdefault(normalize_query(query), []).append(index)
+    try:
+        answers = await run_in_threadpool(_quick_answers, db, [request.queries[index] for index in quick], scope)
+        ready = [
+            RagBatchResult(index=index, result=_quick_response(request.queries[index], answer, model))
+            for index, answer in zip(quick, answers)
+        ]
+        assets = await run_in_threadpool(_scope_assets, db, scope) if repeats else []
+        # The kit is loaded and fingerprinted once for the whole batch
+        version = content_version(assets)
+        prepared = await asyncio.gather(*(prepare(indices) for indices in repeats.values()))
+        ready += [result for item in prepared if isinstance(item, list) for result in item]
+        pending = [item for item in prepared if not isinstance(item, list)]
+        queries = [request.queries[indices[0]] for indices, _ in pending]
+        packed = await run_in_threadpool(RAGService.build_contexts, db, queries, assets, model, timings) if queries else []
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+
+    async def answers() -> AsyncIterator[RagBatchResult]:
+        outcomes = RAGService.answer_packed(queries, packed, assets, use_llm=request.use_llm, model=model)
+        try:
+            async for position, outcome in outcomes:
+                indices, lookup = pending[position]
+                if isinstance(outcome, Exception):
+                    for index in indices:
+                        yield RagBatchResult(index=index, error=f"Error processing query: {str(outcome)}")
+                    continue
+                if lookup:
+                    await answer_cache.store(lookup, _cache_entry(outcome))
+                for result in results(indices, outcome, lookup.outcome if lookup else None):
+                    yield result
+        finally:
+            await outcomes.aclose()
+
+    return ready, answers(), timings
+
+
+async def _ndjson(ready: List[RagBatchResult], answers: AsyncIterator[RagBatchResult]) -> AsyncIterator[str]:
+    """One JSON line per batch result, in completion order."""
+    for result in ready:
+        yield result.model_dump_json() + "\n"
+    try:
+        async for result in answers:
+            yield result.model_dump_json() + "\n"
+    finally:
+        await answers.aclose()
+
+
+def _kit_scope(db: Session, kit_id: Optional[str]) -> _Scope:
+    if not kit_id:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
             detail="A kit_id must be provided to run a RAG query."
         )
-    
-    kit = db.query(Kit).filter(Kit.id == request.kit_id).first()
+
+    kit = db.query(Kit).filter(Kit.id == kit_id).first()
     if not kit:
         raise HTTPException(status_code=404, detail="Kit not found")
-    
-    if not kit.assets:
-        raise HTTPException(status_code=400, detail="Kit has no assets")
-    
-    model_to_use = request.model or "gemini-pro"
 
-    # Handle quick queries (no LLM required)
-    if model_to_use == "none" or request.query in ["Count Assets", "File Types", "Recent Files", "Basic Summary", "Largest Files", "List PDFs", "List Images"]:
-        try:
-            import json
-            
-            if request.query == "Count Assets":
-                assets = kit.assets
-                total_size = sum((a.file_size or 0) for a in assets)
-                types = list(set(a.mime_type for a in assets if a.mime_type))
-                answer = f"You have {len(assets)} assets in this workspace with a total size of {fmt_size(total_size)}. File types include: {', '.join(types) or 'None'}"
-                sources = [a.id for a in assets]
-            
-            elif request.query == "File Types":
-                assets = kit.assets
-                type_groups = {}
-                for a in assets:
-                    type_name = a.mime_type or 'Unknown'
-                    if type_name not in type_groups:
-                        type_groups[type_name] = []
-                    type_groups[type_name].append(a.name)
-
-                answer = "Asset types in this workspace:\n\n"
-                for type_name, files in type_groups.items():
-                    answer += f"{type_name}: {len(files)} files\n"
-                    for filename in files:
-                        answer += f"  - {filename}\n"
-                sources = [a.id for a in assets]
-            
-            elif request.query == "Basic Summary":
-                assets = kit.assets
-                total_size = sum((a.file_size or 0) for a in assets)
-                types = list(set(a.mime_type for a in assets if a.mime_type))
-                kits_count = len(kit.workspace.kits) if kit.workspace else 0
-
-                answer = f"Workspace Summary:\n\n" + \
-                        f"• Total Assets: {len(assets)}\n" + \
-                        f"• Total Size: {fmt_size(total_size)}\n" + \
-                        f"• File Types: {', '.join(types) or 'None'}\n" + \
-                        f"• Kits Available: {kits_count}\n\n" + \
-                        "Asset Details:\n" + \
-                        "\n".join(f"• {a.name} ({fmt_size(a.file_size)}) - {a.mime_type or 'Unknown'}" for a in assets)
-                sources = [a.id for a in assets]
-
-            # --- Structured Responses (JSON) ---
-            elif request.query == "Recent Files":
-                assets = sorted(kit.assets, key=lambda x: x.created_at or '', reverse=True)[:5]
-                answer = json.dumps([serialize_asset(a) for a in assets])
-                sources = [a.id for a in assets]
-            
-            elif request.query == "Largest Files":
-                assets = sorted(kit.assets, key=lambda x: x.file_size or 0, reverse=True)[:5]
-                answer = json.dumps([serialize_asset(a) for a in assets])
-                sources = [a.id for a in assets]
-
-            elif request.query == "List PDFs":
-                assets = [a for a in kit.assets if a.mime_type == 'application/pdf']
-                answer = json.dumps([serialize_asset(a) for a in assets])
-                sources = [a.id for a in assets]
-
-            elif request.query == "List Images":
-                assets = [a for a in kit.assets if a.mime_type and a.mime_type.startswith('image/')]
-                answer = json.dumps([serialize_asset(a) for a in assets])
-                sources = [a.id for a in assets]
-            
-            else:
-                # Fall back to LLM queries for other cases
-                answer, sources = RAGService.retrieve_and_answer(
-                    query=request.query,
-                    assets=kit.assets,
-                    use_llm=request.use_llm,
-                    model=model_to_use
-                )
-
-            return RagQueryResponse(
-                query=request.query,
-                answer=answer,
-                sources=sources,
-                model="quick-query" if model_to_use == "none" else model_to_use
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
-    else:
-        # LLM-based queries
-        try:
-            answer, sources = RAGService.retrieve_and_answer(
-                query=request.query,
-                assets=kit.assets,
-                use_llm=request.use_llm,
-                model=model_to_use
-            )
+    if not get_stats(db, "kit", kit.id).asset_count:
+        raise HTTPException(status_code=400, detail="Kit has no assets")
 
-            return RagQueryResponse(
-                query=request.query,
-                answer=answer,
-                sources=sources,
-                model=model_to_use
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+    workspace_stats = get_stats(db, "workspace", kit.workspace_id)
+    return _Scope("kit", kit.id, workspace_stats.kit_count if workspace_stats else 0)
 
 
-@router.post("/query/shared/{token}", response_model=RagQueryResponse)
-def query_rag_via_sharing_link(token: str, request: RagQueryRequest, db: Session = Depends(get_db)):
-    """
-    Query a kit's assets using a sharing link token.
-    """
+def _shared_scope(db: Session, token: str) -> _Scope:
     link = db.query(SharingLink).filter(SharingLink.token == token).first()
-    
-    assets = []
+
     if link:
         if not link.is_active or (link.expires_at and link.expires_at < datetime.utcnow()):
             raise HTTPException(status_code=403, detail="Sharing link is inactive or has expired")
-        kit = link.kit
-        if not kit.assets:
+        if not get_stats(db, "kit", link.kit_id).asset_count:
             raise HTTPException(status_code=400, detail="Kit has no assets")
-        assets = kit.assets
-    else:
-        # Try Workspace Link
-        from app.models import WorkspaceSharingLink
-        ws_link = db.query(WorkspaceSharingLink).filter(WorkspaceSharingLink.token == token).first()
-        if not ws_link:
-            raise HTTPException(status_code=404, detail="Sharing link not found")
-        
-        if not ws_link.is_active or (ws_link.expires_at and ws_link.expires_at < datetime.utcnow()):
-            raise HTTPException(status_code=403, detail="Sharing link is inactive or has expired")
-            
-        workspace = ws_link.workspace
-        if not workspace.assets:
-             raise HTTPException(status_code=400, detail="Workspace has no assets")
-        assets = workspace.assets
-    
-    model_to_use = request.model or "gpt-3.5-turbo"
-
-    # Handle quick queries (no LLM required)
-    if model_to_use == "none" or request.query in ["Count Assets", "File Types", "Recent Files", "Basic Summary", "Largest Files", "List PDFs", "List Images"]:
-        try:
-            import json
-            
-            if request.query == "Count Assets":
-                # assets already defined
-                total_size = sum((a.file_size or 0) for a in assets)
-                types = list(set(a.mime_type for a in assets if a.mime_type))
-                answer = f"You have {len(assets)} assets in this workspace with a total size of {fmt_size(total_size)}. File types include: {', '.join(types) or 'None'}"
-                sources = [a.id for a in assets]
-            
-            elif request.query == "File Types":
-                # assets already defined
-                type_groups = {}
-                for a in assets:
-                    type_name = a.mime_type or 'Unknown'
-                    if type_name not in type_groups:
-                        type_groups[type_name] = []
-                    type_groups[type_name].append(a.name)
-
-                answer = "Asset types in this workspace:\n\n"
-                for type_name, files in type_groups.items():
-                    answer += f"{type_name}: {len(files)} files\n"
-                    for filename in files:
-                        answer += f"  - {filename}\n"
-                sources = [a.id for a in assets]
-            
-            elif request.query == "Basic Summary":
-                # assets already defined
-                total_size = sum((a.file_size or 0) for a in assets)
-                types = list(set(a.mime_type for a in assets if a.mime_type))
-                # kits_count not easily available for workspace link without extra query, set to N/A or 0
-                kits_count = 0 
-
-                answer = f"Workspace Summary:\n\n" + \
-                        f"• Total Assets: {len(assets)}\n" + \
-                        f"• Total Size: {fmt_size(total_size)}\n" + \
-                        f"• File Types: {', '.join(types) or 'None'}\n" + \
-                        f"• Kits Available: {kits_count}\n\n" + \
-                        "Asset Details:\n" + \
-                        "\n".join(f"• {a.name} ({fmt_size(a.file_size)}) - {a.mime_type or 'Unknown'}" for a in assets)
-                sources = [a.id for a in assets]
-
-            # --- Structured Responses (JSON) ---
-            elif request.query == "Recent Files":
-                assets = sorted(assets, key=lambda x: x.created_at or '', reverse=True)[:5]
-                answer = json.dumps([serialize_asset(a) for a in assets])
-                sources = [a.id for a in assets]
-            
-            elif request.query == "Largest Files":
-                assets = sorted(assets, key=lambda x: x.file_size or 0, reverse=True)[:5]
-                answer = json.dumps([serialize_asset(a) for a in assets])
-                sources = [a.id for a in assets]
-
-            elif request.query == "List PDFs":
-                assets = [a for a in assets if a.mime_type == 'application/pdf']
-                answer = json.dumps([serialize_asset(a) for a in assets])
-                sources = [a.id for a in assets]
-
-            elif request.query == "List Images":
-                assets = [a for a in assets if a.mime_type and a.mime_type.startswith('image/')]
-                answer = json.dumps([serialize_asset(a) for a in assets])
-                sources = [a.id for a in assets]
-            
-            else:
-                # Fall back to LLM queries for other cases
-                answer, sources = RAGService.retrieve_and_answer(
-                    query=request.query,
-                    assets=assets,
-                    use_llm=request.use_llm,
-                    model=model_to_use
-                )
-
-            return RagQueryResponse(
-                query=request.query,
-                answer=answer,
-                sources=sources,
-                model="quick-query" if model_to_use == "none" else model_to_use
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
-    else:
-        try:
-            answer, sources = RAGService.retrieve_and_answer(
-                query=request.query,
-                assets=assets,
-                use_llm=request.use_llm,
-                model=model_to_use
-            )
-            
-            return RagQueryResponse(
-                query=request.query,
-                answer=answer,
-                sources=sources,
-                model=model_to_use
-            )
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
+        return _Scope("kit", link.kit_id, 0)
+
+    # Try Workspace Link
+    ws_link = db.query(WorkspaceSharingLink).filter(WorkspaceSharingLink.token == token).first()
+    if not ws_link:
+        raise HTTPException(status_code=404, detail="Sharing link not found")
+
+    if not ws_link.is_active or (ws_link.expires_at and ws_link.expires_at < datetime.utcnow()):
+        raise HTTPException(status_code=403, detail="Sharing link is inactive or has expired")
+
+    if not get_stats(db, "workspace", ws_link.workspace_id).asset_count:
+        raise HTTPException(status_code=400, detail="Workspace has no assets")
+    # Kit counts aren't disclosed through a shared link
+    return _Scope("workspace", ws_link.workspace_id, 0)
+
+
+@router.post("/query", response_model=RagQueryResponse)
+async def query_rag(request: RagQueryRequest, db: Session = Depends(get_db)):
+    """
+    Query a kit's assets using RAG with a selected LLM.
+    """
+    scope = await run_in_threadpool(_kit_scope, db, request.kit_id)
+    return await _answer(db, request, scope, request.model or "gemini-pro")
+
+
+@router.post("/query/shared/{token}", response_model=RagQueryResponse)
+async def query_rag_via_sharing_link(token: str, request: RagQueryRequest, db: Session = Depends(get_db)):
+    """
+    Query a kit's assets using a sharing link token.
+    """
+    scope = await run_in_threadpool(_shared_scope, db, token)
+    return await _answer(db, request, scope, request.model or "gpt-3.5-turbo")
+
+
+@router.post("/query/stream")
+async def query_rag_stream(request: RagQueryRequest, db: Session = Depends(get_db)):
+    """
+    Query a kit's assets, streaming the answer as server-sent events.
+    """
+    scope = await run_in_threadpool(_kit_scope, db, request.kit_id)
+    return await _stream_answer(db, request, scope, request.model or "gemini-pro")
+
+
+@router.post("/query/shared/{token}/stream")
+async def query_rag_via_sharing_link_stream(token: str, request: RagQueryRequest, db: Session = Depends(get_db)):
+    """
+    Query via a sharing link token, streaming the answer as server-sent events.
+    """
+    scope = await run_in_threadpool(_shared_scope, db, token)
+    return await _stream_answer(db, request, scope, request.model or "gpt-3.5-turbo")
+
+
+@router.post("/query/batch", response_model=RagBatchResponse)
+async def query_rag_batch(request: RagBatchRequest, db: Session = Depends(get_db)):
+    """
+    Answer many queries about one kit, retrieving for all of them in one pass.
+    With `stream`, results are sent as NDJSON lines as they complete.
+    """
+    if not request.queries:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail="At least one query is required.")
+    if len(request.queries) > RAG_BATCH_MAX_QUERIES:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail=f"A batch is limited to {RAG_BATCH_MAX_QUERIES} queries."
+        )
+    scope = await run_in_threadpool(_kit_scope, db, request.kit_id)
+    ready, answers, timings = await _batch(db, request, scope, request.model or "gemini-pro")
+
+    if request.stream:
+        return StreamingResponse(
+            _ndjson(ready, answers), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"}
+        )
+    with timings.stage("llm"):
+        results = ready + [result async for result in answers]
+    return RagBatchResponse(results=sorted(results, key=lambda result: result.index), timings=timings)
+
+
+@router.get("/cache/stats", response_model=CacheStatsRead)
+def get_cache_stats():
+    """
+    Answer cache outcomes since the server started.
+    """
+    return CacheStatsRead(**answer_cache.stats.snapshot(), entries=len(answer_cache.local))
+
+
+@router.get("/providers", response_model=Dict[str, ProviderStatusRead])
+def get_provider_status():
+    """
+    Circuit breaker state and recent latency of each LLM provider.
+    """
+    return provider_status()
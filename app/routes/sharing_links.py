@@ -1,9 +1,11 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, undefer
 from sqlalchemy import func
 from app.database import get_db
-from app.models import SharingLink, Kit, Workspace, WorkspaceSharingLink
-from app.schemas import SharingLinkCreate, SharingLinkRead, WorkspaceSharingLinkRead, AssetRead
+from app.models import SharingLink, Kit, Workspace, WorkspaceSharingLink, Asset, asset_kit_association
+from app.schemas import SharingLinkCreate, SharingLinkRead, WorkspaceSharingLinkRead, AssetRead, AssetSummary
+from app.routes.assets import _include_content
+from typing import Optional, Union
 import secrets
 from datetime import datetime, timedelta
 
@@ -160,9 +162,17 @@ def list_workspace_sharing_links(workspace_id: str, db: Session = Depends(get_db
     return db.query(WorkspaceSharingLink).filter(WorkspaceSharingLink.workspace_id == workspace_id).all()
 
 
-@router.get("/token/{token}/assets", response_model=list[AssetRead])
-def list_sharing_link_assets(token: str, db: Session = Depends(get_db)):
-    """List assets accessible via a sharing link"""
+@router.get("/token/{token}/assets", response_model=Union[list[AssetRead], list[AssetSummary]])
+def list_sharing_link_assets(token: str, include: Optional[str] = None, db: Session = Depends(get_db)):
+    """List assets accessible via a sharing link.
+    
+    Asset content is omitted unless requested with `?include=content`.
+    """
+    def _assets(query):
+        if _include_content(include):
+            return query.options(undefer(Asset.content)).all()
+        return [AssetSummary.model_validate(a) for a in query.all()]
+
     # Try Kit Link
     link = db.query(SharingLink).filter(SharingLink.token == token).first()
     if link:
@@ -174,7 +184,10 @@ def list_sharing_link_assets(token: str, db: Session = Depends(get_db)):
         kit = db.query(Kit).filter(Kit.id == link.kit_id).first()
         if not kit:
             raise HTTPException(status_code=404, detail="Kit not found")
-        return kit.assets
+        return _assets(
+            db.query(Asset).join(asset_kit_association, asset_kit_association.c.asset_id == Asset.id)
+            .filter(asset_kit_association.c.kit_id == kit.id)
+        )
 
     # Try Workspace Link
     ws_link = db.query(WorkspaceSharingLink).filter(WorkspaceSharingLink.token == token).first()
@@ -184,6 +197,6 @@ def list_sharing_link_assets(token: str, db: Session = Depends(get_db)):
         if ws_link.expires_at and ws_link.expires_at < datetime.utcnow():
             raise HTTPException(status_code=403, detail="Sharing link has expired")
         
-        return db.query(Asset).filter(Asset.workspace_id == ws_link.workspace_id).all()
+        return _assets(db.query(Asset).filter(Asset.workspace_id == ws_link.workspace_id))
 
     raise HTTPException(status_code=404, detail="Sharing link not found")
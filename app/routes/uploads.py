@@ -0,0 +1,216 @@
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Header
+from sqlalchemy.orm import Session
+from app.database import SessionLocal, get_db
+from app.models import Asset, Workspace, UploadSession, UploadPart
+from app.schemas import AssetRead, UploadSessionCreate, UploadSessionRead, UploadPartRead
+from app.routes.assets import _determine_asset_type, _sniff_mime_type, SNIFF_BYTES
+from app.services.storage import blob_store, BlobNotFound
+from app.services.blobs import acquire_written_blob
+from app.services import events
+from starlette.concurrency import run_in_threadpool
+from datetime import datetime, timedelta
+from typing import Optional
+import asyncio
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/uploads", tags=["uploads"])
+
+UPLOAD_SESSION_TTL_HOURS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24"))
+# Seconds between sweeps discarding the parts of expired sessions; 0 disables the sweeper
+UPLOAD_SWEEP_INTERVAL_SECONDS = int(os.getenv("UPLOAD_SWEEP_INTERVAL_SECONDS", "3600"))
+MAX_PART_NUMBER = 10000
+
+
+def _get_open_session(session_id: str, db: Session) -> UploadSession:
+    session = db.query(UploadSession).filter(UploadSession.id == session_id).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    if session.status != "open":
+        raise HTTPException(status_code=409, detail=f"Upload session is {session.status}")
+    if session.expires_at and session.expires_at < datetime.utcnow():
+        raise HTTPException(status_code=410, detail="Upload session has expired")
+    return session
+
+
+@router.post("/{workspace_id}", response_model=UploadSessionRead, status_code=status.HTTP_201_CREATED)
+def create_upload_session(workspace_id: str, data: UploadSessionCreate, db: Session = Depends(get_db)):
+    """Start a resumable multipart upload into a workspace.
+
+    Upload the file as numbered parts (in any order, in parallel if desired)
+    with `PUT /uploads/{session_id}/parts/{part_number}`, then call commit.
+    """
+    workspace = db.query(Workspace).filter(Workspace.id == workspace_id).first()
+    if not workspace:
+        raise HTTPException(status_code=404, detail="Workspace not found")
+
+    session = UploadSession(
+        workspace_id=workspace_id,
+        filename=data.filename,
+        description=data.description,
+        mime_type=data.mime_type,
+        expires_at=datetime.utcnow() + timedelta(hours=UPLOAD_SESSION_TTL_HOURS)
+    )
+    db.add(session)
+    db.commit()
+    db.refresh(session)
+    return session
+
+
+@router.get("/{session_id}", response_model=UploadSessionRead)
+def get_upload_session(session_id: str, db: Session = Depends(get_db)):
+    """Get an upload session, including the parts received so far (to resume)"""
+    session = db.query(UploadSession).filter(UploadSession.id == session_id).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+
+@router.put("/{session_id}/parts/{part_number}", response_model=UploadPartRead)
+async def upload_part(
+    session_id: str,
+    part_number: int,
+    request: Request,
+    x_part_sha256: Optional[str] = Header(None),
+    db: Session = Depends(get_db)
+):
+    """Upload one part as the raw request body. Re-sending a part replaces it.
+
+    If the `X-Part-SHA256` header is given, the part is rejected unless its
+    digest matches, so corrupted transfers can be retried.
+    """
+    if part_number < 1 or part_number > MAX_PART_NUMBER:
+        raise HTTPException(status_code=400, detail=f"Part number must be between 1 and {MAX_PART_NUMBER}")
+    session = _get_open_session(session_id, db)
+
+    writer = blob_store.part_writer(session.id, part_number)
+    try:
+        async for chunk in request.stream():
+            if chunk:
+                await run_in_threadpool(writer.write, chunk)
+        if x_part_sha256 and x_part_sha256.lower() != writer.digest:
+            writer.abort()
+            raise HTTPException(status_code=400, detail="Part checksum mismatch")
+        await run_in_threadpool(writer.commit)
+    except HTTPException:
+        raise
+    except Exception:
+        writer.abort()
+        raise
+
+    part = db.query(UploadPart).filter(
+        UploadPart.session_id == session.id, UploadPart.part_number == part_number
+    ).first()
+    if part:
+        part.size = writer.size
+        part.digest = writer.digest
+    else:
+        part = UploadPart(session_id=session.id, part_number=part_number, size=writer.size, digest=writer.digest)
+        db.add(part)
+    db.commit()
+    db.refresh(part)
+    return part
+
+
+@router.post("/{session_id}/commit", response_model=AssetRead, status_code=status.HTTP_201_CREATED)
+def commit_upload_session(session_id: str, db: Session = Depends(get_db)):
+    """Assemble the uploaded parts, in part-number order, into a new asset"""
+    session = _get_open_session(session_id, db)
+
+    parts = sorted(session.parts, key=lambda p: p.part_number)
+    if not parts:
+        raise HTTPException(status_code=400, detail="No parts have been uploaded")
+    missing = sorted(set(range(1, parts[-1].part_number + 1)) - {p.part_number for p in parts})
+    if missing:
+        raise HTTPException(status_code=400, detail=f"Missing parts: {', '.join(map(str, missing))}")
+
+    writer = blob_store.writer()
+    head = b""
+    try:
+        for part in parts:
+            for chunk in blob_store.iter_part(session.id, part.part_number):
+                if len(head) < SNIFF_BYTES:
+                    head += chunk[:SNIFF_BYTES - len(head)]
+                writer.write(chunk)
+        digest = writer.commit(keep=True)
+    except BlobNotFound:
+        writer.abort()
+        raise HTTPException(status_code=409, detail="Uploaded part data is missing; re-upload the part")
+    except Exception:
+        writer.abort()
+        raise
+
+    mime_type = session.mime_type or "application/octet-stream"
+    if mime_type == "application/octet-stream":
+        mime_type = _sniff_mime_type(head) or mime_type
+
+    db_asset = Asset(
+        workspace_id=session.workspace_id,
+        name=session.filename,
+        description=session.description,
+        blob_digest=digest,
+        asset_type=_determine_asset_type(mime_type),
+        mime_type=mime_type,
+        file_size=writer.size,
+        file_path=session.filename
+    )
+    db.add(db_asset)
+    acquire_written_blob(db, writer)
+    db.flush()
+
+    session.status = "committed"
+    session.asset_id = db_asset.id
+    db.commit()
+    events.emit(events.ASSET_CREATED, db=db, asset_id=db_asset.id)
+    db.refresh(db_asset)
+
+    blob_store.delete_parts(session.id)
+    return db_asset
+
+
+@router.delete("/{session_id}", status_code=status.HTTP_204_NO_CONTENT)
+def abort_upload_session(session_id: str, db: Session = Depends(get_db)):
+    """Abort an upload session and discard its parts"""
+    session = db.query(UploadSession).filter(UploadSession.id == session_id).first()
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    if session.status == "open":
+        session.status = "aborted"
+        db.commit()
+    blob_store.delete_parts(session.id)
+    return None
+
+
+def expire_upload_sessions(db: Session) -> int:
+    """Abort open sessions past their expiry and discard their staged parts; returns how many."""
+    expired = db.query(UploadSession).filter(
+        UploadSession.status == "open", UploadSession.expires_at < datetime.utcnow()
+    ).all()
+    for session in expired:
+        session.status = "aborted"
+    db.commit()
+    for session in expired:
+        blob_store.delete_parts(session.id)
+    return len(expired)
+
+
+def _sweep_once() -> int:
+    db = SessionLocal()
+    try:
+        return expire_upload_sessions(db)
+    finally:
+        db.close()
+
+
+async def sweep_upload_sessions() -> None:
+    """Run `expire_upload_sessions` every UPLOAD_SWEEP_INTERVAL_SECONDS until cancelled."""
+    while True:
+        try:
+            expired = await run_in_threadpool(_sweep_once)
+            if expired:
+                logger.info("Discarded %s expired upload sessions", expired)
+        except Exception:
+            logger.exception("Upload session sweep failed")
+        await asyncio.sleep(UPLOAD_SWEEP_INTERVAL_SECONDS)
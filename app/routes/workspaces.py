@@ -1,8 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Response, Query
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app.models import Workspace, Kit, Asset
+from app.models import Workspace, Kit, Asset, UploadSession
 from app.schemas import WorkspaceCreate, WorkspaceRead, WorkspaceMerge
+from app.services import events
+from app.services.blobs import release_blob, collect_garbage
+from app.services.storage import blob_store
+from app.services.pagination import paginate, escape_like, DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from typing import Optional
 
 router = APIRouter(prefix="/workspaces", tags=["workspaces"])
 
@@ -22,9 +27,21 @@ def create_workspace(workspace: WorkspaceCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/", response_model=list[WorkspaceRead])
-def list_workspaces(db: Session = Depends(get_db)):
-    """List all workspaces"""
-    return db.query(Workspace).all()
+def list_workspaces(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    name_prefix: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """List workspaces, oldest first.
+    
+    Results are paginated via the `X-Next-Cursor` response header and `?cursor=`.
+    """
+    query = db.query(Workspace)
+    if name_prefix:
+        query = query.filter(Workspace.name.like(escape_like(name_prefix) + "%", escape="\\"))
+    return paginate(query, Workspace, cursor, limit, response)
 
 
 @router.get("/{workspace_id}", response_model=WorkspaceRead)
@@ -42,8 +59,20 @@ def delete_workspace(workspace_id: str, db: Session = Depends(get_db)):
     workspace = db.query(Workspace).filter(Workspace.id == workspace_id).first()
     if not workspace:
         raise HTTPException(status_code=404, detail="Workspace not found")
+    digests = [
+        digest for (digest,) in
+        db.query(Asset.blob_digest).filter(Asset.workspace_id == workspace_id, Asset.blob_digest.isnot(None)).all()
+    ]
+    for digest in digests:
+        release_blob(db, digest)
+    # Upload sessions are deleted with the workspace; their staged parts must go too
+    upload_ids = [upload_id for (upload_id,) in db.query(UploadSession.id).filter(UploadSession.workspace_id == workspace_id)]
     db.delete(workspace)
     db.commit()
+    collect_garbage(db, digests)
+    for upload_id in upload_ids:
+        blob_store.delete_parts(upload_id)
+    events.emit(events.WORKSPACE_DELETED, db=db, workspace_id=workspace_id)
     return None
 
 
@@ -62,6 +91,7 @@ def merge_workspaces(data: WorkspaceMerge, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Source or target workspace not found")
 
     # Move Assets
+    moved_asset_ids = [asset.id for asset in source.assets]
     for asset in source.assets:
         asset.workspace_id = target.id
     
@@ -69,11 +99,19 @@ def merge_workspaces(data: WorkspaceMerge, db: Session = Depends(get_db)):
     for kit in source.kits:
         kit.workspace_id = target.id
 
+    # Move upload sessions, so uploads in progress finish into the target and
+    # their staged parts aren't orphaned by deleting the source
+    for upload in source.upload_sessions:
+        upload.workspace_id = target.id
+
     db.commit()
 
     # Delete Source
     db.delete(source)
     db.commit()
+    events.emit(
+        events.WORKSPACE_MERGED, db=db, source_id=data.source_id, target_id=data.target_id, asset_ids=moved_asset_ids
+    )
 
     return {"message": "Workspaces merged successfully"}
 
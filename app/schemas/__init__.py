@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime
 
 
@@ -33,12 +33,13 @@ class AssetUpload(BaseModel):
     asset_type: str = "file"  # Will be determined from mime type
 
 
-class AssetRead(BaseModel):
+class AssetSummary(BaseModel):
+    """Asset metadata without its content, used by listings"""
     id: str
     workspace_id: str
     name: str
     description: Optional[str]
-    content: str
+    blob_digest: Optional[str] = None
     asset_type: str
     mime_type: Optional[str]
     file_size: Optional[int]
@@ -50,6 +51,50 @@ class AssetRead(BaseModel):
         from_attributes = True
 
 
+class AssetRead(AssetSummary):
+    content: Optional[str]
+
+
+class IndexStatusRead(BaseModel):
+    asset_id: str
+    status: str  # Latest job status: "queued", "running", "done", "failed", "cancelled", or "none"
+    attempts: int = 0
+    error: Optional[str] = None
+    indexed_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str
+    description: Optional[str] = None
+    mime_type: Optional[str] = None
+
+
+class UploadPartRead(BaseModel):
+    part_number: int
+    size: int
+    digest: str
+
+    class Config:
+        from_attributes = True
+
+
+class UploadSessionRead(BaseModel):
+    id: str
+    workspace_id: str
+    filename: str
+    description: Optional[str]
+    mime_type: Optional[str]
+    status: str
+    asset_id: Optional[str]
+    parts: List[UploadPartRead]
+    created_at: datetime
+    expires_at: Optional[datetime]
+
+    class Config:
+        from_attributes = True
+
+
 class KitCreate(BaseModel):
     name: str
     description: Optional[str] = None
@@ -67,7 +112,7 @@ class KitRead(BaseModel):
     workspace_id: str
     name: str
     description: Optional[str]
-    assets: List[AssetRead]
+    assets: List[AssetSummary]
     created_at: datetime
     updated_at: datetime
 
@@ -75,6 +120,10 @@ class KitRead(BaseModel):
         from_attributes = True
 
 
+class KitReadWithContent(KitRead):
+    assets: List[AssetRead]
+
+
 class SharingLinkCreate(BaseModel):
     expires_in_days: Optional[int] = None
 
@@ -108,13 +157,65 @@ class RagQueryRequest(BaseModel):
     kit_id: Optional[str] = None
     use_llm: bool = True
     model: Optional[str] = None
+    bypass_cache: bool = False  # Answer afresh instead of from the answer cache
+
+
+class Citation(BaseModel):
+    asset_id: str
+    chunk_id: str
+    start: int  # Character offsets of the passage within the asset text
+    end: int
+    text: str
+    score: float
 
 
 class RagQueryResponse(BaseModel):
     query: str
     answer: str
     sources: List[str]
+    citations: List[Citation] = []
+    tokens_used: Optional[int] = None  # Context tokens sent to the model, for retrieval answers
+    timings: Optional[Dict[str, float]] = None  # Milliseconds per retrieval stage, for freshly computed answers
     model: str
+    cache: Optional[str] = None  # "hit", "semantic", "miss", "bypass" or "coalesced" when the answer cache was consulted
+
+
+class RagBatchRequest(BaseModel):
+    kit_id: Optional[str] = None
+    queries: List[str]
+    use_llm: bool = True
+    model: Optional[str] = None
+    bypass_cache: bool = False
+    stream: bool = False  # Stream results as NDJSON lines in completion order
+
+
+class RagBatchResult(BaseModel):
+    index: int  # Position of the query in the request
+    result: Optional[RagQueryResponse] = None
+    error: Optional[str] = None  # Set instead of result when this query failed
+
+
+class RagBatchResponse(BaseModel):
+    results: List[RagBatchResult]  # In request order
+    timings: Optional[Dict[str, float]] = None  # Milliseconds per stage of the shared retrieval pass
+
+
+class CacheStatsRead(BaseModel):
+    hits: int
+    semantic_hits: int  # Answers reused for a paraphrased question
+    misses: int
+    bypassed: int
+    coalesced: int  # Misses answered by joining an identical in-flight query
+    hit_rate: float  # (hits + semantic_hits) / lookups, excluding bypassed
+    entries: int  # Answers in the in-process tier
+
+
+class ProviderStatusRead(BaseModel):
+    configured: bool
+    circuit: str  # "closed", "open" or "half_open"
+    samples: int  # Recent successful requests the percentiles are computed from
+    p50_seconds: Optional[float] = None
+    p95_seconds: Optional[float] = None
 
 
 class WorkspaceMerge(BaseModel):
@@ -1,5 +1,4 @@
 import os
-from typing import List
 from openai import OpenAI
 import google.generativeai as genai
 try:
@@ -12,7 +11,7 @@ openai_api_key = os.getenv("OPENAI_API_KEY")
 openai_client = None
 if openai_api_key:
     try:
-        openai_client = OpenAI(api_key=openai_api_key)
+        openai_client = OpenAI(api_key=openai_api_key, base_url=os.getenv("OPENAI_BASE_URL"))
     except Exception as e:
         print(f"Failed to initialize OpenAI client: {e}")
 
@@ -77,38 +76,3 @@ class LLMService:
             return response
         except Exception as e:
             raise Exception(f"Synthetic AI API Error: {str(e)}")
-
-    @staticmethod
-    def semantic_search(query: str, assets_content: List[str], model: str = "gpt-3.5-turbo") -> List[int]:
-        """Find most relevant assets using an LLM."""
-        if not openai_client and not gemini_client:
-             # Fallback: return first asset indices if no LLM
-            return list(range(min(2, len(assets_content))))
-
-        try:
-            combined_content = "\n---DOCUMENT START---\n".join([f"ID {i}: {content[:200]}..." for i, content in enumerate(assets_content)])
-            
-            prompt = f"You are a document retrieval expert. Given a query and document snippets, identify which documents are most relevant. Return ONLY the document IDs as a comma-separated list (e.g., '1,3,5').\n\nQuery: {query}\n\nDocuments:\n{combined_content}"
-
-            if model.startswith("gemini") and gemini_client:
-                 response_text = gemini_client.generate_content(prompt).text
-            elif openai_client:
-                response = openai_client.chat.completions.create(
-                    model="gpt-3.5-turbo", # Using a reliable model for this task
-                    messages=[
-                        {"role": "system", "content": "You are a document retrieval expert."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.2,
-                    max_tokens=50,
-                )
-                response_text = response.choices[0].message.content
-            else: # Fallback if preferred client is missing
-                return list(range(min(2, len(assets_content))))
-
-            indices = [int(x.strip()) for x in response_text.split(',') if x.strip().isdigit()]
-            return indices
-        except Exception as e:
-            # In case of any error, fall back to returning all indices
-            print(f"LLM semantic search error: {e}. Falling back to returning all documents.")
-            return list(range(len(assets_content)))
@@ -0,0 +1,97 @@
+from typing import Iterable, Optional
+from sqlalchemy import func, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from app.models import Asset, Blob
+from app.services.storage import BlobWriter, blob_store
+
+
+def acquire_blob(db: Session, digest: str, size: int) -> None:
+    """Record one more asset reference to a stored blob.
+
+    Runs inside the caller's transaction, so the reference only counts once
+    the asset row referencing it is committed.
+    """
+    updated = db.execute(
+        update(Blob).where(Blob.digest == digest).values(ref_count=Blob.ref_count + 1)
+    ).rowcount
+    if updated:
+        return
+    try:
+        with db.begin_nested():
+            db.add(Blob(digest=digest, size=size, ref_count=1))
+    except IntegrityError:
+        # Another request registered the same blob first
+        db.execute(update(Blob).where(Blob.digest == digest).values(ref_count=Blob.ref_count + 1))
+
+
+def acquire_written_blob(db: Session, writer: BlobWriter) -> None:
+    """`acquire_blob` for a blob just stored with `writer.commit(keep=True)`.
+
+    An existing file may belong to a blob that `collect_garbage` is deleting.
+    Once the reference is taken the Blob row is locked until the caller
+    commits, so the file is checked then and stored again if it was removed.
+    """
+    try:
+        acquire_blob(db, writer.digest, writer.size)
+        if not blob_store.exists(writer.digest):
+            writer.restore()
+    finally:
+        writer.abort()
+
+
+def release_blob(db: Session, digest: Optional[str]) -> None:
+    """Drop one asset reference; the blob is removed by `collect_garbage` once unreferenced.
+
+    Blobs stored before reference counting have no row and are never collected.
+    """
+    if not digest:
+        return
+    db.execute(
+        update(Blob).where(Blob.digest == digest, Blob.ref_count > 0).values(ref_count=Blob.ref_count - 1)
+    )
+
+
+def collect_garbage(db: Session, digests: Optional[Iterable[str]] = None) -> int:
+    """Delete unreferenced blobs from the database and the blob store.
+
+    Call after the transaction that released the references has committed.
+    Limited to `digests` when given, otherwise scans every blob. Returns the
+    number of blobs removed.
+    """
+    query = db.query(Blob.digest).filter(Blob.ref_count <= 0)
+    if digests is not None:
+        digests = [d for d in set(digests) if d]
+        if not digests:
+            return 0
+        query = query.filter(Blob.digest.in_(digests))
+
+    removed = 0
+    for (digest,) in query.all():
+        # Conditional delete so a blob re-acquired in the meantime survives. The
+        # file goes before the commit, while the row is still locked, so an
+        # upload acquiring the digest afterwards sees it missing and re-stores it
+        deleted = db.query(Blob).filter(Blob.digest == digest, Blob.ref_count <= 0).delete(synchronize_session=False)
+        try:
+            if deleted:
+                blob_store.delete(digest)
+                removed += 1
+        finally:
+            db.commit()
+    return removed
+
+
+def rebuild_ref_counts(db: Session) -> None:
+    """Recompute every reference count from the assets table (e.g. after a migration)."""
+    counts = dict(
+        db.query(Asset.blob_digest, func.count(Asset.id))
+        .filter(Asset.blob_digest.isnot(None))
+        .group_by(Asset.blob_digest)
+        .all()
+    )
+    for blob in db.query(Blob).all():
+        blob.ref_count = counts.pop(blob.digest, 0)
+    for digest, count in counts.items():
+        if blob_store.exists(digest):
+            db.add(Blob(digest=digest, size=blob_store.size(digest), ref_count=count))
+    db.commit()
@@ -0,0 +1,372 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+import numpy as np
+from starlette.concurrency import run_in_threadpool
+
+from app.services import vectors
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+# --- Answer Cache Configuration ---
+# Seconds a cached answer is served; 0 disables the cache
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+# Answers kept in the in-process tier, least recently used evicted first
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+# Optional tier shared between processes and replicas: "" (none) or "redis"
+ANSWER_CACHE_SHARED_BACKEND = os.getenv("ANSWER_CACHE_SHARED_BACKEND", "")
+ANSWER_CACHE_REDIS_URL = os.getenv("ANSWER_CACHE_REDIS_URL", "redis://localhost:6379/0")
+ANSWER_CACHE_PREFIX = "youfyi:answer:"
+# Cosine similarity at which a previous question's answer is reused for a new one
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9"))
+# Questions remembered per kit version for semantic matching; 0 disables the semantic tier
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "256"))
+# Questions remembered for semantic matching across all kit versions, bounding its memory
+SEMANTIC_CACHE_MAX_TOTAL = int(os.getenv("SEMANTIC_CACHE_MAX_TOTAL", "4096"))
+
+
+def normalize_query(query: str) -> str:
+    """Case, surrounding whitespace and trailing punctuation don't change the question."""
+    return re.sub(r"\s+", " ", query).strip().rstrip("?!.").strip().casefold()
+
+
+def content_version(assets: Iterable) -> str:
+    """Fingerprint of a set of assets and their content.
+
+    Changes whenever an asset is added to or removed from the set, or an asset
+    is modified or re-indexed (which bumps its `updated_at`), so answers cached
+    under an older version are never served for the new content.
+    """
+    h = hashlib.sha256()
+    for asset_id, updated_at in sorted((a.id, a.updated_at.isoformat() if a.updated_at else "") for a in assets):
+        h.update(f"{asset_id}:{updated_at}\n".encode())
+    return h.hexdigest()
+
+
+def cache_key(query: str, model: str, use_llm: bool, version: str) -> str:
+    raw = json.dumps([normalize_query(query), model, use_llm, version])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def scope_key(model: str, use_llm: bool, version: str) -> str:
+    """Key of the answers a semantic match may reuse: same model and asset content."""
+    return hashlib.sha256(json.dumps([model, use_llm, version]).encode()).hexdigest()
+
+
+class LRUCache:
+    """Thread-safe in-process cache with least-recently-used eviction and a TTL."""
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value, ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class _SemanticScope:
+    """Embedded questions and their answers for one kit version, oldest first."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.embeddings: Optional[np.ndarray] = None
+        self.entries: list = []  # (expires_at, answer entry) per embedding row
+        self.lock = threading.Lock()
+
+    def add(self, embedding: np.ndarray, entry: dict, expires_at: float) -> None:
+        with self.lock:
+            row = embedding.reshape(1, -1).astype(np.float32)
+            self.embeddings = row if self.embeddings is None else np.vstack([self.embeddings, row])[-self.max_entries:]
+            self.entries = (self.entries + [(expires_at, entry)])[-self.max_entries:]
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def best(self, embedding: np.ndarray) -> Tuple[Optional[dict], float]:
+        with self.lock:
+            if self.embeddings is None:
+                return None, 0.0
+            scores = self.embeddings @ embedding.astype(np.float32)
+            now = time.monotonic()
+            for row in np.argsort(-scores):
+                expires_at, entry = self.entries[row]
+                if expires_at > now:
+                    return entry, float(scores[row])
+            return None, 0.0
+
+
+class SemanticCache:
+    """Reuses the answer to an earlier question whose embedding is close enough.
+
+    Matches are limited to the same scope (model and asset content version),
+    so a paraphrase is only answered from content that hasn't changed since.
+    Each scope keeps its `max_entries` most recent questions, and the least
+    recently used scopes are dropped whole to keep at most `max_total`
+    embeddings in memory.
+    """
+
+    def __init__(self, threshold: float, max_entries: int, max_scopes: int, ttl: float, max_total: Optional[int] = None):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.max_scopes = max_scopes
+        self.max_total = max(max_total or max_entries * max_scopes, max_entries)
+        self.ttl = ttl
+        self._scopes: "OrderedDict[str, tuple]" = OrderedDict()  # scope -> (expires_at, _SemanticScope)
+        self._total = 0  # Embeddings held across all scopes
+        self._lock = threading.Lock()
+
+    def get(self, scope: str, embedding: np.ndarray) -> Optional[dict]:
+        with self._lock:
+            item = self._scopes.get(scope)
+            if item is None:
+                return None
+            expires_at, entries = item
+            if expires_at <= time.monotonic():
+                self._drop(scope)
+                return None
+            self._scopes.move_to_end(scope)
+        entry, score = entries.best(embedding)
+        return entry if score >= self.threshold else None
+
+    def set(self, scope: str, embedding: np.ndarray, entry: dict) -> None:
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            item = self._scopes.get(scope)
+            entries = item[1] if item is not None else _SemanticScope(self.max_entries)
+            self._scopes[scope] = (expires_at, entries)
+            self._scopes.move_to_end(scope)
+            before = len(entries)
+            entries.add(embedding, entry, expires_at)
+            self._total += len(entries) - before
+            while len(self._scopes) > self.max_scopes or self._total > self.max_total:
+                self._drop(next(iter(self._scopes)))
+
+    def _drop(self, scope: str) -> None:
+        _, entries = self._scopes.pop(scope)
+        self._total -= len(entries)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._scopes.clear()
+            self._total = 0
+
+    def __len__(self) -> int:
+        """Embeddings held across all scopes."""
+        return self._total
+
+
+def embed_query(query: str) -> np.ndarray:
+    return vectors.get_embedder().embed([normalize_query(query)])[0]
+
+
+class CacheStats:
+    """Counts of answer cache outcomes since the process started."""
+
+    OUTCOMES = ("hit", "semantic", "miss", "bypass", "coalesced")
+
+    def __init__(self):
+        self._counts = dict.fromkeys(self.OUTCOMES, 0)
+        self._lock = threading.Lock()
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            self._counts[outcome] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            counts = dict(self._counts)
+        lookups = counts["hit"] + counts["semantic"] + counts["miss"]
+        return {
+            "hits": counts["hit"],
+            "semantic_hits": counts["semantic"],
+            "misses": counts["miss"],
+            "bypassed": counts["bypass"],
+            "coalesced": counts["coalesced"],
+            "hit_rate": (counts["hit"] + counts["semantic"]) / lookups if lookups else 0.0,
+        }
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts = dict.fromkeys(self.OUTCOMES, 0)
+
+
+class CacheLookup(NamedTuple):
+    query: str
+    key: str
+    scope: str
+    embedding: Optional[np.ndarray]  # The query embedding, once computed for the semantic tier
+    entry: Optional[dict]  # The cached answer, on a hit
+    outcome: str  # "hit", "semantic", "miss" or "bypass"
+
+
+class SharedCache:
+    """Interface for a cache tier shared between processes. Values are JSON strings."""
+
+    def get(self, key: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        raise NotImplementedError
+
+
+class RedisCache(SharedCache):
+    """Shared tier backed by Redis (requires the redis package)."""
+
+    def __init__(self, url: str, prefix: str = ANSWER_CACHE_PREFIX):
+        if redis is None:
+            raise RuntimeError("redis is required for the redis answer cache backend")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def get(self, key: str) -> Optional[str]:
+        value = self.client.get(self.prefix + key)
+        return value.decode() if value is not None else None
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        self.client.set(self.prefix + key, value, ex=ttl)
+
+
+class AnswerCache:
+    """Two-tier cache of RAG answers: in-process LRU, then the optional shared tier.
+
+    Shared tier hits are copied into the local tier. Shared tier errors are
+    treated as misses, so an unavailable Redis slows queries down but doesn't
+    fail them.
+    """
+
+    def __init__(
+        self,
+        local: LRUCache,
+        shared: Optional[SharedCache] = None,
+        ttl: int = ANSWER_CACHE_TTL_SECONDS,
+        semantic: Optional[SemanticCache] = None
+    ):
+        self.local = local
+        self.shared = shared
+        self.ttl = ttl
+        self.semantic = semantic
+        self.stats = CacheStats()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl > 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        if not self.enabled:
+            return None
+        value = self.local.get(key)
+        if value is not None or self.shared is None:
+            return value
+        try:
+            raw = await run_in_threadpool(self.shared.get, key)
+        except Exception:
+            return None
+        if raw is None:
+            return None
+        value = json.loads(raw)
+        self.local.set(key, value)
+        return value
+
+    async def set(self, key: str, value: dict) -> None:
+        if not self.enabled:
+            return
+        self.local.set(key, value)
+        if self.shared is not None:
+            try:
+                await run_in_threadpool(self.shared.set, key, json.dumps(value), self.ttl)
+            except Exception:
+                pass
+
+    async def lookup(
+        self, query: str, model: str, use_llm: bool, assets: Iterable, bypass: bool = False, version: Optional[str] = None
+    ) -> CacheLookup:
+        """Find a cached answer for `query` about `assets`: an exact repeat first,
+        then a paraphrase from the semantic tier. `bypass` skips the lookup so
+        the caller answers afresh (and refreshes the cache). `version` is the
+        assets' `content_version`, when the caller has already computed it."""
+        version = content_version(assets) if version is None else version
+        key, scope = cache_key(query, model, use_llm, version), scope_key(model, use_llm, version)
+        if bypass:
+            return self._outcome(CacheLookup(query, key, scope, None, None, "bypass"))
+        entry = await self.get(key)
+        if entry is not None:
+            return self._outcome(CacheLookup(query, key, scope, None, entry, "hit"))
+        embedding = None
+        if self.semantic is not None and self.enabled:
+            embedding = await run_in_threadpool(embed_query, query)
+            entry = self.semantic.get(scope, embedding)
+            if entry is not None:
+                return self._outcome(CacheLookup(query, key, scope, embedding, entry, "semantic"))
+        return self._outcome(CacheLookup(query, key, scope, embedding, None, "miss"))
+
+    async def store(self, lookup: CacheLookup, entry: dict) -> None:
+        """Cache the answer found after `lookup` missed (or was bypassed)."""
+        await self.set(lookup.key, entry)
+        if self.semantic is not None and self.enabled:
+            embedding = lookup.embedding
+            if embedding is None:
+                embedding = await run_in_threadpool(embed_query, lookup.query)
+            self.semantic.set(lookup.scope, embedding, entry)
+
+    def _outcome(self, lookup: CacheLookup) -> CacheLookup:
+        self.stats.record(lookup.outcome)
+        return lookup
+
+    def clear(self) -> None:
+        """Empty the in-process tiers (shared entries expire by TTL)."""
+        self.local.clear()
+        if self.semantic is not None:
+            self.semantic.clear()
+
+
+def get_answer_cache() -> AnswerCache:
+    """Build the answer cache, with the shared tier selected by ANSWER_CACHE_SHARED_BACKEND."""
+    shared = None
+    if ANSWER_CACHE_SHARED_BACKEND == "redis":
+        shared = RedisCache(ANSWER_CACHE_REDIS_URL)
+    elif ANSWER_CACHE_SHARED_BACKEND:
+        raise RuntimeError(f"Unknown answer cache backend: {ANSWER_CACHE_SHARED_BACKEND}")
+    semantic = None
+    if SEMANTIC_CACHE_MAX_ENTRIES > 0:
+        semantic = SemanticCache(
+            SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_MAX_ENTRIES, ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS,
+            max_total=SEMANTIC_CACHE_MAX_TOTAL
+        )
+    return AnswerCache(LRUCache(ANSWER_CACHE_MAX_ENTRIES, ANSWER_CACHE_TTL_SECONDS), shared, semantic=semantic)
+
+
+answer_cache = get_answer_cache()
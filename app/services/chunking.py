@@ -0,0 +1,62 @@
+import base64
+import binascii
+import io
+import os
+import re
+from typing import Iterator, NamedTuple, Optional
+
+from app.services.extraction import extract_text
+from app.services.storage import blob_store, BlobNotFound
+
+# Chunk size and overlap, in whitespace-delimited tokens
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "200"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "40"))
+
+_TOKEN_RE = re.compile(r"\S+")
+
+
+class TextChunk(NamedTuple):
+    start: int
+    end: int
+    text: str
+    token_count: int
+
+
+def split_text(
+    text: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS
+) -> Iterator[TextChunk]:
+    """Split `text` into windows of at most `max_tokens` tokens.
+
+    Consecutive windows share `overlap` tokens so a passage cut at a window
+    boundary still appears whole in one of them. Offsets index into `text`.
+    """
+    if overlap >= max_tokens:
+        raise ValueError("overlap must be smaller than max_tokens")
+    spans = [m.span() for m in _TOKEN_RE.finditer(text)]
+    step = max_tokens - overlap
+    for first in range(0, len(spans), step):
+        window = spans[first:first + max_tokens]
+        start, end = window[0][0], window[-1][1]
+        yield TextChunk(start, end, text[start:end], len(window))
+        if first + max_tokens >= len(spans):
+            break
+
+
+def load_text(
+    content: Optional[str], blob_digest: Optional[str], mime_type: Optional[str], filename: Optional[str] = None
+) -> str:
+    """Plain text of an asset: extracted from its stored file, or its inline content."""
+    if blob_digest:
+        try:
+            with blob_store.open(blob_digest) as fh:
+                return extract_text(fh, mime_type, filename)
+        except BlobNotFound:
+            return ""
+    if content and filename:
+        # Files uploaded before the blob store kept base64 content inline
+        try:
+            data = base64.b64decode(content, validate=True)
+        except (binascii.Error, ValueError):
+            return content
+        return extract_text(io.BytesIO(data), mime_type, filename)
+    return content or ""
@@ -0,0 +1,38 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+
+class SingleFlight:
+    """Coalesces concurrent calls for the same key into one execution.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it is in flight await the same task and receive its result (or its
+    exception). The key is released as soon as the task finishes, so later
+    calls start afresh. The task is shielded from the cancellation of any one
+    caller, so a client disconnecting doesn't fail the others.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Run `fn()` unless a call for `key` is in flight; returns (result, shared)."""
+        task = self._calls.get(key)
+        shared = task is not None and task.get_loop() is asyncio.get_running_loop()
+        if not shared:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task), shared
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            task.exception()  # Mark retrieved: every waiter may have gone away
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+rag_flights = SingleFlight()
@@ -0,0 +1,121 @@
+import os
+import re
+from typing import List, NamedTuple, Optional, Sequence
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Token budget for retrieved context, by model name prefix (longest match wins)
+MODEL_CONTEXT_BUDGETS = {
+    "gpt-3.5-turbo": 3000,
+    "gpt-4": 6000,
+    "gpt-4o": 12000,
+    "gpt-4-turbo": 12000,
+    "gemini": 8000,
+}
+DEFAULT_CONTEXT_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+# A passage is cut to fit the remaining budget only if at least this much of it fits
+MIN_PASSAGE_TOKENS = 32
+# Passages sharing this fraction of their word trigrams with a packed one are skipped
+DUPLICATE_THRESHOLD = 0.8
+
+SEPARATOR = "\n---\n"
+
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]", re.UNICODE)
+
+
+class Tokenizer:
+    """Counts and truncates by model tokens.
+
+    Uses tiktoken's cl100k_base encoding when installed; otherwise words and
+    punctuation marks approximate tokens (slightly under-counting long words).
+    """
+
+    def __init__(self):
+        self._encoding = None
+        if tiktoken is not None:
+            try:
+                self._encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                self._encoding = None
+
+    def count(self, text: str) -> int:
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        return len(_TOKEN_RE.findall(text))
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """The longest prefix of `text` with at most `max_tokens` tokens."""
+        if max_tokens <= 0:
+            return ""
+        if self._encoding is not None:
+            tokens = self._encoding.encode(text, disallowed_special=())
+            return text if len(tokens) <= max_tokens else self._encoding.decode(tokens[:max_tokens])
+        for i, match in enumerate(_TOKEN_RE.finditer(text)):
+            if i == max_tokens:
+                return text[:match.start()].rstrip()
+        return text
+
+
+tokenizer = Tokenizer()
+
+
+def context_budget(model: Optional[str]) -> int:
+    """Context token budget for `model`."""
+    matches = [prefix for prefix in MODEL_CONTEXT_BUDGETS if model and model.startswith(prefix)]
+    if not matches:
+        return DEFAULT_CONTEXT_BUDGET
+    return MODEL_CONTEXT_BUDGETS[max(matches, key=len)]
+
+
+class PackedContext(NamedTuple):
+    text: str
+    passages: list  # The input passages that were packed, possibly shortened
+    tokens_used: int
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < 3:
+        return {tuple(words)}
+    return {tuple(words[i:i + 3]) for i in range(len(words) - 2)}
+
+
+def _is_duplicate(shingles: set, seen: List[set]) -> bool:
+    for other in seen:
+        overlap = len(shingles & other)
+        if overlap and overlap / min(len(shingles), len(other)) >= DUPLICATE_THRESHOLD:
+            return True
+    return False
+
+
+def pack_context(passages: Sequence, budget: int) -> PackedContext:
+    """Greedily pack ranked passages into at most `budget` tokens.
+
+    `passages` are best-first RAG citations (NamedTuples with `text`, `start`
+    and `end` fields). Near-duplicates of an already packed passage are
+    skipped; a passage that doesn't fit is cut to the remaining budget when a
+    useful amount of it fits.
+    """
+    separator_tokens = tokenizer.count(SEPARATOR)
+    packed, seen, texts = [], [], []
+    used = 0
+    for passage in passages:
+        shingles = _shingles(passage.text)
+        if _is_duplicate(shingles, seen):
+            continue
+        remaining = budget - used - (separator_tokens if packed else 0)
+        tokens = tokenizer.count(passage.text)
+        if tokens > remaining:
+            if remaining < MIN_PASSAGE_TOKENS:
+                break
+            text = tokenizer.truncate(passage.text, remaining)
+            passage = passage._replace(text=text, end=passage.start + len(text))
+            tokens = tokenizer.count(text)
+        used += tokens + (separator_tokens if packed else 0)
+        packed.append(passage)
+        seen.append(shingles)
+        texts.append(passage.text)
+    return PackedContext(SEPARATOR.join(texts), packed, used)
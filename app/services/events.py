@@ -0,0 +1,35 @@
+import logging
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Event names and their payloads (all events also receive the request's `db` session)
+ASSET_CREATED = "asset.created"  # asset_id
+ASSET_DELETED = "asset.deleted"  # asset_id, workspace_id, chunk_ids
+KIT_ASSETS_CHANGED = "kit.assets_changed"  # kit_id, added, removed (asset ids)
+WORKSPACE_MERGED = "workspace.merged"  # source_id, target_id, asset_ids
+WORKSPACE_DELETED = "workspace.deleted"  # workspace_id
+
+_handlers: Dict[str, List[Callable]] = {}
+
+
+def subscribe(event: str):
+    """Decorator registering a handler for `event`."""
+    def register(handler: Callable) -> Callable:
+        _handlers.setdefault(event, []).append(handler)
+        return handler
+    return register
+
+
+def emit(event: str, **payload) -> None:
+    """Run the handlers for `event` synchronously.
+
+    Emit after the change has been committed. Handler errors are logged and
+    swallowed: subscribers maintain derived state (such as search indexes)
+    that can be rebuilt, so they must not fail the change that triggered them.
+    """
+    for handler in _handlers.get(event, []):
+        try:
+            handler(**payload)
+        except Exception:
+            logger.exception("Handler %s for %s failed", handler.__name__, event)
@@ -0,0 +1,367 @@
+import codecs
+import csv
+import io
+import logging
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+import zlib
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+logger = logging.getLogger(__name__)
+
+# Upper bound on extracted characters kept per asset
+MAX_EXTRACTED_CHARS = int(os.getenv("MAX_EXTRACTED_CHARS", str(2 * 1024 * 1024)))
+# Textual files are decoded up to this many bytes
+MAX_TEXT_BYTES = 4 * 1024 * 1024
+
+DOCX = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+XLSX = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+PPTX = "application/vnd.openxmlformats-officedocument.presentationml.presentation"
+
+_EXTENSIONS = {
+    ".pdf": "application/pdf",
+    ".docx": DOCX,
+    ".xlsx": XLSX,
+    ".pptx": PPTX,
+    ".csv": "text/csv",
+    ".txt": "text/plain",
+    ".md": "text/markdown",
+    ".json": "application/json",
+}
+
+# Raised by the parsers on malformed files, which then yield no text
+_PARSE_ERRORS = (zipfile.BadZipFile, zipfile.LargeZipFile, KeyError, ElementTree.ParseError, zlib.error, EOFError, ValueError)
+if pypdf is not None:
+    _PARSE_ERRORS += (pypdf.errors.PyPdfError,)
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_S = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+
+
+def extraction_type(mime_type: Optional[str], filename: Optional[str] = None) -> Optional[str]:
+    """The format text can be extracted from, or None if unsupported.
+
+    Generic mime types (octet-stream, zip) defer to the file extension.
+    """
+    mime_type = (mime_type or "").split(";")[0].strip().lower()
+    if mime_type in ("", "application/octet-stream", "application/zip") and filename:
+        mime_type = _EXTENSIONS.get(os.path.splitext(filename)[1].lower(), mime_type)
+    if mime_type in _EXTRACTORS:
+        return mime_type
+    if mime_type.startswith("text/") or mime_type == "application/json":
+        return "text/plain"
+    return None
+
+
+def extract_text(fh: BinaryIO, mime_type: Optional[str], filename: Optional[str] = None) -> str:
+    """Extract plain text from a binary file object; "" for unsupported or malformed files."""
+    kind = extraction_type(mime_type, filename)
+    if kind is None:
+        return ""
+    parts: List[str] = []
+    size = 0
+    try:
+        for part in _EXTRACTORS[kind](fh):
+            parts.append(part)
+            size += len(part)
+            if size >= MAX_EXTRACTED_CHARS:
+                break
+    except _PARSE_ERRORS as e:
+        logger.warning("Could not extract text from %s (%s): %s: %s", filename or "file", kind, type(e).__name__, e)
+        return ""
+    return "\n".join(parts)[:MAX_EXTRACTED_CHARS]
+
+
+def _seekable(fh: BinaryIO) -> BinaryIO:
+    """Zip and PDF readers need random access; spool streams (e.g. S3 bodies) to disk."""
+    try:
+        if fh.seekable():
+            return fh
+    except AttributeError:
+        pass
+    spooled = tempfile.SpooledTemporaryFile(max_size=16 * 1024 * 1024)
+    shutil.copyfileobj(fh, spooled)
+    spooled.seek(0)
+    return spooled
+
+
+def _plain_text(fh: BinaryIO) -> Iterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    remaining = MAX_TEXT_BYTES
+    while remaining > 0:
+        chunk = fh.read(min(1024 * 1024, remaining))
+        if not chunk:
+            break
+        remaining -= len(chunk)
+        yield decoder.decode(chunk)
+    yield decoder.decode(b"", final=True)
+
+
+def _csv(fh: BinaryIO) -> Iterator[str]:
+    text = io.TextIOWrapper(fh, encoding="utf-8", errors="replace", newline="")
+    try:
+        for row in csv.reader(text):
+            if any(cell.strip() for cell in row):
+                yield "\t".join(row)
+    finally:
+        text.detach()
+
+
+def _iter_elements(source, tag: str) -> Iterator[ElementTree.Element]:
+    """Stream elements with `tag` from an XML file, freeing them as we go."""
+    for _, element in ElementTree.iterparse(source, events=("end",)):
+        if element.tag == tag:
+            yield element
+            element.clear()
+
+
+def _docx(fh: BinaryIO) -> Iterator[str]:
+    with zipfile.ZipFile(_seekable(fh)) as archive:
+        with archive.open("word/document.xml") as document:
+            for paragraph in _iter_elements(document, _W + "p"):
+                text = "".join(node.text or "" for node in paragraph.iter(_W + "t"))
+                if text.strip():
+                    yield text
+
+
+def _numbered(names: List[str], pattern: str) -> List[str]:
+    regex = re.compile(pattern)
+    matches = [(int(m.group(1)), name) for name in names for m in [regex.fullmatch(name)] if m]
+    return [name for _, name in sorted(matches)]
+
+
+def _xlsx(fh: BinaryIO) -> Iterator[str]:
+    with zipfile.ZipFile(_seekable(fh)) as archive:
+        names = archive.namelist()
+        shared: List[str] = []
+        if "xl/sharedStrings.xml" in names:
+            with archive.open("xl/sharedStrings.xml") as strings:
+                for item in _iter_elements(strings, _S + "si"):
+                    shared.append("".join(node.text or "" for node in item.iter(_S + "t")))
+        for sheet in _numbered(names, r"xl/worksheets/sheet(\d+)\.xml"):
+            with archive.open(sheet) as xml:
+                for row in _iter_elements(xml, _S + "row"):
+                    cells = []
+                    for cell in row.iter(_S + "c"):
+                        kind = cell.get("t")
+                        if kind == "inlineStr":
+                            cells.append("".join(node.text or "" for node in cell.iter(_S + "t")))
+                            continue
+                        value = cell.find(_S + "v")
+                        if value is None or value.text is None:
+                            continue
+                        if kind == "s":
+                            index = int(value.text)
+                            cells.append(shared[index] if index < len(shared) else "")
+                        else:
+                            cells.append(value.text)
+                    if any(cells):
+                        yield "\t".join(cells)
+
+
+def _pptx(fh: BinaryIO) -> Iterator[str]:
+    with zipfile.ZipFile(_seekable(fh)) as archive:
+        for slide in _numbered(archive.namelist(), r"ppt/slides/slide(\d+)\.xml"):
+            with archive.open(slide) as xml:
+                for paragraph in _iter_elements(xml, _A + "p"):
+                    text = "".join(node.text or "" for node in paragraph.iter(_A + "t"))
+                    if text.strip():
+                        yield text
+
+
+def _pdf(fh: BinaryIO) -> Iterator[str]:
+    if pypdf is not None:
+        for page in pypdf.PdfReader(_seekable(fh)).pages:
+            text = page.extract_text() or ""
+            if text.strip():
+                yield text
+        return
+    yield from _pdf_fallback(fh)
+
+
+# Minimal PDF text extraction used when pypdf is not installed: inflates
+# content streams and reads string operands of the text-showing operators.
+# Handles the simple (non-CID) fonts most generators use for Latin text.
+_PDF_BLOCK = 1024 * 1024
+_DICT_LOOKBACK = 8 * 1024  # Longest stream dictionary looked for before a `stream` keyword
+_DICT_TOKEN_RE = re.compile(rb"<<|>>")
+# Content streams are scanned token by token: an operand that does not match
+# where it starts (e.g. an unterminated string) ends the scan instead of being
+# retried from every later position
+_CONTENT_TOKEN_RE = re.compile(rb"[(<\[]|T\*|ET|Td|TD")
+_OPERAND_RE = re.compile(rb"\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]*>|\[(?:\\.|[^\]])*\]")
+_TEXT_OPERATOR_RE = re.compile(rb"\s*(Tj|TJ|'|\")")
+_STRING_RE = re.compile(rb"\((?:\\.|[^\\)])*\)|<[0-9A-Fa-f\s]*>")
+_STRING_START_RE = re.compile(rb"[(<]")
+_ESCAPES = {b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"f": b"\f", b"(": b"(", b")": b")", b"\\": b"\\"}
+
+
+def _pdf_string(token: bytes) -> str:
+    if token.startswith(b"<"):
+        digits = re.sub(rb"\s", b"", token[1:-1])
+        if len(digits) % 2:
+            digits += b"0"
+        return bytes.fromhex(digits.decode()).decode("latin-1")
+    body, out, i = token[1:-1], bytearray(), 0
+    while i < len(body):
+        byte = body[i:i + 1]
+        if byte != b"\\":
+            out += byte
+            i += 1
+            continue
+        nxt = body[i + 1:i + 2]
+        octal = re.match(rb"[0-7]{1,3}", body[i + 1:i + 4])
+        if octal:
+            out.append(int(octal.group(), 8) & 0xFF)
+            i += 1 + len(octal.group())
+        else:
+            out += _ESCAPES.get(nxt, b"" if nxt in (b"\n", b"\r") else nxt)
+            i += 2
+    return out.decode("latin-1")
+
+
+def _pdf_array_strings(array: bytes) -> Iterator[bytes]:
+    pos = 1
+    while True:
+        start = _STRING_START_RE.search(array, pos)
+        if start is None:
+            return
+        string = _STRING_RE.match(array, start.start())
+        if string is None:
+            if start.group() == b"(":
+                return  # Unterminated
+            pos = start.end()
+            continue
+        yield string.group()
+        pos = string.end()
+
+
+def _stream_dict(head: bytes) -> Optional[bytes]:
+    """The dictionary that `head`, the bytes before a `stream` keyword, ends with."""
+    head = head.rstrip()
+    if not head.endswith(b">>"):
+        return None
+    depth = 0
+    for token in reversed(list(_DICT_TOKEN_RE.finditer(head))):
+        depth += 1 if token.group() == b">>" else -1
+        if depth == 0:
+            return head[token.start():]
+    return None
+
+
+def _pdf_streams(fh: BinaryIO) -> Iterator[Tuple[bytes, bytes]]:
+    """(dictionary, data) of each stream object, reading the file in blocks.
+
+    Each `stream` keyword is found by a forward search and its dictionary by
+    a look-back that stops at the previous keyword, so the scan is linear in
+    the file size. Data of streams that are skipped anyway (images, other
+    encodings) is not kept.
+    """
+    # `floor` is the end of the last keyword seen: dictionaries start after it
+    buffer, scan, floor, eof = bytearray(), 0, 0, False
+    while True:
+        keyword = buffer.find(b"stream", scan)
+        if keyword == -1 or len(buffer) < keyword + 8:
+            if eof:
+                return
+            if keyword == -1:
+                scan = max(scan, len(buffer) - 5)  # A keyword may be split across blocks
+            # Drop what was scanned, keeping room for the dictionary of the next keyword
+            drop = max(0, scan - _DICT_LOOKBACK)
+            del buffer[:drop]
+            scan, floor = scan - drop, max(0, floor - drop)
+            block = fh.read(_PDF_BLOCK)
+            eof = not block
+            buffer += block
+            continue
+        scan, lookback = keyword + 6, max(floor, keyword - _DICT_LOOKBACK)
+        floor = scan
+        if buffer[max(0, keyword - 3):keyword] == b"end":
+            continue
+        header = _stream_dict(bytes(buffer[lookback:keyword]))
+        eol = 2 if buffer[scan:scan + 2] == b"\r\n" else 1 if buffer[scan:scan + 1] in (b"\n", b"\r") else 0
+        if header is None or not eol:
+            continue
+        wanted = b"/FlateDecode" in header or b"/Filter" not in header
+        start = scan + eol
+        end = buffer.find(b"endstream", start)
+        while end == -1 and not eof:
+            search = max(start, len(buffer) - 8)
+            drop = start if wanted else search
+            del buffer[:drop]
+            start, search = max(0, start - drop), search - drop
+            block = fh.read(_PDF_BLOCK)
+            eof = not block
+            buffer += block
+            end = buffer.find(b"endstream", search)
+        if end == -1:
+            return
+        if wanted:
+            data = bytes(buffer[start:end])
+            yield header, data[:-2] if data.endswith(b"\r\n") else data[:-1] if data.endswith((b"\n", b"\r")) else data
+        scan = floor = end + 9
+
+
+def _pdf_fallback(fh: BinaryIO) -> Iterator[str]:
+    for header, stream in _pdf_streams(fh):
+        if b"/FlateDecode" in header:
+            try:
+                stream = zlib.decompress(stream)
+            except zlib.error:
+                continue
+        if b"BT" not in stream:
+            continue
+        line: List[str] = []
+        lines: List[str] = []
+        pos = 0
+        while True:
+            token = _CONTENT_TOKEN_RE.search(stream, pos)
+            if token is None:
+                break
+            if token.group() not in b"(<[":
+                # T*, ET, Td, TD: the line ends
+                if line:
+                    lines.append("".join(line))
+                    line = []
+                pos = token.end()
+                continue
+            operand = _OPERAND_RE.match(stream, token.start())
+            if operand is None:
+                if token.group() != b"<":
+                    break  # Unterminated string or array
+                pos = token.end()  # A dictionary, not a hex string
+                continue
+            pos = operand.end()
+            operator = _TEXT_OPERATOR_RE.match(stream, pos)
+            if operator is None:
+                continue
+            pos = operator.end()
+            if operator.group(1) == b"TJ":
+                line.append("".join(_pdf_string(s) for s in _pdf_array_strings(operand.group())))
+            else:
+                line.append(_pdf_string(operand.group()))
+        if line:
+            lines.append("".join(line))
+        text = "\n".join(l for l in lines if l.strip())
+        if text:
+            yield text
+
+
+_EXTRACTORS: Dict[str, Callable[[BinaryIO], Iterator[str]]] = {
+    "application/pdf": _pdf,
+    DOCX: _docx,
+    XLSX: _xlsx,
+    PPTX: _pptx,
+    "text/csv": _csv,
+    "text/plain": _plain_text,
+}
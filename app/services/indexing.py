@@ -0,0 +1,152 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.models import Asset, Chunk
+from app.services import events, lexical, vectors
+from app.services.chunking import TextChunk, load_text, split_text
+
+WARM_BATCH_SIZE = 256  # Chunks read, and embedded, per batch when filling the indexes at startup
+
+
+def prepare_asset(
+    content: Optional[str], blob_digest: Optional[str], mime_type: Optional[str], filename: Optional[str] = None
+) -> Tuple[str, List[TextChunk], np.ndarray]:
+    """The CPU-heavy part of indexing: extract text, chunk it and embed the chunks.
+
+    Touches no database or in-memory index, so it can run in a worker process.
+    """
+    text = load_text(content, blob_digest, mime_type, filename)
+    pieces = list(split_text(text))
+    embedder = vectors.get_embedder()
+    if not pieces:
+        return text, pieces, np.zeros((0, embedder.dim), dtype=np.float32)
+    return text, pieces, embedder.embed([piece.text for piece in pieces])
+
+
+def asset_payload(asset: Asset) -> dict:
+    """Arguments for `prepare_asset`."""
+    return {
+        "content": asset.content,
+        "blob_digest": asset.blob_digest,
+        "mime_type": asset.mime_type,
+        "filename": asset.file_path or asset.name,
+    }
+
+
+def apply_asset_index(db: Session, asset: Asset, text: str, pieces: List[TextChunk], embeddings: np.ndarray) -> None:
+    """Store extracted text and chunks for `asset` and swap them into the search indexes.
+
+    Only this asset's postings and rows change, so the cost is proportional
+    to the content that changed, not to the workspace.
+    """
+    stale = [chunk.id for chunk in asset.chunks]
+    asset.chunks = [
+        Chunk(
+            position=position,
+            start_offset=piece.start,
+            end_offset=piece.end,
+            token_count=piece.token_count,
+            text=piece.text
+        )
+        for position, piece in enumerate(pieces)
+    ]
+    if asset.file_path is not None:
+        # Uploaded files: keep the extracted text so it is never re-extracted
+        asset.text_content = text or None
+    asset.indexed_at = datetime.utcnow()
+    db.commit()
+    _remove_chunks(asset.workspace_id, stale)
+    _add_chunks(asset.workspace_id, [chunk.id for chunk in asset.chunks], [piece.text for piece in pieces], embeddings)
+
+
+def warm_indexes(db: Session, batch_size: int = WARM_BATCH_SIZE) -> int:
+    """Add every stored chunk missing from its workspace's search indexes; returns how many were missing.
+
+    BM25 indexes live in memory and are empty after a restart, and vectors
+    can be missing for chunks written just before a crash. Run once at
+    startup so queries only ever read the indexes.
+    """
+    rows = (
+        db.query(Chunk.id, Chunk.text, Asset.workspace_id)
+        .join(Asset, Chunk.asset_id == Asset.id)
+        .order_by(Asset.workspace_id)
+        .yield_per(batch_size)
+    )
+    missing = 0
+    pending_workspace, pending_ids, pending_texts = None, [], []
+    for chunk_id, text, workspace_id in rows:
+        if pending_ids and (workspace_id != pending_workspace or len(pending_ids) >= batch_size):
+            _embed_chunks(pending_workspace, pending_ids, pending_texts)
+            pending_ids, pending_texts = [], []
+        pending_workspace = workspace_id
+        lexical_index = lexical.get_index(workspace_id)
+        in_lexical = chunk_id in lexical_index
+        in_vectors = chunk_id in vectors.get_index(workspace_id)
+        if not in_lexical:
+            lexical_index.add(chunk_id, text)
+        if not in_vectors:
+            pending_ids.append(chunk_id)
+            pending_texts.append(text)
+        missing += not (in_lexical and in_vectors)
+    if pending_ids:
+        _embed_chunks(pending_workspace, pending_ids, pending_texts)
+    return missing
+
+
+def _embed_chunks(workspace_id: str, chunk_ids: List[str], texts: List[str]) -> None:
+    vectors.get_index(workspace_id).add(chunk_ids, vectors.get_embedder().embed(texts))
+
+
+def _add_chunks(workspace_id: str, chunk_ids: List[str], texts: List[str], embeddings: np.ndarray) -> None:
+    if not chunk_ids:
+        return
+    lexical_index = lexical.get_index(workspace_id)
+    for chunk_id, text in zip(chunk_ids, texts):
+        lexical_index.add(chunk_id, text)
+    vectors.get_index(workspace_id).add(chunk_ids, embeddings)
+
+
+def _remove_chunks(workspace_id: str, chunk_ids: List[str]) -> None:
+    if not chunk_ids:
+        return
+    lexical_index = lexical.get_index(workspace_id)
+    for chunk_id in chunk_ids:
+        lexical_index.remove(chunk_id)
+    vectors.get_index(workspace_id).remove(chunk_ids)
+
+
+@events.subscribe(events.ASSET_DELETED)
+def _on_asset_deleted(db: Session, asset_id: str, workspace_id: str, chunk_ids: List[str]) -> None:
+    _remove_chunks(workspace_id, chunk_ids)
+
+
+@events.subscribe(events.WORKSPACE_MERGED)
+def _on_workspace_merged(db: Session, source_id: str, target_id: str, asset_ids: List[str]) -> None:
+    rows = db.query(Chunk.id, Chunk.text).filter(Chunk.asset_id.in_(asset_ids)).all()
+    chunk_ids = [row.id for row in rows]
+    texts = {row.id: row.text for row in rows}
+
+    lexical_index = lexical.get_index(target_id)
+    for chunk_id in chunk_ids:
+        lexical_index.add(chunk_id, texts[chunk_id])
+
+    # Move already-computed embeddings instead of re-embedding the text
+    moved_ids, moved_vectors = vectors.get_index(source_id).take(chunk_ids)
+    target = vectors.get_index(target_id)
+    if moved_ids:
+        target.add(moved_ids, moved_vectors)
+    missing = [chunk_id for chunk_id in chunk_ids if chunk_id not in target]
+    if missing:
+        target.add(missing, vectors.get_embedder().embed([texts[chunk_id] for chunk_id in missing]))
+
+    lexical.drop_index(source_id)
+    vectors.drop_index(source_id)
+
+
+@events.subscribe(events.WORKSPACE_DELETED)
+def _on_workspace_deleted(db: Session, workspace_id: str) -> None:
+    lexical.drop_index(workspace_id)
+    vectors.drop_index(workspace_id)
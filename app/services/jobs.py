@@ -0,0 +1,231 @@
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.database import SessionLocal
+from app.models import Asset, IndexJob
+from app.services import events
+from app.services.indexing import apply_asset_index, asset_payload, prepare_asset, warm_indexes
+
+logger = logging.getLogger(__name__)
+
+# Worker processes for indexing; 0 runs jobs inline in the request that queued them
+INDEX_WORKERS = int(os.getenv("INDEX_WORKERS", "2"))
+INDEX_MAX_ATTEMPTS = int(os.getenv("INDEX_MAX_ATTEMPTS", "3"))
+POLL_INTERVAL = 1.0  # Seconds between checks for jobs whose retry backoff has elapsed
+RETRY_BACKOFF = 2.0  # Seconds, doubled per failed attempt
+
+
+def enqueue_index_jobs(db: Session, asset_ids: Iterable[str]) -> List[IndexJob]:
+    """Queue assets for (re)indexing and return the jobs.
+
+    When the worker pool is running the jobs are picked up in the
+    background; otherwise they run immediately in the caller.
+    """
+    jobs = [IndexJob(asset_id=asset_id) for asset_id in asset_ids]
+    db.add_all(jobs)
+    db.commit()
+    if _pool is not None:
+        _pool.notify()
+    else:
+        for job_id, asset_id in [(job.id, job.asset_id) for job in jobs]:
+            if _claim(db, job_id):
+                _run_inline(db, job_id, asset_id)
+    return jobs
+
+
+def ensure_index_jobs(db: Session, asset_ids: Iterable[str]) -> List[IndexJob]:
+    """Queue jobs for those of `asset_ids` that have never had one, e.g. assets
+    created before indexing existed. Assets whose job is pending or failed are
+    left to the job's own retries."""
+    asset_ids = list(asset_ids)
+    if not asset_ids:
+        return []
+    known = {asset_id for (asset_id,) in db.query(IndexJob.asset_id).filter(IndexJob.asset_id.in_(asset_ids)).distinct()}
+    missing = [asset_id for asset_id in asset_ids if asset_id not in known]
+    return enqueue_index_jobs(db, missing) if missing else []
+
+
+def _run_inline(db: Session, job_id: str, asset_id: str) -> None:
+    try:
+        payload = _payload(db, asset_id)
+        _complete(db, job_id, asset_id, prepare_asset(**payload) if payload else None)
+    except Exception as e:
+        db.rollback()
+        _fail(db, job_id, e)
+
+
+def _claim(db: Session, job_id: str) -> bool:
+    """Atomically move a queued job to running; False if someone else got it."""
+    claimed = db.query(IndexJob).filter(IndexJob.id == job_id, IndexJob.status == "queued").update(
+        {IndexJob.status: "running", IndexJob.attempts: IndexJob.attempts + 1, IndexJob.updated_at: datetime.utcnow()},
+        synchronize_session=False
+    )
+    db.commit()
+    return claimed == 1
+
+
+def _payload(db: Session, asset_id: str) -> Optional[dict]:
+    asset = db.query(Asset).filter(Asset.id == asset_id).first()
+    if asset is None:
+        return None
+    return asset_payload(asset)
+
+
+def _complete(db: Session, job_id: str, asset_id: str, result) -> None:
+    job = db.query(IndexJob).filter(IndexJob.id == job_id).first()
+    asset = db.query(Asset).filter(Asset.id == asset_id).first()
+    if asset is None:
+        # Deleted while the job was queued or running
+        job.status = "cancelled"
+        db.commit()
+        return
+    job.status = "done"
+    job.error = None
+    apply_asset_index(db, asset, *result)
+
+
+def _fail(db: Session, job_id: str, error: Exception) -> None:
+    job = db.query(IndexJob).filter(IndexJob.id == job_id).first()
+    job.error = f"{type(error).__name__}: {error}"
+    if job.attempts < INDEX_MAX_ATTEMPTS:
+        job.status = "queued"
+        job.run_after = datetime.utcnow() + timedelta(seconds=RETRY_BACKOFF * 2 ** (job.attempts - 1))
+    else:
+        job.status = "failed"
+    db.commit()
+    logger.warning("Indexing asset %s failed (attempt %s): %s", job.asset_id, job.attempts, job.error)
+
+
+class IndexWorkerPool:
+    """Runs queued index jobs on a pool of worker processes.
+
+    A dispatcher thread claims due jobs from the `index_jobs` table, hands the
+    CPU-heavy part (text loading, chunking, embedding) to the process pool and
+    applies the results to the database and the in-memory indexes. Jobs left
+    running by a previous process are re-queued on start.
+    """
+
+    def __init__(self, workers: int, session_factory=SessionLocal):
+        self.workers = workers
+        self._session_factory = session_factory
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._wake = threading.Event()
+        self._stopping = False
+
+    def start(self) -> None:
+        db = self._session_factory()
+        try:
+            db.query(IndexJob).filter(IndexJob.status == "running").update(
+                {IndexJob.status: "queued"}, synchronize_session=False
+            )
+            db.commit()
+        finally:
+            db.close()
+        self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        self._thread = threading.Thread(target=self._run, name="index-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wake.clear()
+            try:
+                ran = self._run_due_jobs()
+            except Exception:
+                logger.exception("Index dispatcher error")
+                ran = 0
+            if not ran:
+                self._wake.wait(POLL_INTERVAL)
+
+    def _run_due_jobs(self) -> int:
+        db = self._session_factory()
+        try:
+            due = db.query(IndexJob.id, IndexJob.asset_id).filter(
+                IndexJob.status == "queued", IndexJob.run_after <= datetime.utcnow()
+            ).order_by(IndexJob.run_after).limit(self.workers * 4).all()
+
+            futures = {}
+            for job_id, asset_id in due:
+                if not _claim(db, job_id):
+                    continue
+                payload = _payload(db, asset_id)
+                if payload is None:
+                    _complete(db, job_id, asset_id, None)
+                    continue
+                futures[self._executor.submit(prepare_asset, **payload)] = (job_id, asset_id)
+
+            for future in as_completed(futures):
+                job_id, asset_id = futures[future]
+                try:
+                    _complete(db, job_id, asset_id, future.result())
+                except Exception as e:
+                    db.rollback()
+                    _fail(db, job_id, e)
+            return len(due)
+        finally:
+            db.close()
+
+
+_pool: Optional[IndexWorkerPool] = None
+
+
+def start_workers() -> None:
+    global _pool
+    if INDEX_WORKERS > 0 and _pool is None:
+        _pool = IndexWorkerPool(INDEX_WORKERS)
+        _pool.start()
+
+
+def warm_up_indexes(session_factory=SessionLocal) -> None:
+    """Fill the in-memory search indexes from the database, as `indexing.warm_indexes`."""
+    db = session_factory()
+    try:
+        missing = warm_indexes(db)
+        if missing:
+            logger.info("Added %s chunks to the search indexes", missing)
+    except Exception:
+        logger.exception("Search index warm-up failed")
+    finally:
+        db.close()
+
+
+def stop_workers() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.stop()
+        _pool = None
+
+
+@events.subscribe(events.ASSET_CREATED)
+def _on_asset_created(db: Session, asset_id: str) -> None:
+    enqueue_index_jobs(db, [asset_id])
+
+
+@events.subscribe(events.KIT_ASSETS_CHANGED)
+def _on_kit_assets_changed(db: Session, kit_id: str, added: List[str], removed: List[str]) -> None:
+    # Indexes are per workspace and kit queries filter by membership, so
+    # only assets that were never indexed need any work
+    pending = [
+        asset_id for (asset_id,) in
+        db.query(Asset.id).filter(Asset.id.in_(added), Asset.indexed_at.is_(None))
+    ]
+    if pending:
+        enqueue_index_jobs(db, pending)
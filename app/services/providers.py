@@ -0,0 +1,456 @@
+import asyncio
+import json
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from typing import AsyncIterator, List, Optional, Tuple
+
+import httpx
+
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+# Seconds to wait for a provider response
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+# In-flight requests allowed per provider; further queries wait their turn
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "64"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "64"))
+# Pooled keep-alive connections per provider
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "200"))
+# Consecutive failures that open a provider's circuit, and seconds before it is retried
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_SECONDS = float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30"))
+# "on" sends a hedged request to the other provider when the first is slower than its p95
+LLM_HEDGING = os.getenv("LLM_HEDGING", "on")
+# Hedge delay used until a provider has LATENCY_MIN_SAMPLES latencies recorded
+LLM_HEDGE_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "5"))
+# Models used when a query fails over (or is hedged) to the other provider
+OPENAI_FAILOVER_MODEL = os.getenv("OPENAI_FAILOVER_MODEL", "gpt-3.5-turbo")
+GEMINI_FAILOVER_MODEL = os.getenv("GEMINI_FAILOVER_MODEL", "gemini-pro")
+
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 20
+MIN_HEDGE_DELAY_SECONDS = 0.05
+
+SYSTEM_PROMPT = "You are a helpful assistant that answers questions based on provided context. Be extremely concise and direct. Do not be verbose."
+
+
+class ProviderError(Exception):
+    """A provider request failed (transport error, timeout or error status)."""
+
+
+class LatencyTracker:
+    """Latencies of a provider's recent successful requests."""
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self._samples: deque = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        """The p-th percentile (0-100) of recent latencies, None without enough samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < LATENCY_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * p / 100))]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class CircuitBreaker:
+    """Stops sending requests to a failing provider.
+
+    Opens after `failures` consecutive failures. Once `reset_seconds` have
+    passed a single probe request is let through (half-open): its success
+    closes the circuit, its failure opens it again. A probe that ends without
+    a verdict (cancelled, rejected as a bad request, a malformed reply) also
+    opens it again, so the next probe follows after another `reset_seconds`.
+    A probe claimed but never sent or settled is given up after
+    `probe_timeout_seconds`.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, reset_seconds: float = LLM_BREAKER_RESET_SECONDS,
+                 probe_timeout_seconds: float = LLM_TIMEOUT_SECONDS):
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.probe_timeout_seconds = probe_timeout_seconds
+        self.state = self.CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probe_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a request may be sent now; claims the probe when half-open."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if (
+                self.state == self.OPEN and now - self._opened_at >= self.reset_seconds
+                or self.state == self.HALF_OPEN and now - self._probe_at >= self.probe_timeout_seconds
+            ):
+                self.state = self.HALF_OPEN
+                self._probe_at = now
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = self.CLOSED
+            self._consecutive = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive += 1
+            if self.state == self.HALF_OPEN or self._consecutive >= self.failures:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """End a request that recorded neither success nor failure."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+def _is_outage(status_code: int) -> bool:
+    """Statuses that say the provider is unhealthy, as opposed to a bad request."""
+    return status_code in (408, 429) or status_code >= 500
+
+
+class _LoopState:
+    """A provider's HTTP client and semaphore, bound to the event loop that made them."""
+
+    def __init__(self, max_concurrency: int, transport: Optional[httpx.AsyncBaseTransport]):
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=10.0),
+            limits=httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS),
+            transport=transport,
+        )
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+
+
+class AsyncProvider:
+    """Base for async chat providers: one pooled HTTP client per event loop."""
+
+    name = "provider"
+
+    def __init__(self, api_key: Optional[str], base_url: str, max_concurrency: int,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self._transport = transport
+        self._states: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopState]" = weakref.WeakKeyDictionary()
+        self.latency = LatencyTracker()
+        self.breaker = CircuitBreaker()
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.api_key)
+
+    def _state(self) -> _LoopState:
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = _LoopState(self.max_concurrency, self._transport)
+        return state
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait for this provider before hedging: its recent p95 latency."""
+        p95 = self.latency.percentile(95)
+        return LLM_HEDGE_DELAY_SECONDS if p95 is None else max(p95, MIN_HEDGE_DELAY_SECONDS)
+
+    async def _post(self, path: str, json: dict, headers: dict) -> dict:
+        state = self._state()
+        recorded = False
+        try:
+            async with state.semaphore:
+                start = time.monotonic()
+                try:
+                    response = await state.client.post(f"{self.base_url}{path}", json=json, headers=headers)
+                except httpx.HTTPError as e:
+                    self.breaker.record_failure()
+                    recorded = True
+                    raise ProviderError(f"{self.name} request failed: {type(e).__name__}: {e}") from e
+            if response.status_code >= 400:
+                if _is_outage(response.status_code):
+                    self.breaker.record_failure()
+                    recorded = True
+                raise ProviderError(f"{self.name} returned {response.status_code}: {response.text[:200]}")
+            data = response.json()
+            self.breaker.record_success()
+            recorded = True
+            self.latency.record(time.monotonic() - start)
+            return data
+        finally:
+            if not recorded:
+                # Cancelled (e.g. the losing side of a hedge), a client error or a malformed reply
+                self.breaker.release()
+
+    async def _stream(self, path: str, payload: dict, headers: dict, params: Optional[dict] = None) -> AsyncIterator[dict]:
+        """POST and yield the JSON `data:` events of a server-sent event response.
+
+        The concurrency slot is held until the stream ends or is closed.
+        """
+        state = self._state()
+        recorded = False
+        async with state.semaphore:
+            try:
+                async with state.client.stream(
+                    "POST", f"{self.base_url}{path}", json=payload, headers=headers, params=params
+                ) as response:
+                    if response.status_code >= 400:
+                        if _is_outage(response.status_code):
+                            self.breaker.record_failure()
+                            recorded = True
+                        body = (await response.aread()).decode("utf-8", errors="replace")
+                        raise ProviderError(f"{self.name} returned {response.status_code}: {body[:200]}")
+                    self.breaker.record_success()
+                    recorded = True
+                    async for line in response.aiter_lines():
+                        if not line.startswith("data:"):
+                            continue
+                        data = line[5:].strip()
+                        if data == "[DONE]":
+                            return
+                        if data:
+                            yield json.loads(data)
+            except httpx.HTTPError as e:
+                self.breaker.record_failure()
+                recorded = True
+                raise ProviderError(f"{self.name} request failed: {type(e).__name__}: {e}") from e
+            finally:
+                if not recorded:
+                    self.breaker.release()
+
+    async def complete(self, query: str, context: str, model: str) -> str:
+        raise NotImplementedError
+
+    def stream(self, query: str, context: str, model: str) -> AsyncIterator[str]:
+        """The answer as text pieces, as the provider generates them."""
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        """Close the HTTP client of the running event loop."""
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is not None:
+            await state.client.aclose()
+
+
+class OpenAIProvider(AsyncProvider):
+    """OpenAI-compatible chat completions API."""
+
+    name = "openai"
+
+    def _payload(self, query: str, context: str, model: str) -> dict:
+        return {
+            "model": model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": f"Context:\n{context}\n\nQuestion: {query}"},
+            ],
+            "temperature": 0.7,
+            "max_tokens": 300,
+        }
+
+    async def complete(self, query: str, context: str, model: str) -> str:
+        data = await self._post(
+            "/chat/completions",
+            json=self._payload(query, context, model),
+            headers={"Authorization": f"Bearer {self.api_key}"},
+        )
+        return data["choices"][0]["message"]["content"]
+
+    async def stream(self, query: str, context: str, model: str) -> AsyncIterator[str]:
+        events = self._stream(
+            "/chat/completions",
+            {**self._payload(query, context, model), "stream": True},
+            headers={"Authorization": f"Bearer {self.api_key}"},
+        )
+        try:
+            async for event in events:
+                for choice in event.get("choices", []):
+                    text = (choice.get("delta") or {}).get("content")
+                    if text:
+                        yield text
+        finally:
+            await events.aclose()  # Release the connection and slot if the consumer stops early
+
+
+class GeminiProvider(AsyncProvider):
+    """Google Gemini generateContent REST API."""
+
+    name = "gemini"
+
+    def _payload(self, query: str, context: str) -> dict:
+        prompt = f"Context:\n{context}\n\nQuestion: {query}\n\nAnswer concisely and directly based on the context. Avoid unnecessary words."
+        return {"contents": [{"parts": [{"text": prompt}]}]}
+
+    @staticmethod
+    def _text(data: dict) -> str:
+        candidates = data.get("candidates") or [{}]
+        return "".join(part.get("text", "") for part in candidates[0].get("content", {}).get("parts", []))
+
+    async def complete(self, query: str, context: str, model: str) -> str:
+        data = await self._post(
+            f"/models/{model}:generateContent",
+            json=self._payload(query, context),
+            headers={"x-goog-api-key": self.api_key},
+        )
+        return self._text(data)
+
+    async def stream(self, query: str, context: str, model: str) -> AsyncIterator[str]:
+        events = self._stream(
+            f"/models/{model}:streamGenerateContent",
+            self._payload(query, context),
+            headers={"x-goog-api-key": self.api_key},
+            params={"alt": "sse"},
+        )
+        try:
+            async for event in events:
+                text = self._text(event)
+                if text:
+                    yield text
+        finally:
+            await events.aclose()
+
+
+openai_provider = OpenAIProvider(os.getenv("OPENAI_API_KEY"), OPENAI_BASE_URL, OPENAI_MAX_CONCURRENCY)
+gemini_provider = GeminiProvider(os.getenv("GEMINI_API_KEY"), GEMINI_BASE_URL, GEMINI_MAX_CONCURRENCY)
+
+
+def provider_for(model: str) -> AsyncProvider:
+    return gemini_provider if model.startswith("gemini") else openai_provider
+
+
+def _failover_target(model: str) -> Tuple[AsyncProvider, str]:
+    """The other provider and the model to ask it for."""
+    if provider_for(model) is gemini_provider:
+        return openai_provider, OPENAI_FAILOVER_MODEL
+    return gemini_provider, GEMINI_FAILOVER_MODEL
+
+
+def llm_available(model: str) -> bool:
+    """Whether a query for `model` can reach an LLM, directly or by failover."""
+    return provider_for(model).configured or _failover_target(model)[0].configured
+
+
+def _routes(model: str) -> List[Tuple[AsyncProvider, str]]:
+    """Configured (provider, model) pairs to try for `model`, preferred first."""
+    return [(provider, name) for provider, name in ((provider_for(model), model), _failover_target(model)) if provider.configured]
+
+
+class AsyncLLMService:
+    """Async counterpart of LLMService.query_with_context.
+
+    Waiting on the provider yields the event loop instead of pinning a worker
+    thread, so many queries can be in flight at once. When both providers
+    are configured, a query whose provider has an open circuit or fails goes
+    to the other one, and a query slower than its provider's p95 latency is
+    hedged with a request to the other; the first answer wins.
+    """
+
+    @staticmethod
+    async def query_with_context(query: str, context: str, model: str = "gpt-3.5-turbo") -> str:
+        routes = _routes(model)
+        if not routes:
+            return f"LLM not configured. Here is the relevant content:\n\n{context[:500]}..."
+
+        pending = {}  # task -> provider
+        errors = []
+        try:
+            for provider, name in routes:
+                if not provider.breaker.allow():
+                    errors.append(ProviderError(f"{provider.name} circuit open"))
+                    continue
+                task = asyncio.ensure_future(provider.complete(query, context, name))
+                pending[task] = provider
+                can_hedge = LLM_HEDGING == "on" and provider is not routes[-1][0]
+                while pending:
+                    done, _ = await asyncio.wait(
+                        pending, timeout=provider.hedge_delay() if can_hedge else None,
+                        return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if not done:
+                        break  # Slow: hedge with the next provider, keep waiting on this one
+                    for finished in done:
+                        del pending[finished]
+                        if finished.exception() is None:
+                            return finished.result()
+                        errors.append(finished.exception())
+                    if not pending:
+                        break  # Failed: fail over to the next provider
+                    can_hedge = False
+            # Nothing left to start: the first remaining request to succeed wins
+            while pending:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for finished in done:
+                    del pending[finished]
+                    if finished.exception() is None:
+                        return finished.result()
+                    errors.append(finished.exception())
+        finally:
+            for task in pending:
+                task.cancel()
+        raise errors[-1] if errors else ProviderError("No LLM provider available")
+
+    @staticmethod
+    async def stream_with_context(query: str, context: str, model: str = "gpt-3.5-turbo") -> AsyncIterator[str]:
+        """`query_with_context`, yielding the answer in pieces as it is generated.
+
+        Fails over to the other provider if the stream fails before its first
+        piece; streams are not hedged.
+        """
+        routes = _routes(model)
+        if not routes:
+            yield f"LLM not configured. Here is the relevant content:\n\n{context[:500]}..."
+            return
+        error: Optional[Exception] = None
+        for provider, name in routes:
+            if not provider.breaker.allow():
+                error = ProviderError(f"{provider.name} circuit open")
+                continue
+            pieces = provider.stream(query, context, name)
+            started = False
+            try:
+                async for text in pieces:
+                    started = True
+                    yield text
+                return
+            except ProviderError as e:
+                if started:
+                    raise
+                error = e
+            finally:
+                await pieces.aclose()
+        raise error
+
+
+def provider_status() -> dict:
+    """Circuit state and recent latency percentiles per provider."""
+    return {
+        provider.name: {
+            "configured": provider.configured,
+            "circuit": provider.breaker.state,
+            "samples": len(provider.latency),
+            "p50_seconds": provider.latency.percentile(50),
+            "p95_seconds": provider.latency.percentile(95),
+        }
+        for provider in (openai_provider, gemini_provider)
+    }
+
+
+async def close_providers() -> None:
+    for provider in (openai_provider, gemini_provider):
+        await provider.aclose()
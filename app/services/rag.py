@@ -1,10 +1,54 @@
-from typing import List, Tuple
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional, Tuple, Union
+from starlette.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session, object_session
+from app.models import Chunk
+from app.services import lexical, vectors
 from app.services import LLMService
+from app.services.jobs import ensure_index_jobs
+from app.services.context import PackedContext, pack_context, context_budget
+from app.services.providers import AsyncLLMService
+from app.services.retrieval import HYBRID_CANDIDATES, RERANK_TOP_N, StageTimings, reciprocal_rank_fusion, rerank
+
+# Number of ranked passages considered for the context; the token budget decides how many fit
+RAG_TOP_K = int(os.getenv("RAG_TOP_K", "8"))
+# "hybrid" (BM25 and embeddings, fused and reranked), "vector" (embeddings) or "lexical" (BM25)
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# Most queries accepted by one batch request
+RAG_BATCH_MAX_QUERIES = int(os.getenv("RAG_BATCH_MAX_QUERIES", "256"))
+# LLM calls one batch request keeps in flight
+RAG_BATCH_CONCURRENCY = int(os.getenv("RAG_BATCH_CONCURRENCY", "8"))
+
+_search_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="retrieval")
+
+
+class Citation(NamedTuple):
+    asset_id: str
+    chunk_id: str
+    start: int
+    end: int
+    text: str
+    score: float
+
+
+class RAGResult(NamedTuple):
+    answer: str
+    sources: List[str]
+    citations: List[Citation]
+    tokens_used: int = 0  # Context tokens sent to the model
+    timings: Optional[dict] = None  # Milliseconds per stage (StageTimings)
+
+
+async def text_stream(text: str) -> AsyncIterator[str]:
+    """An answer already known in full, as a one-piece stream."""
+    yield text
 
 
 class RAGService:
     """Retrieval-Augmented Generation service"""
-    
+
     @staticmethod
     def retrieve_and_answer(
         query: str,
@@ -14,43 +58,284 @@ class RAGService:
     ) -> Tuple[str, List[str]]:
         """
         Retrieve relevant assets and generate answer using LLM
-        
+
         Args:
             query: User question
             assets: List of Asset objects
             use_llm: Whether to use real LLM or return raw content
             model: LLM model to use
-            
+
         Returns:
             Tuple of (answer, source_asset_ids)
         """
         if not assets:
             return "No assets found in kit to answer query.", []
-        
-        assets_content = [asset.content for asset in assets]
-        asset_ids = [asset.id for asset in assets]
-        
-        # Use LLM for semantic search
-        if use_llm:
-            try:
-                relevant_indices = LLMService.semantic_search(query, assets_content)
-                if not relevant_indices:
-                    relevant_indices = [0]  # Default to first asset
-            except Exception:
-                relevant_indices = list(range(len(assets_content)))
-        else:
-            relevant_indices = list(range(len(assets_content)))
-        
-        # Get context from relevant assets
-        context = "\n---\n".join([
-            assets_content[i] for i in relevant_indices if i < len(assets_content)
-        ])
-        
-        # Get answer from LLM
-        if use_llm:
-            answer = LLMService.query_with_context(query, context, model)
+        result = RAGService.answer_query(object_session(assets[0]), query, assets, use_llm, model)
+        return result.answer, result.sources
+
+    @staticmethod
+    def answer_query(
+        db: Session,
+        query: str,
+        assets: List,
+        use_llm: bool = True,
+        model: str = "gpt-3.5-turbo"
+    ) -> RAGResult:
+        """Retrieve the passages most relevant to `query` and answer from them.
+
+        Ranked passages are packed into the model's context token budget.
+        Sources are the ids of the assets the packed passages came from, best
+        first; citations give each passage with its character offsets.
+        """
+        if not assets:
+            return RAGResult("No assets found in kit to answer query.", [], [])
+        timings = StageTimings()
+        packed = RAGService.build_context(db, query, assets, model, timings)
+        with timings.stage("llm"):
+            answer = LLMService.query_with_context(query, packed.text, model) if use_llm else None
+        return RAGService._result(packed, assets, answer, timings)
+
+    @staticmethod
+    async def answer_query_async(
+        db: Session,
+        query: str,
+        assets: List,
+        use_llm: bool = True,
+        model: str = "gpt-3.5-turbo"
+    ) -> RAGResult:
+        """`answer_query` for async handlers: retrieval runs in the threadpool
+        and the LLM call awaits the async provider layer."""
+        if not assets:
+            return RAGResult("No assets found in kit to answer query.", [], [])
+        timings = StageTimings()
+        packed = await run_in_threadpool(RAGService.build_context, db, query, assets, model, timings)
+        with timings.stage("llm"):
+            answer = await AsyncLLMService.query_with_context(query, packed.text, model) if use_llm else None
+        return RAGService._result(packed, assets, answer, timings)
+
+    @staticmethod
+    async def answer_query_stream(
+        db: Session,
+        query: str,
+        assets: List,
+        use_llm: bool = True,
+        model: str = "gpt-3.5-turbo"
+    ) -> Tuple[RAGResult, AsyncIterator[str]]:
+        """Retrieve for `query` and return the result with the answer still to come.
+
+        The result carries sources, citations and tokens used with an empty
+        answer; the answer is generated as the returned iterator is consumed.
+        """
+        if not assets:
+            return RAGResult("", [], []), text_stream("No assets found in kit to answer query.")
+        timings = StageTimings()
+        packed = await run_in_threadpool(RAGService.build_context, db, query, assets, model, timings)
+        if not use_llm:
+            result = RAGService._result(packed, assets, None, timings)
+            return result._replace(answer=""), text_stream(result.answer)
+        return RAGService._result(packed, assets, "", timings), AsyncLLMService.stream_with_context(query, packed.text, model)
+
+    @staticmethod
+    def build_context(
+        db: Session,
+        query: str,
+        assets: List,
+        model: str,
+        timings: Optional[StageTimings] = None
+    ) -> PackedContext:
+        timings = StageTimings() if timings is None else timings
+        passages = RAGService.retrieve(db, query, assets, timings=timings)
+        with timings.stage("pack"):
+            return pack_context(passages, context_budget(model))
+
+    @staticmethod
+    def build_contexts(
+        db: Session,
+        queries: List[str],
+        assets: List,
+        model: str,
+        timings: Optional[StageTimings] = None
+    ) -> List[PackedContext]:
+        """`build_context` for several queries, retrieving for all of them in one pass."""
+        timings = StageTimings() if timings is None else timings
+        passages = RAGService.retrieve_many(db, queries, assets, timings=timings)
+        with timings.stage("pack"):
+            budget = context_budget(model)
+            return [pack_context(hits, budget) for hits in passages]
+
+    @staticmethod
+    async def answer_packed(
+        queries: List[str],
+        packed: List[PackedContext],
+        assets: List,
+        use_llm: bool = True,
+        model: str = "gpt-3.5-turbo",
+        concurrency: int = RAG_BATCH_CONCURRENCY
+    ) -> AsyncIterator[Tuple[int, Union[RAGResult, Exception]]]:
+        """Answer queries whose contexts are already built, yielding (position,
+        result) as each answer completes.
+
+        At most `concurrency` LLM calls are in flight. A query whose call fails
+        yields its exception instead of failing the rest.
+        """
+        semaphore = asyncio.Semaphore(max(concurrency, 1))
+
+        async def answer(position: int):
+            async with semaphore:
+                try:
+                    text = await AsyncLLMService.query_with_context(queries[position], packed[position].text, model) if use_llm else None
+                    return position, RAGService._result(packed[position], assets, text)
+                except Exception as e:
+                    return position, e
+
+        tasks = [asyncio.ensure_future(answer(position)) for position in range(len(queries))]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield await done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    @staticmethod
+    def _result(
+        packed: PackedContext,
+        assets: List,
+        answer: Optional[str],
+        timings: Optional[StageTimings] = None
+    ) -> RAGResult:
+        citations = packed.passages
+        if answer is None:
+            answer = f"Retrieved {len(citations)} relevant passages. Content preview: {packed.text[:200]}..."
+        sources = list(dict.fromkeys(citation.asset_id for citation in citations)) or [assets[0].id]
+        return RAGResult(answer, sources, citations, packed.tokens_used, timings)
+
+    @staticmethod
+    def retrieve(
+        db: Session,
+        query: str,
+        assets: List,
+        top_k: int = RAG_TOP_K,
+        timings: Optional[StageTimings] = None
+    ) -> List[Citation]:
+        """Rank the chunks of `assets` against `query` with the local retrieval indexes.
+
+        Only reads: assets not indexed yet are left to their index jobs, and
+        chunks reach the workspace indexes through those jobs or the startup
+        warm-up (`indexing.warm_indexes`). In hybrid mode lexical and vector candidates are generated
+        in parallel, fused by reciprocal rank and the best reranked locally.
+        Falls back to the first passage when nothing matches. Time spent per
+        stage is recorded in `timings`.
+        """
+        return RAGService.retrieve_many(db, [query], assets, top_k, timings)[0]
+
+    @staticmethod
+    def retrieve_many(
+        db: Session,
+        queries: List[str],
+        assets: List,
+        top_k: int = RAG_TOP_K,
+        timings: Optional[StageTimings] = None
+    ) -> List[List[Citation]]:
+        """`retrieve` for several queries over the same assets, in one pass.
+
+        Only assets that have been indexed are searched. All queries are
+        embedded in one batch and scored against the vectors with one matrix
+        product, and passages are loaded with one database query.
+        """
+        timings = StageTimings() if timings is None else timings
+        with timings.stage("index"):
+            # Assets not indexed yet are left out rather than indexed in the
+            # request; ones that never had an index job get one queued
+            ensure_index_jobs(db, [asset.id for asset in assets if asset.indexed_at is None])
+            workspace_of = {asset.id: asset.workspace_id for asset in assets}
+            chunk_ids: Dict[str, List[str]] = {}
+            for chunk_id, asset_id in (
+                db.query(Chunk.id, Chunk.asset_id)
+                .filter(Chunk.asset_id.in_(list(workspace_of)))
+                .order_by(Chunk.asset_id, Chunk.position)
+            ):
+                chunk_ids.setdefault(workspace_of[asset_id], []).append(chunk_id)
+            if not chunk_ids:
+                return [[] for _ in queries]
+            lexical_indexes = RAGService._lexical_indexes(chunk_ids) if RETRIEVAL_MODE != "vector" else []
+            vector_indexes = RAGService._vector_indexes(chunk_ids) if RETRIEVAL_MODE != "lexical" else []
+
+        if RETRIEVAL_MODE == "lexical":
+            with timings.stage("lexical"):
+                rankings = RAGService._lexical_candidates(queries, lexical_indexes, top_k)
+        elif RETRIEVAL_MODE == "vector":
+            with timings.stage("vector"):
+                rankings = RAGService._vector_candidates(queries, vector_indexes, top_k)
         else:
-            answer = f"Retrieved {len(relevant_indices)} relevant documents. Content preview: {context[:200]}..."
-        
-        sources = [asset_ids[i] for i in relevant_indices if i < len(asset_ids)]
-        return answer, sources
+            rankings = RAGService._hybrid_candidates(db, queries, lexical_indexes, vector_indexes, top_k, timings)
+        first = next(iter(chunk_ids.values()))[0]
+        rankings = [hits or [(first, 0.0)] for hits in rankings]
+
+        wanted = {chunk_id for hits in rankings for chunk_id, _ in hits}
+        chunks = {c.id: c for c in db.query(Chunk).filter(Chunk.id.in_(list(wanted)))}
+        return [
+            [
+                Citation(c.asset_id, c.id, c.start_offset, c.end_offset, c.text, score)
+                for c, score in ((chunks[chunk_id], score) for chunk_id, score in hits)
+            ]
+            for hits in rankings
+        ]
+
+    @staticmethod
+    def _hybrid_candidates(db: Session, queries: List[str], lexical_indexes, vector_indexes, top_k: int, timings: StageTimings):
+        depth = max(HYBRID_CANDIDATES, top_k)
+
+        def lexical_candidates():
+            with timings.stage("lexical"):
+                return RAGService._lexical_candidates(queries, lexical_indexes, depth)
+
+        # BM25 scoring runs on a helper thread while this one embeds the queries and searches vectors
+        lexical_future = _search_pool.submit(lexical_candidates)
+        with timings.stage("vector"):
+            vector_rankings = RAGService._vector_candidates(queries, vector_indexes, depth)
+        lexical_rankings = lexical_future.result()
+
+        with timings.stage("fusion"):
+            fused = [reciprocal_rank_fusion(pair) for pair in zip(lexical_rankings, vector_rankings)]
+        if RERANK_TOP_N <= 0:
+            return [hits[:top_k] for hits in fused]
+        with timings.stage("rerank"):
+            head = max(RERANK_TOP_N, top_k)
+            wanted = {chunk_id for hits in fused for chunk_id, _ in hits[:RERANK_TOP_N]}
+            texts = dict(db.query(Chunk.id, Chunk.text).filter(Chunk.id.in_(list(wanted)))) if wanted else {}
+            results = []
+            for query, hits in zip(queries, fused):
+                reranked = rerank(query, [(chunk_id, texts.get(chunk_id, ""), score) for chunk_id, score in hits[:RERANK_TOP_N]])
+                results.append((reranked + hits[RERANK_TOP_N:head])[:top_k])
+        return results
+
+    @staticmethod
+    def _lexical_indexes(chunk_ids: Dict[str, List[str]]):
+        """Each workspace's BM25 index, paired with the chunk ids to search."""
+        return [(lexical.get_index(workspace_id), ids) for workspace_id, ids in chunk_ids.items()]
+
+    @staticmethod
+    def _vector_indexes(chunk_ids: Dict[str, List[str]]):
+        """Each workspace's vector index, paired with the chunk ids to search."""
+        return [(vectors.get_index(workspace_id), ids) for workspace_id, ids in chunk_ids.items()]
+
+    @staticmethod
+    def _lexical_candidates(queries: List[str], indexes, k: int) -> List[List[Tuple[str, float]]]:
+        rankings = []
+        for query in queries:
+            hits = []
+            for index, ids in indexes:
+                hits += index.search(query, k=k, doc_ids=ids)
+            rankings.append(sorted(hits, key=lambda hit: hit[1], reverse=True)[:k])
+        return rankings
+
+    @staticmethod
+    def _vector_candidates(queries: List[str], indexes, k: int) -> List[List[Tuple[str, float]]]:
+        if not indexes:
+            return [[] for _ in queries]
+        embeddings = vectors.get_embedder().embed(queries)  # One batch for all queries
+        rankings: List[List[Tuple[str, float]]] = [[] for _ in queries]
+        for index, ids in indexes:
+            for hits, found in zip(rankings, index.search(embeddings, k=k, doc_ids=ids)):
+                hits += [(chunk_id, score) for chunk_id, score in found if score > 0]
+        return [sorted(hits, key=lambda hit: hit[1], reverse=True)[:k] for hits in rankings]
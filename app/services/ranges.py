@@ -0,0 +1,154 @@
+import secrets
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Callable, Iterator, List, Optional, Tuple
+
+# More ranges than this in one request are ignored and the full body is served
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(Exception):
+    """None of the requested ranges overlap the representation."""
+
+
+def http_date(dt: datetime) -> str:
+    """Format a naive UTC datetime as an HTTP date."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return format_datetime(dt.astimezone(timezone.utc), usegmt=True)
+
+
+def _parse_http_date(value: Optional[str]) -> Optional[datetime]:
+    if not value:
+        return None
+    try:
+        parsed = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+def _to_second(dt: datetime) -> datetime:
+    """HTTP dates have one-second resolution."""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.replace(microsecond=0)
+
+
+def _opaque_tag(etag: str) -> str:
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def is_not_modified(headers, etag: str, last_modified: Optional[datetime]) -> bool:
+    """Evaluate If-None-Match / If-Modified-Since for a GET request."""
+    if_none_match = headers.get("if-none-match")
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison, as required for If-None-Match
+        return _opaque_tag(etag) in {_opaque_tag(tag) for tag in candidates}
+
+    since = _parse_http_date(headers.get("if-modified-since"))
+    if since and last_modified:
+        return _to_second(last_modified) <= since
+    return False
+
+
+def if_range_matches(if_range: Optional[str], etag: str, last_modified: Optional[datetime]) -> bool:
+    """Whether a Range request should be honoured given its If-Range precondition."""
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # Strong comparison: weak validators never match
+        return not etag.startswith("W/") and if_range == etag
+    date = _parse_http_date(if_range)
+    return bool(date and last_modified and _to_second(last_modified) == date)
+
+
+def parse_range_header(header: str, size: int) -> Optional[List[Tuple[int, int]]]:
+    """Parse a `Range: bytes=...` header into inclusive (start, end) pairs.
+
+    Returns None when the header should be ignored (malformed, another unit,
+    or too many ranges) and raises RangeNotSatisfiable when no range overlaps
+    the `size` bytes available.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec.strip():
+        return None
+
+    specs = [part.strip() for part in spec.split(",") if part.strip()]
+    if not specs or len(specs) > MAX_RANGES:
+        return None
+
+    ranges = []
+    for part in specs:
+        first, sep, last = part.partition("-")
+        if not sep:
+            return None
+        first, last = first.strip(), last.strip()
+        try:
+            if not first:
+                # Suffix range: the final N bytes
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                start, end = max(size - suffix, 0), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if last and end < start:
+                    return None
+                end = min(end, size - 1)
+        except ValueError:
+            return None
+        if start < 0:
+            return None
+        if start < size:
+            ranges.append((start, end))
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+    return ranges
+
+
+def content_range(start: int, end: int, size: int) -> str:
+    return f"bytes {start}-{end}/{size}"
+
+
+def multipart_byteranges(
+    ranges: List[Tuple[int, int]],
+    size: int,
+    media_type: str,
+    read: Callable[[int, int], Iterator[bytes]],
+) -> Tuple[str, int, Iterator[bytes]]:
+    """Build a multipart/byteranges body.
+
+    `read(start, length)` yields the bytes of one range. Returns the
+    boundary, the total content length and the body iterator.
+    """
+    boundary = secrets.token_hex(16)
+    headers = [
+        (
+            f"--{boundary}\r\n"
+            f"Content-Type: {media_type}\r\n"
+            f"Content-Range: {content_range(start, end, size)}\r\n\r\n"
+        ).encode("latin-1")
+        for start, end in ranges
+    ]
+    trailer = f"\r\n--{boundary}--\r\n".encode("latin-1")
+    length = sum(len(h) for h in headers) + sum(end - start + 1 for start, end in ranges)
+    length += 2 * (len(ranges) - 1) + len(trailer)
+
+    def body() -> Iterator[bytes]:
+        for i, (start, end) in enumerate(ranges):
+            if i:
+                yield b"\r\n"
+            yield headers[i]
+            yield from read(start, end - start + 1)
+        yield trailer
+
+    return boundary, length, body()
@@ -0,0 +1,97 @@
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+from app.services.lexical import tokenize
+
+# Rank offset in reciprocal rank fusion; larger values flatten the weight of top ranks
+RRF_K = int(os.getenv("RRF_K", "60"))
+# Candidates each retriever contributes to fusion in hybrid mode
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+# Fused candidates rescored by the local reranker; 0 disables reranking
+RERANK_TOP_N = int(os.getenv("RERANK_TOP_N", "20"))
+
+# Reranker weights: query term coverage, exact query bigrams, term proximity
+COVERAGE_WEIGHT = 0.5
+PHRASE_WEIGHT = 0.3
+PROXIMITY_WEIGHT = 0.2
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[Tuple[str, float]]], k: int = RRF_K) -> List[Tuple[str, float]]:
+    """Fuse ranked (doc_id, score) lists by summing 1 / (k + rank) per document.
+
+    Only ranks are used, so retrievers with incomparable score scales (BM25
+    and cosine similarity) combine without normalization.
+    """
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, (doc_id, _) in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def rerank_score(query_terms: List[str], text: str) -> float:
+    """Cheap lexical relevance of a passage, in [0, 1].
+
+    Combines the fraction of distinct query terms the passage contains, the
+    fraction of query bigrams it contains verbatim, and how closely together
+    the matched terms occur.
+    """
+    if not query_terms:
+        return 0.0
+    terms = tokenize(text)
+    wanted = set(query_terms)
+    present = wanted.intersection(terms)
+    if not present:
+        return 0.0
+    coverage = len(present) / len(wanted)
+
+    query_bigrams = set(zip(query_terms, query_terms[1:]))
+    phrase = len(query_bigrams.intersection(zip(terms, terms[1:]))) / len(query_bigrams) if query_bigrams else coverage
+
+    proximity = _window(terms, present)
+    return COVERAGE_WEIGHT * coverage + PHRASE_WEIGHT * phrase + PROXIMITY_WEIGHT * proximity
+
+
+def _window(terms: List[str], present: set) -> float:
+    """len(present) over the length of the shortest span containing all of them."""
+    counts: Counter = Counter()
+    best = len(terms)
+    left = 0
+    for right, term in enumerate(terms):
+        if term in present:
+            counts[term] += 1
+        while len(counts) == len(present):
+            best = min(best, right - left + 1)
+            if terms[left] in counts:
+                counts[terms[left]] -= 1
+                if not counts[terms[left]]:
+                    del counts[terms[left]]
+            left += 1
+    return len(present) / best
+
+
+def rerank(query: str, candidates: Sequence[Tuple[str, str, float]]) -> List[Tuple[str, float]]:
+    """Reorder (doc_id, text, fused_score) candidates by `rerank_score`.
+
+    The fused score breaks ties, so passages the scorer can't tell apart
+    keep their fusion order.
+    """
+    query_terms = tokenize(query)
+    scored = [(doc_id, rerank_score(query_terms, text), fused) for doc_id, text, fused in candidates]
+    scored.sort(key=lambda item: (item[1], item[2]), reverse=True)
+    return [(doc_id, score) for doc_id, score, _ in scored]
+
+
+class StageTimings(dict):
+    """Milliseconds spent per retrieval stage, e.g. {"lexical": 1.2, "vector": 3.4}."""
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self[name] = round(self.get(name, 0.0) + (time.perf_counter() - start) * 1000, 3)
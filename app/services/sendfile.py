@@ -0,0 +1,72 @@
+import os
+from typing import Mapping, Optional
+
+import anyio
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+# Download mode for filesystem-backed blobs: "sendfile" hands the file
+# descriptor to servers supporting zerocopysend (uvicorn does not, so it
+# reads in a worker thread there), "stream" reads it through Python in chunks
+DOWNLOAD_MODE = os.getenv("DOWNLOAD_MODE", "sendfile")
+
+
+class SendfileResponse(Response):
+    """Serve `length` bytes of a file starting at `offset`.
+
+    When the ASGI server advertises the `http.response.zerocopysend`
+    extension, the open file descriptor is handed to the server, which
+    transmits it with the kernel's sendfile(2): no bytes are copied through
+    userland. Otherwise, as under uvicorn, the file is read in large chunks
+    in a worker thread: the same copy through userland as FileResponse.
+    """
+
+    chunk_size = 1024 * 1024
+
+    def __init__(
+        self,
+        path: str,
+        offset: int = 0,
+        length: Optional[int] = None,
+        status_code: int = 200,
+        headers: Optional[Mapping[str, str]] = None,
+        media_type: Optional[str] = None,
+    ):
+        self.path = path
+        self.offset = offset
+        self.length = os.path.getsize(path) - offset if length is None else length
+        self.status_code = status_code
+        self.media_type = media_type
+        self.background = None
+        headers = dict(headers or {})
+        headers.setdefault("Content-Length", str(self.length))
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method", "GET").upper() == "HEAD" or self.length == 0:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        with open(self.path, "rb") as fh:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({
+                    "type": "http.response.zerocopysend",
+                    "file": fh.fileno(),
+                    "offset": self.offset,
+                    "count": self.length,
+                    "more_body": False,
+                })
+                return
+
+            fh.seek(self.offset)
+            remaining = self.length
+            while remaining > 0:
+                chunk = await anyio.to_thread.run_sync(fh.read, min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+            if remaining > 0:
+                # File shrank underneath us; terminate the body cleanly
+                await send({"type": "http.response.body", "body": b"", "more_body": False})
@@ -0,0 +1,311 @@
+import os
+from datetime import datetime
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.engine import Connection
+from sqlalchemy.orm import Session
+
+from app.models import Asset, AssetStats, Kit, Workspace, asset_kit_association
+
+# Assets kept per scope for the "Largest Files" and "Recent Files" quick queries
+STATS_TOP_N = int(os.getenv("STATS_TOP_N", "5"))
+
+# Asset columns the statistics are computed from; changes to any other column leave them alone
+STAT_COLUMNS = ("workspace_id", "name", "description", "mime_type", "file_size", "asset_type", "created_at")
+
+_SUMMARY_COLUMNS = (Asset.id, Asset.name, Asset.description, Asset.mime_type, Asset.file_size, Asset.asset_type, Asset.created_at)
+_PENDING = "asset_stats_deltas"
+_OLD_ASSETS = "asset_stats_old_assets"
+_stats_table = AssetStats.__table__
+
+
+def serialize_asset(a) -> dict:
+    """Metadata of an asset (or a row of its summary columns), as listed by the quick queries"""
+    return {
+        "id": a.id,
+        "name": a.name,
+        "description": a.description,
+        "mime_type": a.mime_type,
+        "file_size": a.file_size,
+        "asset_type": a.asset_type,
+        "created_at": a.created_at.isoformat() if a.created_at else None
+    }
+
+
+def _members(kind: str, scope_id: str):
+    """Condition selecting the assets of a workspace or kit"""
+    if kind == "workspace":
+        return Asset.workspace_id == scope_id
+    kit_assets = select(asset_kit_association.c.asset_id).where(asset_kit_association.c.kit_id == scope_id)
+    return Asset.id.in_(kit_assets)
+
+
+def compute_stats(conn: Connection, kind: str, scope_id: str) -> dict:
+    """Aggregate the statistics of a scope from its assets, without loading them."""
+    members = _members(kind, scope_id)
+    count, total = conn.execute(
+        select(func.count(Asset.id), func.coalesce(func.sum(Asset.file_size), 0)).where(members)
+    ).one()
+    mime_types = conn.execute(
+        select(Asset.mime_type, func.count(Asset.id)).where(members)
+        .group_by(Asset.mime_type).order_by(func.count(Asset.id).desc(), Asset.mime_type)
+    ).all()
+    kit_count = 0
+    if kind == "workspace":
+        kit_count = conn.execute(select(func.count(Kit.id)).where(Kit.workspace_id == scope_id)).scalar()
+    return {
+        "asset_count": count,
+        "total_bytes": total,
+        "kit_count": kit_count,
+        "mime_types": [[mime_type, n] for mime_type, n in mime_types],
+        "largest": _top(conn, kind, scope_id, "largest"),
+        "newest": _top(conn, kind, scope_id, "newest"),
+        "updated_at": datetime.utcnow(),
+    }
+
+
+def _top(conn: Connection, kind: str, scope_id: str, ranking: str) -> List[dict]:
+    """The STATS_TOP_N largest or newest assets of a scope, serialized."""
+    if ranking == "largest":
+        order = (func.coalesce(Asset.file_size, 0).desc(), Asset.id)
+    else:
+        order = (Asset.created_at.desc(), Asset.id)
+    rows = conn.execute(select(*_SUMMARY_COLUMNS).where(_members(kind, scope_id)).order_by(*order).limit(STATS_TOP_N))
+    return [serialize_asset(row) for row in rows]
+
+
+def refresh_stats(conn: Connection, kind: str, scope_id: str) -> Optional[dict]:
+    """Recompute the stored statistics of a scope; removes them (returning None) once it is deleted.
+
+    The stats row is locked before the aggregates are read, so concurrent
+    refreshes of one scope run in turn and the later one sees the changes
+    the earlier one committed.
+    """
+    owner = Workspace if kind == "workspace" else Kit
+    key = (_stats_table.c.scope == kind) & (_stats_table.c.scope_id == scope_id)
+    if conn.execute(select(owner.id).where(owner.id == scope_id)).first() is None:
+        conn.execute(delete(_stats_table).where(key))
+        return None
+    locked = _lock(conn, kind, scope_id)
+    values = compute_stats(conn, kind, scope_id)
+    if locked:
+        conn.execute(update(_stats_table).where(key).values(**values))
+    else:
+        conn.execute(insert(_stats_table).values(scope=kind, scope_id=scope_id, **values))
+    return values
+
+
+def _lock(conn: Connection, kind: str, scope_id: str) -> bool:
+    """Write-lock the stats row of a scope until the transaction ends; False if there is none."""
+    key = (_stats_table.c.scope == kind) & (_stats_table.c.scope_id == scope_id)
+    return bool(conn.execute(update(_stats_table).where(key).values(updated_at=datetime.utcnow())).rowcount)
+
+
+def get_stats(db: Session, kind: str, scope_id: str) -> Optional[AssetStats]:
+    """The statistics of a workspace or kit, or None if it doesn't exist.
+
+    Scopes created before statistics were kept are backfilled on first read.
+    """
+    stats = db.get(AssetStats, (kind, scope_id))
+    if stats is None:
+        if refresh_stats(db.connection(), kind, scope_id) is None:
+            return None
+        db.commit()
+        stats = db.get(AssetStats, (kind, scope_id))
+    return stats
+
+
+def scope_summaries(db: Session, kind: str, scope_id: str, condition) -> List[dict]:
+    """Serialized assets of a scope matching `condition`, oldest first; only their summary columns are read."""
+    rows = db.execute(
+        select(*_SUMMARY_COLUMNS).where(_members(kind, scope_id), condition).order_by(Asset.created_at, Asset.id)
+    )
+    return [serialize_asset(row) for row in rows]
+
+
+class _Delta:
+    """Changes one flush makes to the statistics of a scope."""
+
+    def __init__(self):
+        self.removed: List[dict] = []  # Serialized assets leaving the scope (or their old values)
+        self.added: List[dict] = []  # Serialized assets entering the scope (or their new values)
+        self.kit_count = 0
+        self.dropped = False  # The scope itself was deleted
+
+    def apply(self, conn: Connection, kind: str, scope_id: str) -> None:
+        """Update the stored statistics by this delta.
+
+        Counts, bytes and the MIME histogram are adjusted in place; a top-N
+        list is re-queried only when an asset leaving it (or changing) was on
+        it. Scopes without a stats row yet are computed in full.
+        """
+        key = (_stats_table.c.scope == kind) & (_stats_table.c.scope_id == scope_id)
+        if self.dropped:
+            conn.execute(delete(_stats_table).where(key))
+            return
+        if not _lock(conn, kind, scope_id):
+            refresh_stats(conn, kind, scope_id)
+            return
+        if not (self.removed or self.added or self.kit_count):
+            return
+        stats = conn.execute(select(_stats_table).where(key)).one()
+        mime_types = {mime_type: n for mime_type, n in stats.mime_types}
+        for sign, assets in ((-1, self.removed), (1, self.added)):
+            for a in assets:
+                mime_types[a["mime_type"]] = mime_types.get(a["mime_type"], 0) + sign
+        values = {
+            "asset_count": stats.asset_count + len(self.added) - len(self.removed),
+            "total_bytes": stats.total_bytes + sum(a["file_size"] or 0 for a in self.added)
+            - sum(a["file_size"] or 0 for a in self.removed),
+            "kit_count": stats.kit_count + self.kit_count,
+            "mime_types": [
+                [mime_type, n] for mime_type, n in sorted(mime_types.items(), key=lambda item: (-item[1], item[0] or ""))
+                if n > 0
+            ],
+        }
+        removed = {a["id"] for a in self.removed}
+        for ranking, rank in (("largest", lambda a: a["file_size"] or 0), ("newest", lambda a: a["created_at"] or "")):
+            top = getattr(stats, ranking)
+            if any(a["id"] in removed for a in top):
+                values[ranking] = _top(conn, kind, scope_id, ranking)
+            elif self.added:
+                merged = sorted({a["id"]: a for a in top + self.added}.values(), key=lambda a: a["id"])
+                values[ranking] = sorted(merged, key=rank, reverse=True)[:STATS_TOP_N]
+        conn.execute(update(_stats_table).where(key).values(**values))
+
+
+def _history(obj, name: str):
+    return inspect(obj).attrs[name].history
+
+
+def _stat_changes(obj: Asset) -> bool:
+    return any(_history(obj, name).has_changes() for name in STAT_COLUMNS)
+
+
+def _old_asset(conn: Connection, asset: Asset) -> SimpleNamespace:
+    """An asset's statistics columns as they were before this flush's changes.
+
+    Read from the database when a column was assigned while expired, as its
+    history then lacks the old value.
+    """
+    columns = ("id",) + STAT_COLUMNS
+    histories = {name: _history(asset, name) for name in columns}
+    if any(history.added and not history.deleted for history in histories.values()):
+        row = conn.execute(select(*(getattr(Asset, name) for name in columns)).where(Asset.id == asset.id)).one()
+        return SimpleNamespace(**row._mapping)
+    return SimpleNamespace(**{
+        name: history.deleted[0] if history.deleted else getattr(asset, name) for name, history in histories.items()
+    })
+
+
+def _kit_ids(conn: Connection, asset_id: str) -> Set[str]:
+    """Kits the asset belongs to, as the database currently has it."""
+    kits = select(asset_kit_association.c.kit_id).where(asset_kit_association.c.asset_id == asset_id)
+    return {kit_id for (kit_id,) in conn.execute(kits)}
+
+
+def _deltas(session: Session) -> Dict[Tuple[str, str], _Delta]:
+    return session.info.setdefault(_PENDING, {})
+
+
+def _delta(session: Session, kind: str, scope_id: str) -> _Delta:
+    return _deltas(session).setdefault((kind, scope_id), _Delta())
+
+
+@event.listens_for(Session, "before_flush")
+def _collect_old_state(session: Session, flush_context, instances) -> None:
+    """Record what the flush is about to change while the database still has the old state.
+
+    Deleted assets leave their workspace and kits; deleted kits and
+    workspaces lose their statistics. The old values of modified assets are
+    kept for `_apply_changes`, and kits moving workspace are counted.
+    """
+    conn = session.connection()
+    old_assets = session.info.setdefault(_OLD_ASSETS, {})
+    for obj in session.deleted:
+        if isinstance(obj, Asset):
+            old = _old_asset(conn, obj)
+            row = serialize_asset(old)
+            _delta(session, "workspace", old.workspace_id).removed.append(row)
+            for kit_id in _kit_ids(conn, obj.id):
+                _delta(session, "kit", kit_id).removed.append(row)
+        elif isinstance(obj, Kit):
+            _delta(session, "kit", obj.id).dropped = True
+            old = conn.execute(select(Kit.workspace_id).where(Kit.id == obj.id)).scalar()
+            _delta(session, "workspace", old).kit_count -= 1
+        elif isinstance(obj, Workspace):
+            _delta(session, "workspace", obj.id).dropped = True
+            for kit_id in conn.execute(select(Kit.id).where(Kit.workspace_id == obj.id)).scalars():
+                _delta(session, "kit", kit_id).dropped = True
+    for obj in session.dirty:
+        if isinstance(obj, Asset) and _stat_changes(obj):
+            old_assets[obj.id] = (obj, _old_asset(conn, obj))
+        elif isinstance(obj, Kit) and _history(obj, "workspace_id").has_changes():
+            old = conn.execute(select(Kit.workspace_id).where(Kit.id == obj.id)).scalar()
+            if old != obj.workspace_id:
+                _delta(session, "workspace", old).kit_count -= 1
+                _delta(session, "workspace", obj.workspace_id).kit_count += 1
+
+
+@event.listens_for(Session, "after_flush")
+def _apply_changes(session: Session, flush_context) -> None:
+    """Apply the flush's changes to the stored statistics, in the flush's transaction.
+
+    New objects are handled here rather than before the flush, since their
+    primary keys are only assigned by the flush. Membership changes can be
+    recorded on either side of the asset-kit relationship, so they are
+    collected as (kit, asset) pairs first.
+    """
+    conn = session.connection()
+    old_assets = session.info.pop(_OLD_ASSETS, {})
+    deleted = {obj.id for obj in session.deleted if isinstance(obj, Asset)}
+    joined: Dict[Tuple[str, str], Asset] = {}
+    left: Dict[Tuple[str, str], Asset] = {}
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Asset):
+            kits = _history(obj, "kits")
+            joined.update(((kit.id, obj.id), obj) for kit in kits.added or ())
+            left.update(((kit.id, obj.id), obj) for kit in kits.deleted or ())
+        elif isinstance(obj, Kit):
+            assets = _history(obj, "assets")
+            joined.update(((obj.id, asset.id), asset) for asset in assets.added or ())
+            left.update(((obj.id, asset.id), asset) for asset in assets.deleted or ())
+    joined, left = {k: v for k, v in joined.items() if k not in left}, {k: v for k, v in left.items() if k not in joined}
+
+    for obj in session.new:
+        if isinstance(obj, Asset):
+            _delta(session, "workspace", obj.workspace_id).added.append(serialize_asset(obj))
+        elif isinstance(obj, Kit):
+            _delta(session, "kit", obj.id)  # No stats row yet: computed in full
+            _delta(session, "workspace", obj.workspace_id).kit_count += 1
+        elif isinstance(obj, Workspace):
+            _delta(session, "workspace", obj.id)
+    for asset_id, (asset, old) in old_assets.items():
+        if asset_id in deleted:
+            continue
+        old_row, row = serialize_asset(old), serialize_asset(asset)
+        _delta(session, "workspace", old.workspace_id).removed.append(old_row)
+        _delta(session, "workspace", asset.workspace_id).added.append(row)
+        for kit_id in _kit_ids(conn, asset_id) - {kit_id for kit_id, a in joined if a == asset_id}:
+            _delta(session, "kit", kit_id).removed.append(old_row)
+            _delta(session, "kit", kit_id).added.append(row)
+    for (kit_id, asset_id), asset in joined.items():
+        if asset_id not in deleted:
+            _delta(session, "kit", kit_id).added.append(serialize_asset(asset))
+    for (kit_id, asset_id), asset in left.items():
+        if asset_id not in deleted:
+            old = old_assets.get(asset_id, (asset, asset))[1]
+            _delta(session, "kit", kit_id).removed.append(serialize_asset(old))
+
+    for (kind, scope_id), change in sorted(session.info.pop(_PENDING, {}).items(), key=lambda item: item[0]):
+        if scope_id:
+            change.apply(conn, kind, scope_id)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_changes(session: Session, previous_transaction) -> None:
+    """Forget the changes of a flush that failed after `_collect_old_state` ran."""
+    session.info.pop(_PENDING, None)
+    session.info.pop(_OLD_ASSETS, None)
@@ -0,0 +1,363 @@
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+from typing import BinaryIO, Iterator, Optional
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+# --- Blob Storage Configuration ---
+BLOB_STORAGE_BACKEND = os.getenv("BLOB_STORAGE_BACKEND", "local")
+BLOB_STORAGE_PATH = os.getenv("BLOB_STORAGE_PATH", "./blobs")
+BLOB_STORAGE_BUCKET = os.getenv("BLOB_STORAGE_BUCKET")
+BLOB_STORAGE_PREFIX = os.getenv("BLOB_STORAGE_PREFIX", "blobs/")
+
+CHUNK_SIZE = 1024 * 1024
+
+_DIGEST_RE = re.compile(r"^[0-9a-f]{64}$")
+_UPLOAD_ID_RE = re.compile(r"^[0-9a-zA-Z-]{1,64}$")
+
+
+class BlobNotFound(Exception):
+    """Raised when a digest does not resolve to a stored blob."""
+
+
+def _check_digest(digest: str) -> str:
+    if not digest or not _DIGEST_RE.match(digest):
+        raise ValueError(f"Invalid blob digest: {digest!r}")
+    return digest
+
+
+def _check_upload_id(upload_id: str) -> str:
+    if not upload_id or not _UPLOAD_ID_RE.match(upload_id):
+        raise ValueError(f"Invalid upload id: {upload_id!r}")
+    return upload_id
+
+
+class BlobWriter:
+    """Incrementally hashes and stores a blob written in chunks.
+
+    Memory use is bounded by the chunk size: bytes are spooled to a temporary
+    file while the digest and size are computed on the fly.
+    """
+
+    def __init__(self, tmp_dir: Optional[str] = None):
+        self._hash = hashlib.sha256()
+        self.size = 0
+        fd, self.tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        self._fh = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self._hash.update(chunk)
+        self._fh.write(chunk)
+        self.size += len(chunk)
+
+    @property
+    def digest(self) -> str:
+        return self._hash.hexdigest()
+
+    def commit(self, keep: bool = False) -> str:
+        """Finish writing, store the blob and return its digest.
+
+        With `keep`, the spooled copy is kept so `restore()` can store the blob
+        again (see `blobs.acquire_written_blob`); `abort()` then discards it.
+        """
+        self._fh.close()
+        try:
+            self._store()
+        finally:
+            if not keep and os.path.exists(self.tmp_path):
+                os.unlink(self.tmp_path)
+        return self.digest
+
+    def restore(self) -> None:
+        """Store the blob again from the copy kept by `commit(keep=True)`."""
+        self._store()
+
+    def abort(self) -> None:
+        """Discard everything written so far."""
+        self._fh.close()
+        if os.path.exists(self.tmp_path):
+            os.unlink(self.tmp_path)
+
+    def _store(self) -> None:
+        raise NotImplementedError
+
+
+class BlobStore:
+    """Content-addressed storage for asset bytes.
+
+    Blobs are keyed by the hex SHA-256 digest of their contents, so storing the
+    same bytes twice yields the same key. Backends only need to implement the
+    primitive operations below; `Asset.blob_digest` is the only pointer kept in
+    the database.
+    """
+
+    def writer(self) -> BlobWriter:
+        """Start a streaming write; call `commit()` on the result to get the digest."""
+        raise NotImplementedError
+
+    def put(self, data: bytes) -> str:
+        """Store `data` and return its digest."""
+        writer = self.writer()
+        try:
+            writer.write(data)
+        except Exception:
+            writer.abort()
+            raise
+        return writer.commit()
+
+    def open(self, digest: str) -> BinaryIO:
+        """Open a blob for binary reading."""
+        raise NotImplementedError
+
+    def exists(self, digest: str) -> bool:
+        raise NotImplementedError
+
+    def size(self, digest: str) -> int:
+        raise NotImplementedError
+
+    def delete(self, digest: str) -> None:
+        raise NotImplementedError
+
+    def local_path(self, digest: str) -> Optional[str]:
+        """Filesystem path of the blob if the backend keeps it on local disk."""
+        return None
+
+    def iter_chunks(
+        self, digest: str, chunk_size: int = CHUNK_SIZE, start: int = 0, length: Optional[int] = None
+    ) -> Iterator[bytes]:
+        """Yield `length` bytes of the blob from offset `start` (default: to the end),
+        in chunks of at most `chunk_size` bytes."""
+        with self.open(digest) as fh:
+            if start:
+                fh.seek(start)
+            remaining = length
+            while remaining is None or remaining > 0:
+                chunk = fh.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    # --- Multipart upload staging ---
+    # Parts of a resumable upload are staged outside the content-addressed
+    # namespace until the session is committed and assembled into one blob.
+
+    def part_writer(self, upload_id: str, part_number: int) -> BlobWriter:
+        """Start writing one part of a multipart upload, replacing any earlier copy."""
+        raise NotImplementedError
+
+    def iter_part(self, upload_id: str, part_number: int, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        raise NotImplementedError
+
+    def delete_parts(self, upload_id: str) -> None:
+        """Remove every staged part of an upload."""
+        raise NotImplementedError
+
+
+class LocalBlobStore(BlobStore):
+    """Filesystem backend storing blobs at `<root>/ab/cd/abcd...` (sharded by digest prefix)."""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self.tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+
+    def path(self, digest: str) -> str:
+        digest = _check_digest(digest)
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def writer(self) -> BlobWriter:
+        return _LocalBlobWriter(self)
+
+    def local_path(self, digest: str) -> Optional[str]:
+        return self.path(digest)
+
+    def open(self, digest: str) -> BinaryIO:
+        try:
+            return open(self.path(digest), "rb")
+        except FileNotFoundError:
+            raise BlobNotFound(digest)
+
+    def exists(self, digest: str) -> bool:
+        return os.path.exists(self.path(digest))
+
+    def size(self, digest: str) -> int:
+        try:
+            return os.path.getsize(self.path(digest))
+        except FileNotFoundError:
+            raise BlobNotFound(digest)
+
+    def delete(self, digest: str) -> None:
+        try:
+            os.unlink(self.path(digest))
+        except FileNotFoundError:
+            pass
+
+    def part_path(self, upload_id: str, part_number: int) -> str:
+        return os.path.join(self.root, "uploads", _check_upload_id(upload_id), str(int(part_number)))
+
+    def part_writer(self, upload_id: str, part_number: int) -> BlobWriter:
+        return _LocalPartWriter(self, self.part_path(upload_id, part_number))
+
+    def iter_part(self, upload_id: str, part_number: int, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        try:
+            fh = open(self.part_path(upload_id, part_number), "rb")
+        except FileNotFoundError:
+            raise BlobNotFound(f"{upload_id}/{part_number}")
+        with fh:
+            while True:
+                chunk = fh.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def delete_parts(self, upload_id: str) -> None:
+        shutil.rmtree(os.path.join(self.root, "uploads", _check_upload_id(upload_id)), ignore_errors=True)
+
+
+class S3BlobStore(BlobStore):
+    """Object storage backend for S3-compatible services (requires boto3)."""
+
+    def __init__(self, bucket: str, prefix: str = "blobs/", client=None):
+        if client is None:
+            if boto3 is None:
+                raise RuntimeError("boto3 is required for the s3 blob storage backend")
+            client = boto3.client("s3", endpoint_url=os.getenv("BLOB_STORAGE_ENDPOINT_URL"))
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def key(self, digest: str) -> str:
+        digest = _check_digest(digest)
+        return f"{self.prefix}{digest[:2]}/{digest[2:4]}/{digest}"
+
+    def writer(self) -> BlobWriter:
+        return _S3BlobWriter(self)
+
+    def open(self, digest: str) -> BinaryIO:
+        try:
+            return self.client.get_object(Bucket=self.bucket, Key=self.key(digest))["Body"]
+        except self.client.exceptions.NoSuchKey:
+            raise BlobNotFound(digest)
+
+    def iter_chunks(
+        self, digest: str, chunk_size: int = CHUNK_SIZE, start: int = 0, length: Optional[int] = None
+    ) -> Iterator[bytes]:
+        # Let the object store do the seeking instead of discarding leading bytes
+        kwargs = {}
+        if start or length is not None:
+            end = "" if length is None else str(start + length - 1)
+            kwargs["Range"] = f"bytes={start}-{end}"
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=self.key(digest), **kwargs)["Body"]
+        except self.client.exceptions.NoSuchKey:
+            raise BlobNotFound(digest)
+        yield from body.iter_chunks(chunk_size)
+
+    def exists(self, digest: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.key(digest))
+            return True
+        except Exception:
+            return False
+
+    def size(self, digest: str) -> int:
+        try:
+            return self.client.head_object(Bucket=self.bucket, Key=self.key(digest))["ContentLength"]
+        except Exception:
+            raise BlobNotFound(digest)
+
+    def delete(self, digest: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(digest))
+
+    def part_key(self, upload_id: str, part_number: int) -> str:
+        return f"{self.prefix}uploads/{_check_upload_id(upload_id)}/{int(part_number)}"
+
+    def part_writer(self, upload_id: str, part_number: int) -> BlobWriter:
+        return _S3PartWriter(self, self.part_key(upload_id, part_number))
+
+    def iter_part(self, upload_id: str, part_number: int, chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        try:
+            body = self.client.get_object(Bucket=self.bucket, Key=self.part_key(upload_id, part_number))["Body"]
+        except self.client.exceptions.NoSuchKey:
+            raise BlobNotFound(f"{upload_id}/{part_number}")
+        yield from body.iter_chunks(chunk_size)
+
+    def delete_parts(self, upload_id: str) -> None:
+        prefix = f"{self.prefix}uploads/{_check_upload_id(upload_id)}/"
+        # Listings return at most 1000 keys per page, which is also the most one delete_objects call takes
+        for page in self.client.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=prefix):
+            keys = [{"Key": obj["Key"]} for obj in page.get("Contents", [])]
+            if keys:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": keys, "Quiet": True})
+
+
+class _LocalBlobWriter(BlobWriter):
+    def __init__(self, store: LocalBlobStore):
+        super().__init__(tmp_dir=store.tmp_dir)
+        self.store = store
+
+    def _store(self) -> None:
+        target = self.store.path(self.digest)
+        if os.path.exists(target):
+            return
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # Link rather than move, so the spooled copy survives for restore(); the
+        # rename is atomic within the filesystem, so readers never see a partial blob
+        staged = self.tmp_path + ".link"
+        os.link(self.tmp_path, staged)
+        os.replace(staged, target)
+
+
+class _S3BlobWriter(BlobWriter):
+    def __init__(self, store: S3BlobStore):
+        super().__init__()
+        self.store = store
+
+    def _store(self) -> None:
+        if self.store.exists(self.digest):
+            return
+        with open(self.tmp_path, "rb") as fh:
+            self.store.client.upload_fileobj(fh, self.store.bucket, self.store.key(self.digest))
+
+
+class _LocalPartWriter(BlobWriter):
+    def __init__(self, store: LocalBlobStore, target: str):
+        super().__init__(tmp_dir=store.tmp_dir)
+        self.target = target
+
+    def _store(self) -> None:
+        os.makedirs(os.path.dirname(self.target), exist_ok=True)
+        os.replace(self.tmp_path, self.target)
+
+
+class _S3PartWriter(BlobWriter):
+    def __init__(self, store: S3BlobStore, key: str):
+        super().__init__()
+        self.store = store
+        self.key = key
+
+    def _store(self) -> None:
+        with open(self.tmp_path, "rb") as fh:
+            self.store.client.upload_fileobj(fh, self.store.bucket, self.key)
+
+
+def get_blob_store() -> BlobStore:
+    """Build the blob store selected by BLOB_STORAGE_BACKEND."""
+    if BLOB_STORAGE_BACKEND == "local":
+        return LocalBlobStore(BLOB_STORAGE_PATH)
+    if BLOB_STORAGE_BACKEND == "s3":
+        if not BLOB_STORAGE_BUCKET:
+            raise RuntimeError("BLOB_STORAGE_BUCKET must be set for the s3 blob storage backend")
+        return S3BlobStore(BLOB_STORAGE_BUCKET, BLOB_STORAGE_PREFIX)
+    raise RuntimeError(f"Unknown blob storage backend: {BLOB_STORAGE_BACKEND}")
+
+
+blob_store = get_blob_store()
@@ -0,0 +1,285 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.services.lexical import tokenize
+
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", "./vectors")
+# "hashing" (local, deterministic) or "openai"
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "hashing")
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+HASHING_DIM = int(os.getenv("HASHING_EMBEDDING_DIM", "512"))
+
+INITIAL_CAPACITY = 64
+# Searches over fewer than 1/SEARCH_GATHER_FRACTION of an index's rows copy those
+# rows out; larger ones score the whole matrix in place and select the candidate columns
+SEARCH_GATHER_FRACTION = 8
+
+
+class HashingEmbedder:
+    """Deterministic local embedder using the hashing trick.
+
+    Unigrams and bigrams are hashed into `dim` signed buckets and the result
+    is L2-normalised. No model or network is needed, which makes it suitable
+    for offline use and tests; quality is close to a bag-of-words model.
+    """
+
+    name = "hashing"
+
+    def __init__(self, dim: int = HASHING_DIM):
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = tokenize(text)
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                out[row, h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+        return _normalize(out)
+
+
+class OpenAIEmbedder:
+    """Embeddings from the OpenAI embeddings API (requires OPENAI_API_KEY)."""
+
+    name = "openai"
+
+    def __init__(self, model: str = EMBEDDING_MODEL, dim: Optional[int] = None):
+        from app.services import openai_client
+        if openai_client is None:
+            raise RuntimeError("OPENAI_API_KEY is not configured")
+        self._client = openai_client
+        self.model = model
+        self.dim = dim or (3072 if model.endswith("-large") else 1536)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        response = self._client.embeddings.create(model=self.model, input=list(texts))
+        data = sorted(response.data, key=lambda item: item.index)
+        return _normalize(np.asarray([item.embedding for item in data], dtype=np.float32))
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+
+def get_embedder():
+    """The configured embedding backend (created once per process)."""
+    global _embedder
+    with _embedder_lock:
+        if _embedder is None:
+            if EMBEDDING_BACKEND == "openai":
+                _embedder = OpenAIEmbedder()
+            elif EMBEDDING_BACKEND == "hashing":
+                _embedder = HashingEmbedder()
+            else:
+                raise ValueError(f"Unknown EMBEDDING_BACKEND: {EMBEDDING_BACKEND}")
+        return _embedder
+
+
+class VectorIndex:
+    """Dense vectors in one contiguous float32 matrix, memory-mapped from disk.
+
+    Rows are stored in `<path>.npy`. The row -> id mapping is a JSON snapshot
+    plus an append-only log of `[row, id]` changes, so an add or remove
+    writes only the rows it touched; the log is folded into the snapshot once
+    it outgrows the index. Vectors are expected to be L2-normalised, so
+    cosine similarity is a single matrix multiply. Removed rows are zeroed
+    and kept on a free list for later adds.
+    """
+
+    def __init__(self, path: str, dim: int):
+        self.path = path
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._ids: List[Optional[str]] = []
+        self._rows: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._logged = 0
+        self._matrix: Optional[np.ndarray] = None
+        self._load()
+
+    @property
+    def _matrix_path(self) -> str:
+        return self.path + ".npy"
+
+    @property
+    def _ids_path(self) -> str:
+        return self.path + ".ids.json"
+
+    @property
+    def _log_path(self) -> str:
+        return self.path + ".ids.log"
+
+    def _load(self) -> None:
+        if not (os.path.exists(self._matrix_path) and os.path.exists(self._ids_path)):
+            return
+        matrix = np.load(self._matrix_path, mmap_mode="r+")
+        with open(self._ids_path) as fh:
+            ids = json.load(fh)
+        logged = 0
+        if os.path.exists(self._log_path):
+            with open(self._log_path) as fh:
+                for line in fh:
+                    try:
+                        row, doc_id = json.loads(line)
+                    except ValueError:
+                        break  # torn final write
+                    ids.extend([None] * (row + 1 - len(ids)))
+                    ids[row] = doc_id
+                    logged += 1
+        if matrix.ndim != 2 or matrix.shape[1] != self.dim or len(ids) > matrix.shape[0]:
+            # Written by a different embedder; start over
+            return
+        self._matrix = matrix
+        self._ids = ids
+        self._rows = {doc_id: row for row, doc_id in enumerate(ids) if doc_id is not None}
+        self._free = [row for row in reversed(range(len(ids))) if ids[row] is None]
+        self._logged = logged
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._rows
+
+    def _ensure_capacity(self, rows: int) -> None:
+        capacity = 0 if self._matrix is None else self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        new_capacity = max(INITIAL_CAPACITY, capacity)
+        while new_capacity < rows:
+            new_capacity *= 2
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        tmp_path = self._matrix_path + ".tmp.npy"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float32, shape=(new_capacity, self.dim))
+        if capacity:
+            grown[:capacity] = self._matrix
+        grown.flush()
+        del grown
+        self._matrix = None
+        os.replace(tmp_path, self._matrix_path)
+        self._matrix = np.load(self._matrix_path, mmap_mode="r+")
+
+    def _save_ids(self, rows: Sequence[int]) -> None:
+        """Persist the ids of `rows` after their vectors were written."""
+        self._matrix.flush()
+        if not os.path.exists(self._ids_path) or self._logged + len(rows) > max(len(self._ids), INITIAL_CAPACITY):
+            tmp_path = self._ids_path + ".tmp"
+            with open(tmp_path, "w") as fh:
+                json.dump(self._ids, fh)
+            os.replace(tmp_path, self._ids_path)
+            if os.path.exists(self._log_path):
+                os.remove(self._log_path)
+            self._logged = 0
+            return
+        with open(self._log_path, "a") as fh:
+            fh.write("".join(json.dumps([row, self._ids[row]]) + "\n" for row in rows))
+        self._logged += len(rows)
+
+    def add(self, doc_ids: Sequence[str], vectors: np.ndarray) -> None:
+        """Insert or replace vectors for `doc_ids` (one row each)."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(doc_ids), self.dim)
+        with self._lock:
+            rows = []
+            for doc_id in doc_ids:
+                if doc_id in self._rows:
+                    rows.append(self._rows[doc_id])
+                elif self._free:
+                    rows.append(self._free.pop())
+                else:
+                    rows.append(len(self._ids))
+                    self._ids.append(None)
+                self._rows[doc_id] = rows[-1]
+            self._ensure_capacity(len(self._ids))
+            self._matrix[rows] = vectors
+            for doc_id, row in zip(doc_ids, rows):
+                self._ids[row] = doc_id
+            self._save_ids(rows)
+
+    def remove(self, doc_ids: Iterable[str]) -> None:
+        with self._lock:
+            rows = [self._rows.pop(doc_id) for doc_id in doc_ids if doc_id in self._rows]
+            if not rows:
+                return
+            self._matrix[rows] = 0.0
+            for row in rows:
+                self._ids[row] = None
+            self._free.extend(rows)
+            self._save_ids(rows)
+
+    def take(self, doc_ids: Iterable[str]) -> Tuple[List[str], np.ndarray]:
+        """Copy out the stored vectors of those `doc_ids` present in the index."""
+        with self._lock:
+            present = [doc_id for doc_id in doc_ids if doc_id in self._rows]
+            if not present:
+                return [], np.zeros((0, self.dim), dtype=np.float32)
+            return present, np.array(self._matrix[[self._rows[doc_id] for doc_id in present]])
+
+    def search(
+        self, queries: np.ndarray, k: int = 5, doc_ids: Optional[Iterable[str]] = None
+    ) -> List[List[Tuple[str, float]]]:
+        """Cosine top-k for a batch of query vectors.
+
+        Returns one list of (doc_id, score) per query row, best first. When
+        `doc_ids` is given, only those documents are scored.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        with self._lock:
+            if doc_ids is None:
+                rows = np.fromiter(self._rows.values(), dtype=np.int64)
+            else:
+                rows = np.fromiter((self._rows[d] for d in doc_ids if d in self._rows), dtype=np.int64)
+            if not len(rows) or k <= 0:
+                return [[] for _ in queries]
+            used = self._matrix[:len(self._ids)]
+            if len(rows) * SEARCH_GATHER_FRACTION < len(used):
+                # A small subset: copying its rows is cheaper than scoring every row
+                scores = queries @ used[rows].T
+            else:
+                # Score the contiguous matrix in place and keep the candidate columns
+                scores = (queries @ used.T)[:, rows]  # (n_queries, n_candidates)
+            ids = [self._ids[row] for row in rows]
+        k = min(k, len(ids))
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        results = []
+        for q, cols in enumerate(top):
+            cols = cols[np.argsort(-scores[q, cols])]
+            results.append([(ids[c], float(scores[q, c])) for c in cols])
+        return results
+
+
+# One index per workspace, as for the lexical index
+_indexes: Dict[str, VectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def _index_path(workspace_id: str) -> str:
+    embedder = get_embedder()
+    return os.path.join(VECTOR_INDEX_PATH, f"{workspace_id}.{embedder.name}")
+
+
+def get_index(workspace_id: str) -> VectorIndex:
+    with _indexes_lock:
+        index = _indexes.get(workspace_id)
+        if index is None:
+            index = _indexes[workspace_id] = VectorIndex(_index_path(workspace_id), get_embedder().dim)
+        return index
+
+
+def drop_index(workspace_id: str) -> None:
+    with _indexes_lock:
+        _indexes.pop(workspace_id, None)
+        path = _index_path(workspace_id)
+        for suffix in (".npy", ".ids.json", ".ids.log"):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
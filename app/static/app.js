@@ -4,6 +4,20 @@ const state = { workspaceId: null, kits: [], assets: [], lastShare: null, lastKi
 
 function el(id) { return document.getElementById(id) }
 
+// Follow X-Next-Cursor headers so paginated listings are returned in full
+async function fetchAllPages(url) {
+  let res = await fetch(url)
+  if (!res.ok || !res.headers.get('X-Next-Cursor')) return res
+  const items = await res.json()
+  while (res.headers.get('X-Next-Cursor')) {
+    const sep = url.includes('?') ? '&' : '?'
+    res = await fetch(`${url}${sep}cursor=${encodeURIComponent(res.headers.get('X-Next-Cursor'))}`)
+    if (!res.ok) return res
+    items.push(...await res.json())
+  }
+  return new Response(JSON.stringify(items), { status: 200, headers: { 'Content-Type': 'application/json' } })
+}
+
 function fmtSize(n) { if (!n && n !== 0) return '-'; if (n < 1024) return n + ' B'; if (n < 1024 * 1024) return (n / 1024).toFixed(1) + ' KB'; return (n / 1024 / 1024).toFixed(2) + ' MB' }
 
 function showToast(title, msg, type = 'info') {
@@ -132,7 +146,7 @@ async function refreshWorkspaces() {
   if (!list) return;
 
   try {
-    const res = await fetch('/workspaces/');
+    const res = await fetchAllPages('/workspaces/');
     if (!res.ok) return;
     const workspaces = await res.json();
 
@@ -207,7 +221,7 @@ async function refreshKits() {
   tbody.innerHTML = '<tr><td colspan="5" style="text-align:center; padding: 24px;">Loading...</td></tr>';
 
   try {
-    const res = await fetch(`/kits/${state.workspaceId}`);
+    const res = await fetchAllPages(`/kits/${state.workspaceId}`);
     const kits = await res.json();
     tbody.innerHTML = '';
 
@@ -568,7 +582,7 @@ async function refreshAssets() {
     return;
   }
 
-  const res = await fetch(`/assets/${state.workspaceId}`)
+  const res = await fetchAllPages(`/assets/${state.workspaceId}`)
   if (res.status === 404) {
     handleInvalidWorkspace()
     return
@@ -609,7 +623,7 @@ async function refreshKits() {
   if (!state.workspaceId) { tbody.innerHTML = ''; return }
 
   console.log('Fetching kits for workspace:', state.workspaceId);
-  const res = await fetch(`/kits/${state.workspaceId}`)
+  const res = await fetchAllPages(`/kits/${state.workspaceId}`)
   if (res.status === 404) { handleInvalidWorkspace(); return }
   if (!res.ok) { console.error('Error loading kits'); return }
 
@@ -907,13 +921,32 @@ async function exportWorkspace() {
   const workspace = await wsRes.json();
 
   // Fetch all assets
-  const assetsRes = await fetch(`/assets/${state.workspaceId}`);
+  const assetsRes = await fetchAllPages(`/assets/${state.workspaceId}?include=content`);
   const assets = assetsRes.ok ? await assetsRes.json() : [];
 
   // Fetch all kits
-  const kitsRes = await fetch(`/kits/${state.workspaceId}`);
+  const kitsRes = await fetchAllPages(`/kits/${state.workspaceId}`);
   const kits = kitsRes.ok ? await kitsRes.json() : [];
 
+  // Uploaded files keep their bytes in the blob store, so fetch them for the export
+  let missing = 0;
+  const exported = [];
+  for (const a of assets) {
+    const entry = {
+      name: a.name,
+      description: a.description,
+      content: a.content,
+      asset_type: a.asset_type,
+      mime_type: a.mime_type
+    };
+    if (a.content == null) {
+      const fileRes = await fetch(`/assets/asset/${a.id}/download`);
+      if (!fileRes.ok) { missing++; continue }
+      entry.data = await blobToBase64(await fileRes.blob());
+    }
+    exported.push(entry);
+  }
+
   // Create export object
   const exportData = {
     version: '1.0',
@@ -922,13 +955,7 @@ async function exportWorkspace() {
       name: workspace.name,
       description: workspace.description
     },
-    assets: assets.map(a => ({
-      name: a.name,
-      description: a.description,
-      content: a.content,
-      asset_type: a.asset_type,
-      mime_type: a.mime_type
-    })),
+    assets: exported,
     kits: kits.map(k => ({
       name: k.name,
       description: k.description,
@@ -947,7 +974,27 @@ async function exportWorkspace() {
   document.body.removeChild(link);
   URL.revokeObjectURL(url);
 
-  showToast('Export Complete', `Workspace "${workspace.name}" exported successfully`, 'success');
+  if (missing) {
+    showToast('Export Incomplete', `${missing} assets could not be downloaded and were left out`, 'error');
+  } else {
+    showToast('Export Complete', `Workspace "${workspace.name}" exported successfully`, 'success');
+  }
+}
+
+function blobToBase64(blob) {
+  return new Promise((resolve, reject) => {
+    const reader = new FileReader();
+    reader.onload = () => resolve(reader.result.slice(reader.result.indexOf(',') + 1));
+    reader.onerror = () => reject(reader.error);
+    reader.readAsDataURL(blob);
+  });
+}
+
+function base64ToBlob(data, type) {
+  const binary = atob(data);
+  const bytes = new Uint8Array(binary.length);
+  for (let i = 0; i < binary.length; i++) bytes[i] = binary.charCodeAt(i);
+  return new Blob([bytes], { type: type || 'application/octet-stream' });
 }
 
 async function importWorkspace() {
@@ -992,15 +1039,27 @@ async function importWorkspace() {
 
       // Import assets
       const assetMap = {};
+      let failed = 0;
       for (const asset of data.assets || []) {
-        const assetRes = await fetch(`/assets/${newWorkspace.id}`, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify(asset)
-        });
+        let assetRes;
+        if (asset.data != null) {
+          // Uploaded files go back through the upload endpoint
+          const form = new FormData();
+          form.append('file', base64ToBlob(asset.data, asset.mime_type), asset.name);
+          if (asset.description) form.append('description', asset.description);
+          assetRes = await fetch(`/assets/${newWorkspace.id}/upload`, { method: 'POST', body: form });
+        } else {
+          assetRes = await fetch(`/assets/${newWorkspace.id}`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(asset)
+          });
+        }
         if (assetRes.ok) {
           const newAsset = await assetRes.json();
           assetMap[asset.name] = newAsset.id;
+        } else {
+          failed++;
         }
       }
 
@@ -1021,7 +1080,12 @@ async function importWorkspace() {
       await refreshAssets();
       await refreshKits();
 
-      showToast('Import Complete', `Imported ${data.assets?.length || 0} assets and ${data.kits?.length || 0} kits`, 'success');
+      const imported = (data.assets?.length || 0) - failed;
+      if (failed) {
+        showToast('Import Incomplete', `Imported ${imported} assets and ${data.kits?.length || 0} kits; ${failed} assets failed`, 'error');
+      } else {
+        showToast('Import Complete', `Imported ${imported} assets and ${data.kits?.length || 0} kits`, 'success');
+      }
 
     } catch (error) {
       showToast('Import Failed', error.message, 'error');
@@ -1174,7 +1238,7 @@ async function refreshSettings() {
     }
 
     // Populate Merge Dropdown
-    const allWsRes = await fetch('/workspaces/');
+    const allWsRes = await fetchAllPages('/workspaces/');
     if (allWsRes.ok) {
       const allWs = await allWsRes.json();
       const select = el('merge-target-ws-select');
@@ -0,0 +1,120 @@
+"""Compare asset download paths: throughput and CPU time per GB.
+
+Runs each response class directly against an in-process ASGI "server" that
+writes the body to /dev/null, so numbers reflect the application side only:
+
+  legacy     base64-decode Asset.content, StreamingResponse(iter([file_content]))
+  stream     StreamingResponse over LocalBlobStore.iter_chunks
+  sendfile   SendfileResponse reading in a worker thread; this is the path
+             the app takes under uvicorn, which has no zerocopysend extension
+  zerocopy   (--simulate-zerocopy) SendfileResponse handing its descriptor to
+             a simulated server implementing zerocopysend with os.sendfile.
+             Only reachable on ASGI servers with that extension, not uvicorn
+
+Usage: python -m benchmarks.download_throughput --size-mb 256 --rounds 5
+"""
+import argparse
+import asyncio
+import base64
+import os
+import tempfile
+import time
+
+from fastapi.responses import StreamingResponse
+
+from app.services.sendfile import SendfileResponse
+from app.services.storage import LocalBlobStore
+
+
+class DevNullServer:
+    """Minimal ASGI server side: drains response messages into /dev/null."""
+
+    def __init__(self, zerocopy: bool):
+        self.zerocopy = zerocopy
+        self.fd = os.open(os.devnull, os.O_WRONLY)
+        self.sent = 0
+
+    def scope(self):
+        extensions = {"http.response.zerocopysend": {}} if self.zerocopy else {}
+        return {"type": "http", "method": "GET", "headers": [], "extensions": extensions}
+
+    async def receive(self):
+        # The client never disconnects mid-download
+        await asyncio.Event().wait()
+
+    async def send(self, message):
+        if message["type"] == "http.response.body":
+            body = message.get("body", b"")
+            os.write(self.fd, body)
+            self.sent += len(body)
+        elif message["type"] == "http.response.zerocopysend":
+            offset, count = message["offset"], message["count"]
+            while count > 0:
+                written = os.sendfile(self.fd, message["file"], offset, count)
+                if written == 0:
+                    break
+                offset += written
+                count -= written
+                self.sent += written
+
+    def close(self):
+        os.close(self.fd)
+
+
+def run(make_response, zerocopy: bool, size: int, rounds: int):
+    wall = cpu = 0.0
+    for _ in range(rounds):
+        server = DevNullServer(zerocopy)
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        response = make_response()
+        asyncio.run(response(server.scope(), server.receive, server.send))
+        wall += time.perf_counter() - wall_start
+        cpu += time.process_time() - cpu_start
+        server.close()
+        assert server.sent == size, f"sent {server.sent} of {size} bytes"
+    gigabytes = size * rounds / 1024 ** 3
+    return gigabytes / wall, cpu / gigabytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=int, default=128)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument(
+        "--simulate-zerocopy", action="store_true",
+        help="also time a simulated server with the zerocopysend extension (not uvicorn)"
+    )
+    args = parser.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    with tempfile.TemporaryDirectory() as root:
+        store = LocalBlobStore(root)
+        data = os.urandom(size)
+        digest = store.put(data)
+        path = store.local_path(digest)
+        content_b64 = base64.b64encode(data).decode("utf-8")
+        del data
+
+        def legacy():
+            file_content = base64.b64decode(content_b64)
+            return StreamingResponse(iter([file_content]), media_type="application/octet-stream")
+
+        cases = [
+            ("legacy", legacy, False),
+            ("stream", lambda: StreamingResponse(store.iter_chunks(digest), media_type="application/octet-stream"), False),
+            ("sendfile", lambda: SendfileResponse(path, media_type="application/octet-stream"), False),
+        ]
+        if args.simulate_zerocopy:
+            cases.append(("zerocopy*", lambda: SendfileResponse(path, media_type="application/octet-stream"), True))
+
+        print(f"{args.size_mb} MiB x {args.rounds} rounds")
+        print(f"{'path':<10} {'GiB/s':>8} {'CPU s/GiB':>10}")
+        for name, make_response, zerocopy in cases:
+            throughput, cpu_per_gb = run(make_response, zerocopy, size, args.rounds)
+            print(f"{name:<10} {throughput:>8.2f} {cpu_per_gb:>10.3f}")
+        if args.simulate_zerocopy:
+            print("* simulated server; under uvicorn downloads take the sendfile row's path")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Stand-in for an OpenAI-compatible LLM API, for offline load testing.
+
+Serves POST /v1/chat/completions (plain and `"stream": true`) and
+GET /v1/models. Answers are placeholder text; what is realistic is the
+timing: time to first token follows a log-normal distribution fitted to the
+given median and p99, tokens then arrive at the given rate, and a share of
+requests fails with 503 or 429.
+
+Usage: python -m benchmarks.mock_llm --port 8090 --latency-ms 600 --p99-ms 3000 \\
+           --tokens-per-second 80 --error-rate 0.01
+
+Point the app at it with OPENAI_BASE_URL=http://localhost:8090/v1 and any
+OPENAI_API_KEY.
+"""
+import argparse
+import asyncio
+import json
+import math
+import random
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# z-score of the 99th percentile of a standard normal distribution
+Z_99 = 2.326
+
+
+@dataclass
+class MockConfig:
+    latency_ms: float = 500.0  # Median time to first token
+    p99_ms: float = 2000.0  # 99th percentile time to first token
+    tokens_per_second: float = 50.0  # Generation rate after the first token
+    output_tokens: int = 60  # Tokens per answer, capped by the request's max_tokens
+    error_rate: float = 0.0  # Share of requests answered with an error status
+    seed: Optional[int] = None
+
+    def first_token_delay(self, rng: random.Random) -> float:
+        """Seconds before the first token, log-normally distributed."""
+        if self.latency_ms <= 0:
+            return 0.0
+        sigma = math.log(max(self.p99_ms, self.latency_ms) / self.latency_ms) / Z_99
+        return rng.lognormvariate(math.log(self.latency_ms / 1000), sigma)
+
+
+def _words(prompt: str, count: int) -> list:
+    seed = prompt.split() or ["answer"]
+    return [seed[i % len(seed)] for i in range(count)]
+
+
+def create_app(config: MockConfig) -> FastAPI:
+    app = FastAPI(title="Mock LLM")
+    rng = random.Random(config.seed)
+    stats = {"requests": 0, "errors": 0}
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock-model", "object": "model", "owned_by": "mock"}]}
+
+    @app.get("/stats")
+    async def get_stats():
+        return stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        stats["requests"] += 1
+        if rng.random() < config.error_rate:
+            stats["errors"] += 1
+            status = rng.choice([429, 503])
+            return JSONResponse({"error": {"message": "mock failure", "type": "server_error"}}, status_code=status)
+
+        prompt = (body.get("messages") or [{}])[-1].get("content", "")
+        tokens = min(config.output_tokens, body.get("max_tokens") or config.output_tokens)
+        words = _words(prompt, tokens)
+        first_token = config.first_token_delay(rng)
+        interval = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        model = body.get("model", "mock-model")
+
+        if not body.get("stream"):
+            await asyncio.sleep(first_token + interval * max(tokens - 1, 0))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": len(prompt.split()), "completion_tokens": tokens, "total_tokens": len(prompt.split()) + tokens},
+            }
+
+        async def events():
+            def chunk(delta: dict, finish_reason=None) -> str:
+                data = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                }
+                return f"data: {json.dumps(data)}\n\n"
+
+            await asyncio.sleep(first_token)
+            yield chunk({"role": "assistant"})
+            for i, word in enumerate(words):
+                if i:
+                    await asyncio.sleep(interval)
+                yield chunk({"content": word if i == 0 else " " + word})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency-ms", type=float, default=500.0, help="median time to first token")
+    parser.add_argument("--p99-ms", type=float, default=2000.0, help="99th percentile time to first token")
+    parser.add_argument("--tokens-per-second", type=float, default=50.0)
+    parser.add_argument("--output-tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = MockConfig(
+        latency_ms=args.latency_ms,
+        p99_ms=args.p99_ms,
+        tokens_per_second=args.tokens_per_second,
+        output_tokens=args.output_tokens,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
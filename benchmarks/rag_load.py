@@ -0,0 +1,123 @@
+"""Load-test RAG queries against a running server: throughput and tail latency.
+
+Creates a workspace with a kit of generated documents, then keeps
+--concurrency queries in flight until --requests have completed. Queries
+are distinct and bypass the answer cache unless --repeat is given, so each
+one reaches the LLM.
+
+Offline, with the bundled mock provider:
+
+  python -m benchmarks.mock_llm --port 8090 &
+  OPENAI_API_KEY=mock OPENAI_BASE_URL=http://localhost:8090/v1 uvicorn app.main:app --port 8000 &
+  python -m benchmarks.rag_load --url http://localhost:8000 --concurrency 64 --requests 2000
+
+--stream queries the SSE endpoint and also reports time to first token.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+from typing import List, Optional
+
+import httpx
+
+TOPICS = ["billing", "onboarding", "security", "deployment", "retention", "pricing", "support", "roadmap"]
+
+
+def percentile(values: List[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))] if ordered else 0.0
+
+
+async def seed_kit(client: httpx.AsyncClient, documents: int) -> str:
+    workspace_id = (await client.post("/workspaces/", json={"name": f"Load test {uuid.uuid4().hex[:8]}"})).json()["id"]
+    asset_ids = []
+    for i in range(documents):
+        topic = TOPICS[i % len(TOPICS)]
+        content = " ".join(
+            f"The {topic} policy section {i}.{j} explains how requests about {topic} are handled within {j + 1} days."
+            for j in range(40)
+        )
+        response = await client.post(f"/assets/{workspace_id}", json={"name": f"{topic}-{i}", "content": content})
+        asset_ids.append(response.json()["id"])
+    response = await client.post(f"/kits/{workspace_id}", json={"name": "Load test kit", "asset_ids": asset_ids})
+    return response.json()["id"]
+
+
+async def query(client: httpx.AsyncClient, payload: dict, stream: bool):
+    """Returns (latency, time to first token or None, ok)."""
+    start = time.perf_counter()
+    if not stream:
+        response = await client.post("/rag/query", json=payload)
+        return time.perf_counter() - start, None, response.status_code == 200
+    first_token: Optional[float] = None
+    ok = False
+    async with client.stream("POST", "/rag/query/stream", json=payload) as response:
+        async for line in response.aiter_lines():
+            if line == "event: token" and first_token is None:
+                first_token = time.perf_counter() - start
+            elif line == "event: done":
+                ok = True
+            elif line == "event: error":
+                break
+    return time.perf_counter() - start, first_token, ok and response.status_code == 200
+
+
+async def run(args) -> None:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        kit_id = await seed_kit(client, args.documents)
+        counter = iter(range(args.requests))
+        latencies, first_tokens, errors = [], [], 0
+
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                topic = TOPICS[i % len(TOPICS)]
+                question = f"How are {topic} requests handled?" if args.repeat else f"How are {topic} requests handled (run {i})?"
+                payload = {"query": question, "kit_id": kit_id, "model": args.model, "bypass_cache": not args.repeat}
+                try:
+                    latency, first_token, ok = await query(client, payload, args.stream)
+                except httpx.HTTPError:
+                    latency, first_token, ok = 0.0, None, False
+                if ok:
+                    latencies.append(latency)
+                    if first_token is not None:
+                        first_tokens.append(first_token)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, {elapsed:.1f}s")
+    print(f"throughput   {len(latencies) / elapsed:8.1f} req/s   errors {errors}")
+    if latencies:
+        print(
+            f"latency ms   p50 {percentile(latencies, 50) * 1000:7.0f}   p95 {percentile(latencies, 95) * 1000:7.0f}"
+            f"   p99 {percentile(latencies, 99) * 1000:7.0f}   mean {statistics.mean(latencies) * 1000:7.0f}"
+        )
+    if first_tokens:
+        print(
+            f"first token  p50 {percentile(first_tokens, 50) * 1000:7.0f}   p95 {percentile(first_tokens, 95) * 1000:7.0f}"
+            f"   p99 {percentile(first_tokens, 99) * 1000:7.0f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--documents", type=int, default=20)
+    parser.add_argument("--model", default="gpt-3.5-turbo")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--stream", action="store_true", help="use the SSE endpoint")
+    parser.add_argument("--repeat", action="store_true", help="repeat a few questions and allow cache hits")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
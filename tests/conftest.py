@@ -1,6 +1,13 @@
 import pytest
 import tempfile
 import os
+
+# Keep uploaded blobs out of the working tree; must be set before the app is imported
+os.environ.setdefault("BLOB_STORAGE_PATH", tempfile.mkdtemp(prefix="youfyi-blobs-"))
+os.environ.setdefault("VECTOR_INDEX_PATH", tempfile.mkdtemp(prefix="youfyi-vectors-"))
+# Index inline so tests see indexing results without waiting on worker processes
+os.environ.setdefault("INDEX_WORKERS", "0")
+
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from app.database import Base, get_db
@@ -37,7 +44,8 @@ def db_session(test_db):
     connection = test_db.connect()
     transaction = connection.begin()
     
-    session = TestingSessionLocal(bind=connection)
+    # Savepoint mode: code under test may commit or roll back without ending the outer transaction
+    session = TestingSessionLocal(bind=connection, join_transaction_mode="create_savepoint")
     
     def override_get_db():
         yield session
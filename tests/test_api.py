@@ -434,3 +434,131 @@ class TestIntegration:
         })
         assert query.status_code == 200
         assert "answer" in query.json()
+
+
+class TestContentProjection:
+    def _setup(self, client):
+        workspace_id = client.post("/workspaces/", json={"name": "Projection"}).json()["id"]
+        asset_id = client.post(
+            f"/assets/{workspace_id}",
+            json={"name": "Big Doc", "content": "lots of text", "asset_type": "document"}
+        ).json()["id"]
+        kit_id = client.post(
+            f"/kits/{workspace_id}", json={"name": "Kit", "asset_ids": [asset_id]}
+        ).json()["id"]
+        return workspace_id, asset_id, kit_id
+
+    def test_listings_omit_content_by_default(self, client):
+        workspace_id, _, kit_id = self._setup(client)
+        token = client.post(f"/sharing-links/kit/{kit_id}", json={}).json()["token"]
+
+        assets = client.get(f"/assets/{workspace_id}").json()
+        kit = client.get(f"/kits/kit/{kit_id}").json()
+        kits = client.get(f"/kits/{workspace_id}").json()
+        shared = client.get(f"/sharing-links/token/{token}/assets").json()
+
+        for asset in [assets[0], kit["assets"][0], kits[0]["assets"][0], shared[0]]:
+            assert asset["name"] == "Big Doc"
+            assert "content" not in asset
+
+    def test_include_content_opt_in(self, client):
+        workspace_id, _, kit_id = self._setup(client)
+        token = client.post(f"/sharing-links/kit/{kit_id}", json={}).json()["token"]
+
+        assets = client.get(f"/assets/{workspace_id}?include=content").json()
+        kit = client.get(f"/kits/kit/{kit_id}?include=content").json()
+        kits = client.get(f"/kits/{workspace_id}?include=content").json()
+        shared = client.get(f"/sharing-links/token/{token}/assets?include=content").json()
+
+        for asset in [assets[0], kit["assets"][0], kits[0]["assets"][0], shared[0]]:
+            assert asset["content"] == "lots of text"
+
+    def test_listing_does_not_select_content_column(self, client, test_db):
+        from sqlalchemy import event
+        workspace_id, _, _ = self._setup(client)
+        statements = []
+
+        def capture(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+
+        event.listen(test_db, "before_cursor_execute", capture)
+        try:
+            client.get(f"/assets/{workspace_id}")
+        finally:
+            event.remove(test_db, "before_cursor_execute", capture)
+        asset_selects = [s for s in statements if "FROM assets" in s]
+        assert asset_selects
+        assert not any("assets.content" in s for s in asset_selects)
+
+
+class TestPagination:
+    def _workspace_with_assets(self, client, count):
+        workspace_id = client.post("/workspaces/", json={"name": "Paged"}).json()["id"]
+        for i in range(count):
+            client.post(
+                f"/assets/{workspace_id}",
+                json={"name": f"asset-{i:02d}", "content": "x" * i, "asset_type": "document"}
+            )
+        return workspace_id
+
+    def test_cursor_walks_all_assets_in_order(self, client):
+        workspace_id = self._workspace_with_assets(client, 7)
+        names, cursor, pages = [], None, 0
+        while True:
+            url = f"/assets/{workspace_id}?limit=3" + (f"&cursor={cursor}" if cursor else "")
+            response = client.get(url)
+            assert response.status_code == 200
+            names += [a["name"] for a in response.json()]
+            pages += 1
+            cursor = response.headers.get("x-next-cursor")
+            if not cursor:
+                break
+        assert pages == 3
+        assert names == [f"asset-{i:02d}" for i in range(7)]
+
+    def test_last_page_has_no_cursor(self, client):
+        workspace_id = self._workspace_with_assets(client, 2)
+        response = client.get(f"/assets/{workspace_id}?limit=2")
+        assert len(response.json()) == 2
+        assert "x-next-cursor" not in response.headers
+
+    def test_invalid_cursor(self, client):
+        workspace_id = self._workspace_with_assets(client, 1)
+        response = client.get(f"/assets/{workspace_id}?cursor=not-a-cursor")
+        assert response.status_code == 400
+
+    def test_asset_filters(self, client):
+        workspace_id = client.post("/workspaces/", json={"name": "Filtered"}).json()["id"]
+        files = [
+            ("photo.png", b"\x89PNG\r\n\x1a\n" + b"0" * 100, "image/png"),
+            ("photo_small.jpg", b"\xff\xd8\xff" + b"0" * 10, "image/jpeg"),
+            ("report.pdf", b"%PDF-1.4" + b"0" * 500, "application/pdf"),
+        ]
+        for name, data, mime in files:
+            client.post(f"/assets/{workspace_id}/upload", files={"file": (name, data, mime)})
+
+        def names(query):
+            return sorted(a["name"] for a in client.get(f"/assets/{workspace_id}?{query}").json())
+
+        assert names("mime_type=image/*") == ["photo.png", "photo_small.jpg"]
+        assert names("mime_type=application/pdf") == ["report.pdf"]
+        assert names("asset_type=document") == ["report.pdf"]
+        assert names("min_size=50&max_size=200") == ["photo.png"]
+        assert names("name_prefix=photo_") == ["photo_small.jpg"]
+
+    def test_workspace_and_kit_pagination(self, client):
+        for i in range(3):
+            client.post("/workspaces/", json={"name": f"ws-{i}"})
+        first = client.get("/workspaces/?limit=2")
+        assert len(first.json()) == 2
+        second = client.get(f"/workspaces/?limit=2&cursor={first.headers['x-next-cursor']}")
+        assert [w["name"] for w in second.json()] == ["ws-2"]
+        assert [w["name"] for w in client.get("/workspaces/?name_prefix=ws-1").json()] == ["ws-1"]
+
+        workspace_id = first.json()[0]["id"]
+        for i in range(3):
+            client.post(f"/kits/{workspace_id}", json={"name": f"kit-{i}"})
+        page = client.get(f"/kits/{workspace_id}?limit=2")
+        assert [k["name"] for k in page.json()] == ["kit-0", "kit-1"]
+        rest = client.get(f"/kits/{workspace_id}?limit=2&cursor={page.headers['x-next-cursor']}")
+        assert [k["name"] for k in rest.json()] == ["kit-2"]
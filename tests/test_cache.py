@@ -0,0 +1,189 @@
+import asyncio
+import json
+
+import httpx
+
+from app.services import cache as cache_module
+from app.services import providers
+from app.services.cache import AnswerCache, LRUCache, SemanticCache, SharedCache, answer_cache, cache_key, normalize_query
+from app.services.vectors import HashingEmbedder
+from app.services.providers import OpenAIProvider
+
+
+class DictCache(SharedCache):
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def set(self, key, value, ttl):
+        self.values[key] = value
+
+
+class TestLRUCache:
+    def test_evicts_least_recently_used(self):
+        lru = LRUCache(max_entries=2, ttl=60)
+        lru.set("a", 1)
+        lru.set("b", 2)
+        lru.get("a")
+        lru.set("c", 3)
+        assert lru.get("a") == 1
+        assert lru.get("b") is None
+        assert lru.get("c") == 3
+
+    def test_entries_expire(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+        lru = LRUCache(max_entries=10, ttl=30)
+        lru.set("a", 1)
+        now[0] += 29
+        assert lru.get("a") == 1
+        now[0] += 2
+        assert lru.get("a") is None
+        assert len(lru) == 0
+
+    def test_query_normalization(self):
+        assert normalize_query("  What is  Python? ") == normalize_query("what is python")
+        assert cache_key("What is Python?", "gpt-4o", True, "v1") == cache_key("what is python", "gpt-4o", True, "v1")
+        assert cache_key("What is Python?", "gpt-4o", True, "v1") != cache_key("What is Python?", "gpt-4o", True, "v2")
+        assert cache_key("What is Python?", "gpt-4o", True, "v1") != cache_key("What is Python?", "gemini-pro", True, "v1")
+
+    def test_shared_tier_fills_local_tier(self):
+        shared = DictCache()
+        writer = AnswerCache(LRUCache(10, 60), shared, ttl=60)
+        reader = AnswerCache(LRUCache(10, 60), shared, ttl=60)
+        asyncio.run(writer.set("k", {"answer": "42"}))
+        assert json.loads(shared.values["k"]) == {"answer": "42"}
+        assert asyncio.run(reader.get("k")) == {"answer": "42"}
+        assert reader.local.get("k") == {"answer": "42"}
+
+
+class TestSemanticCache:
+    def test_paraphrase_matches_within_scope(self):
+        semantic = SemanticCache(threshold=0.8, max_entries=10, max_scopes=10, ttl=60)
+        embed = HashingEmbedder().embed
+        semantic.set("kit-v1", embed(["how do bees communicate"])[0], {"answer": "They dance"})
+
+        assert semantic.get("kit-v1", embed(["in what way do bees communicate"])[0]) == {"answer": "They dance"}
+        assert semantic.get("kit-v1", embed(["what is the shipping policy"])[0]) is None
+        assert semantic.get("kit-v2", embed(["how do bees communicate"])[0]) is None
+
+    def test_keeps_most_recent_entries(self):
+        semantic = SemanticCache(threshold=0.99, max_entries=2, max_scopes=10, ttl=60)
+        embed = HashingEmbedder().embed
+        for question in ["alpha question", "beta question", "gamma question"]:
+            semantic.set("scope", embed([question])[0], {"answer": question})
+        assert semantic.get("scope", embed(["alpha question"])[0]) is None
+        assert semantic.get("scope", embed(["gamma question"])[0]) == {"answer": "gamma question"}
+
+
+    def test_total_embeddings_are_bounded(self):
+        semantic = SemanticCache(threshold=0.99, max_entries=3, max_scopes=10, ttl=60, max_total=5)
+        embed = HashingEmbedder().embed
+        for scope in ["old", "used", "new"]:
+            for question in ["alpha question", "beta question"]:
+                semantic.set(scope, embed([question])[0], {"answer": scope})
+        assert len(semantic) == 4  # The least recently used scope was dropped whole
+        assert semantic.get("old", embed(["alpha question"])[0]) is None
+
+        semantic.get("used", embed(["alpha question"])[0])
+        semantic.set("newest", embed(["gamma question"])[0], {"answer": "newest"})
+        assert len(semantic) == 5
+        semantic.set("newest", embed(["delta question"])[0], {"answer": "newest"})
+        assert len(semantic) == 4
+        assert semantic.get("used", embed(["alpha question"])[0]) == {"answer": "used"}
+        assert semantic.get("new", embed(["alpha question"])[0]) is None
+
+
+class TestAnswerCacheEndpoint:
+    def setup_kit(self, client, monkeypatch):
+        self.calls = 0
+
+        def handler(request):
+            self.calls += 1
+            return httpx.Response(200, json={"choices": [{"message": {"content": f"Answer {self.calls}"}}]})
+
+        monkeypatch.setattr(
+            providers, "openai_provider",
+            OpenAIProvider("sk-test", "http://llm.local/v1", 4, transport=httpx.MockTransport(handler))
+        )
+        self.workspace_id = client.post("/workspaces/", json={"name": "Cache WS"}).json()["id"]
+        self.asset_id = client.post(
+            f"/assets/{self.workspace_id}", json={"name": "Doc", "content": "Bees communicate by dancing."}
+        ).json()["id"]
+        return client.post(
+            f"/kits/{self.workspace_id}", json={"name": "Bees", "asset_ids": [self.asset_id]}
+        ).json()["id"]
+
+    def ask(self, client, kit_id, query="How do bees communicate?"):
+        return client.post("/rag/query", json={"query": query, "kit_id": kit_id, "model": "gpt-3.5-turbo"}).json()
+
+    def test_repeated_query_is_served_from_cache(self, client, monkeypatch):
+        kit_id = self.setup_kit(client, monkeypatch)
+        first = self.ask(client, kit_id)
+        second = self.ask(client, kit_id, "how do bees communicate")
+        assert (first["cache"], second["cache"]) == ("miss", "hit")
+        assert second["answer"] == first["answer"] == "Answer 1"
+        assert second["citations"] == first["citations"]
+        assert self.calls == 1
+
+    def test_kit_change_invalidates(self, client, monkeypatch):
+        kit_id = self.setup_kit(client, monkeypatch)
+        self.ask(client, kit_id)
+        other = client.post(
+            f"/assets/{self.workspace_id}", json={"name": "More", "content": "Bees also use pheromones."}
+        ).json()["id"]
+        client.put(f"/kits/kit/{kit_id}", json={"asset_ids": [self.asset_id, other]})
+
+        response = self.ask(client, kit_id)
+        assert response["cache"] == "miss"
+        assert response["answer"] == "Answer 2"
+
+    def test_streaming_shares_the_cache(self, client, monkeypatch):
+        kit_id = self.setup_kit(client, monkeypatch)
+        self.ask(client, kit_id)
+        body = client.post(
+            "/rag/query/stream",
+            json={"query": "How do bees communicate?", "kit_id": kit_id, "model": "gpt-3.5-turbo"}
+        ).text
+        assert '"cache": "hit"' in body
+        assert 'data: {"answer": "Answer 1"}' in body
+        assert self.calls == 1
+
+    def test_quick_and_unconfigured_answers_bypass_cache(self, client, monkeypatch):
+        kit_id = self.setup_kit(client, monkeypatch)
+        assert self.ask(client, kit_id, "Count Assets")["cache"] is None
+        monkeypatch.setattr(providers, "openai_provider", OpenAIProvider(None, "http://llm.local/v1", 4))
+        assert self.ask(client, kit_id)["cache"] is None
+
+    def test_paraphrase_is_served_from_semantic_cache(self, client, monkeypatch):
+        monkeypatch.setattr(answer_cache.semantic, "threshold", 0.8)
+        kit_id = self.setup_kit(client, monkeypatch)
+        self.ask(client, kit_id)
+        response = self.ask(client, kit_id, "In what way do bees communicate?")
+        assert response["cache"] == "semantic"
+        assert response["query"] == "In what way do bees communicate?"
+        assert response["answer"] == "Answer 1"
+        assert self.calls == 1
+
+    def test_bypass_refreshes_answer(self, client, monkeypatch):
+        kit_id = self.setup_kit(client, monkeypatch)
+        self.ask(client, kit_id)
+        response = client.post(
+            "/rag/query",
+            json={"query": "How do bees communicate?", "kit_id": kit_id, "model": "gpt-3.5-turbo", "bypass_cache": True}
+        ).json()
+        assert (response["cache"], response["answer"]) == ("bypass", "Answer 2")
+        assert self.ask(client, kit_id)["answer"] == "Answer 2"
+
+    def test_stats(self, client, monkeypatch):
+        answer_cache.stats.reset()
+        kit_id = self.setup_kit(client, monkeypatch)
+        self.ask(client, kit_id)
+        self.ask(client, kit_id)
+        self.ask(client, kit_id)
+        stats = client.get("/rag/cache/stats").json()
+        assert (stats["hits"], stats["misses"], stats["semantic_hits"]) == (2, 1, 0)
+        assert stats["hit_rate"] == 2 / 3
+        assert stats["entries"] >= 1
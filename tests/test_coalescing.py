@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from app.models import Kit
+from app.routes import rag as rag_routes
+from app.schemas import RagQueryRequest
+from app.services.coalescing import SingleFlight
+from app.services.rag import RAGResult, RAGService
+
+
+class TestSingleFlight:
+    def test_concurrent_calls_share_one_execution(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return "answer"
+
+        async def run():
+            return await asyncio.gather(*(flights.do("key", work) for _ in range(10)))
+
+        results = asyncio.run(run())
+        assert len(calls) == 1
+        assert [result for result, _ in results] == ["answer"] * 10
+        assert sum(shared for _, shared in results) == 9
+        assert len(flights) == 0
+
+    def test_distinct_keys_and_later_calls_run_separately(self):
+        flights = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0)
+            return len(calls)
+
+        async def run():
+            first = await asyncio.gather(flights.do("a", work), flights.do("b", work))
+            later = await flights.do("a", work)
+            return first, later
+
+        first, later = asyncio.run(run())
+        assert len(calls) == 3
+        assert later == (3, False)
+
+    def test_errors_reach_every_caller(self):
+        flights = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise RuntimeError("provider down")
+
+        async def run():
+            return await asyncio.gather(*(flights.do("key", fail) for _ in range(3)), return_exceptions=True)
+
+        errors = asyncio.run(run())
+        assert all(isinstance(error, RuntimeError) for error in errors)
+        assert len(flights) == 0
+
+    def test_caller_cancellation_does_not_cancel_others(self):
+        flights = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.02)
+            return "done"
+
+        async def run():
+            leader = asyncio.ensure_future(flights.do("key", work))
+            await asyncio.sleep(0)
+            follower = asyncio.ensure_future(flights.do("key", work))
+            await asyncio.sleep(0)
+            leader.cancel()
+            return await follower
+
+        assert asyncio.run(run()) == ("done", True)
+
+
+class TestCoalescedQueries:
+    def test_identical_concurrent_queries_answered_once(self, client, db_session, monkeypatch):
+        workspace_id = client.post("/workspaces/", json={"name": "Burst WS"}).json()["id"]
+        asset_id = client.post(f"/assets/{workspace_id}", json={"name": "Doc", "content": "Tides follow the moon."}).json()["id"]
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Tides", "asset_ids": [asset_id]}).json()["id"]
+        db_session.get(Kit, kit_id).assets  # Load up front: the burst shares one session across threads
+        calls = []
+
+        async def answer(db, query, assets, use_llm=True, model="gpt-3.5-turbo"):
+            calls.append(query)
+            await asyncio.sleep(0.05)
+            return RAGResult("The moon", [asset_id], [], 10)
+
+        monkeypatch.setattr(RAGService, "answer_query_async", answer)
+        request = RagQueryRequest(query="What drives the tides?", kit_id=kit_id, use_llm=False)
+
+        async def burst():
+            return await asyncio.gather(*(
+                rag_routes._answer(db_session, request, rag_routes._Scope("kit", kit_id, 1), "gpt-3.5-turbo") for _ in range(8)
+            ))
+
+        responses = asyncio.run(burst())
+        assert len(calls) == 1
+        assert {response.answer for response in responses} == {"The moon"}
+        assert sorted(response.cache for response in responses) == ["coalesced"] * 7 + ["miss"]
+        assert client.get("/rag/cache/stats").json()["coalesced"] >= 7
+
+    def test_shared_work_uses_its_own_session(self, client, db_session, monkeypatch):
+        workspace_id = client.post("/workspaces/", json={"name": "Session WS"}).json()["id"]
+        asset_id = client.post(f"/assets/{workspace_id}", json={"name": "Doc", "content": "Tides follow the moon."}).json()["id"]
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Tides", "asset_ids": [asset_id]}).json()["id"]
+        sessions = []
+
+        async def answer(db, query, assets, use_llm=True, model="gpt-3.5-turbo"):
+            sessions.append(db)
+            assert all(asset in db for asset in assets)
+            return RAGResult("The moon", [asset_id], [], 10)
+
+        monkeypatch.setattr(RAGService, "answer_query_async", answer)
+        request = RagQueryRequest(query="What drives the tides?", kit_id=kit_id, use_llm=False)
+        response = asyncio.run(rag_routes._answer(db_session, request, rag_routes._Scope("kit", kit_id, 1), "gpt-3.5-turbo"))
+        assert response.answer == "The moon"
+        assert sessions and sessions[0] is not db_session
+        assert list(sessions[0]) == []  # Closed once the work is done
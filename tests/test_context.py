@@ -0,0 +1,67 @@
+import pytest
+
+from app.services import context
+from app.services.context import context_budget, pack_context, tokenizer
+from app.services.rag import Citation
+
+
+def passage(text, chunk_id="c", start=0):
+    return Citation("asset", chunk_id, start, start + len(text), text, 1.0)
+
+
+def words(n, prefix="word"):
+    return " ".join(f"{prefix}{i}" for i in range(n))
+
+
+class TestContextPacking:
+    def test_packs_in_rank_order_within_budget(self):
+        passages = [passage(words(40, "a"), "1"), passage(words(40, "b"), "2"), passage(words(40, "c"), "3")]
+        packed = pack_context(passages, budget=100)
+        assert [p.chunk_id for p in packed.passages] == ["1", "2"]
+        assert packed.tokens_used <= 100
+        assert packed.tokens_used == tokenizer.count(packed.text)
+
+    def test_truncates_last_passage_to_fit(self):
+        packed = pack_context([passage(words(80, "a"), "1", start=10)], budget=50)
+        cut = packed.passages[0]
+        assert packed.tokens_used == 50
+        assert cut.text == words(50, "a")
+        assert cut.end == cut.start + len(cut.text)
+
+    def test_skips_when_too_little_budget_remains(self):
+        passages = [passage(words(90, "a"), "1"), passage(words(40, "b"), "2")]
+        packed = pack_context(passages, budget=100)
+        assert [p.chunk_id for p in packed.passages] == ["1"]
+
+    def test_skips_near_duplicates(self):
+        text = "The quarterly report shows revenue grew by ten percent in the northern region."
+        passages = [passage(text, "1"), passage(text + " Thanks.", "2"), passage("Unrelated staffing note.", "3")]
+        packed = pack_context(passages, budget=1000)
+        assert [p.chunk_id for p in packed.passages] == ["1", "3"]
+
+    def test_budget_by_model(self, monkeypatch):
+        assert context_budget("gpt-4o-mini") == context.MODEL_CONTEXT_BUDGETS["gpt-4o"]
+        assert context_budget("gpt-4") == context.MODEL_CONTEXT_BUDGETS["gpt-4"]
+        assert context_budget("gemini-pro") == context.MODEL_CONTEXT_BUDGETS["gemini"]
+        assert context_budget("unknown-model") == context.DEFAULT_CONTEXT_BUDGET
+
+
+class TestContextBudgetOnQuery:
+    def test_response_reports_tokens_used_within_budget(self, client, monkeypatch):
+        monkeypatch.setitem(context.MODEL_CONTEXT_BUDGETS, "gpt-3.5-turbo", 120)
+        workspace_id = client.post("/workspaces/", json={"name": "Budget WS"}).json()["id"]
+        asset_ids = [
+            client.post(
+                f"/assets/{workspace_id}",
+                json={"name": f"Doc {i}", "content": f"Topic{i} budget planning notes. " + words(150, f"t{i}x")}
+            ).json()["id"]
+            for i in range(4)
+        ]
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Budget Kit", "asset_ids": asset_ids}).json()["id"]
+
+        data = client.post(
+            "/rag/query",
+            json={"query": "budget planning", "kit_id": kit_id, "use_llm": False, "model": "gpt-3.5-turbo"}
+        ).json()
+        assert 0 < data["tokens_used"] <= 120
+        assert sum(tokenizer.count(c["text"]) for c in data["citations"]) <= 120
@@ -0,0 +1,184 @@
+import base64
+import io
+import time
+import zipfile
+import zlib
+
+import pytest
+
+from app.models import Asset
+from app.services import extraction
+from app.services.extraction import DOCX, PPTX, XLSX, extract_text, extraction_type
+
+
+def _zip(files):
+    buf = io.BytesIO()
+    with zipfile.ZipFile(buf, "w") as archive:
+        for name, data in files.items():
+            archive.writestr(name, data)
+    return buf.getvalue()
+
+
+def make_docx(paragraphs):
+    ns = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+    body = "".join(f"<w:p><w:r><w:t>{p[:5]}</w:t></w:r><w:r><w:t>{p[5:]}</w:t></w:r></w:p>" for p in paragraphs)
+    return _zip({"word/document.xml": f"<w:document {ns}><w:body>{body}</w:body></w:document>"})
+
+
+def make_xlsx(rows):
+    ns = 'xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"'
+    strings = sorted({cell for row in rows for cell in row if isinstance(cell, str)})
+    shared = "".join(f"<si><t>{s}</t></si>" for s in strings)
+    sheet_rows = ""
+    for row in rows:
+        cells = "".join(
+            f'<c t="s"><v>{strings.index(cell)}</v></c>' if isinstance(cell, str) else f"<c><v>{cell}</v></c>"
+            for cell in row
+        )
+        sheet_rows += f"<row>{cells}</row>"
+    return _zip({
+        "xl/sharedStrings.xml": f"<sst {ns}>{shared}</sst>",
+        "xl/worksheets/sheet1.xml": f"<worksheet {ns}><sheetData>{sheet_rows}</sheetData></worksheet>",
+    })
+
+
+def make_pptx(slides):
+    ns = 'xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main"'
+    return _zip({
+        f"ppt/slides/slide{i}.xml": f"<p:sld {ns} xmlns:p=\"p\"><a:p><a:r><a:t>{text}</a:t></a:r></a:p></p:sld>"
+        for i, text in enumerate(slides, start=1)
+    })
+
+
+def make_pdf(lines):
+    ops = b"BT /F1 12 Tf 72 720 Td " + b" T* ".join(b"(" + line.encode() + b") Tj" for line in lines) + b" ET"
+    stream = zlib.compress(ops)
+    return (
+        b"%PDF-1.4\n1 0 obj\n<< /Length " + str(len(stream)).encode() + b" /Filter /FlateDecode >>\nstream\n"
+        + stream + b"\nendstream\nendobj\n%%EOF\n"
+    )
+
+
+class TestExtraction:
+    def test_docx(self):
+        text = extract_text(io.BytesIO(make_docx(["Quarterly revenue grew", "Costs were flat"])), DOCX)
+        assert text == "Quarterly revenue grew\nCosts were flat"
+
+    def test_xlsx_rows_in_order(self):
+        data = make_xlsx([["Region", "Sales"], ["North", 120], ["South", 95]])
+        assert extract_text(io.BytesIO(data), XLSX) == "Region\tSales\nNorth\t120\nSouth\t95"
+
+    def test_pptx_slides_in_numeric_order(self):
+        data = make_pptx([f"Slide {i}" for i in range(1, 12)])
+        lines = extract_text(io.BytesIO(data), PPTX).split("\n")
+        assert lines[0] == "Slide 1"
+        assert lines[-1] == "Slide 11"
+
+    def test_csv(self):
+        data = b'name,notes\nalpha,"first, quoted"\n\n'
+        assert extract_text(io.BytesIO(data), "text/csv") == "name\tnotes\nalpha\tfirst, quoted"
+
+    def test_pdf_fallback(self, monkeypatch):
+        monkeypatch.setattr(extraction, "pypdf", None)
+        data = make_pdf(["Invoice number 42", r"Total \(net\): 100"])
+        assert extract_text(io.BytesIO(data), "application/pdf") == "Invoice number 42\nTotal (net): 100"
+
+    def test_pdf_fallback_reads_in_blocks(self, monkeypatch):
+        monkeypatch.setattr(extraction, "pypdf", None)
+        monkeypatch.setattr(extraction, "_PDF_BLOCK", 7)
+        image = b"<< /Subtype /Image /Filter /DCTDecode >>\nstream\n" + b"\xff" * 100 + b"\nendstream\n"
+        data = image + make_pdf(["Split across blocks"])
+        assert extract_text(io.BytesIO(data), "application/pdf") == "Split across blocks"
+
+    def test_pdf_fallback_scans_linearly(self, monkeypatch):
+        monkeypatch.setattr(extraction, "pypdf", None)
+        objects = b"".join(b"%d 0 obj\n<< /Type /Annot /Rect [0 0 1 1] >>\nendobj\n" % i for i in range(20000))
+        unterminated = b"<< /Length 1 >>\nstream\nBT " + b"[(" * 50000 + b"\nendstream\n"
+        data = objects + unterminated + make_pdf(["After many objects"])
+        started = time.perf_counter()
+        assert extract_text(io.BytesIO(data), "application/pdf") == "After many objects"
+        assert time.perf_counter() - started < 5
+
+    @pytest.mark.parametrize("mime_type", [DOCX, XLSX, PPTX, "application/pdf"])
+    def test_malformed_files_yield_nothing(self, monkeypatch, mime_type):
+        monkeypatch.setattr(extraction, "pypdf", None)
+        assert extract_text(io.BytesIO(b"not a zip"), mime_type) == ""
+        assert extract_text(io.BytesIO(_zip({"word/document.xml": "<w:document"})), mime_type) == ""
+
+    def test_generic_mime_type_uses_extension(self):
+        assert extraction_type("application/octet-stream", "report.DOCX") == DOCX
+        assert extraction_type("application/zip", "deck.pptx") == PPTX
+        assert extraction_type("text/markdown") == "text/plain"
+
+    def test_unsupported_formats_yield_nothing(self):
+        assert extract_text(io.BytesIO(b"\x89PNG\r\n"), "image/png") == ""
+
+    def test_output_is_capped(self, monkeypatch):
+        monkeypatch.setattr(extraction, "MAX_EXTRACTED_CHARS", 10)
+        assert extract_text(io.BytesIO(b"x" * 100), "text/plain") == "x" * 10
+
+
+class TestExtractionOnUpload:
+    @pytest.fixture
+    def workspace_id(self, client):
+        return client.post("/workspaces/", json={"name": "Extraction WS"}).json()["id"]
+
+    def test_uploaded_docx_text_is_extracted_and_retrievable(self, client, workspace_id):
+        data = make_docx(["The onboarding checklist requires a signed laptop agreement."])
+        asset_id = client.post(
+            f"/assets/{workspace_id}/upload",
+            files={"file": ("handbook.docx", data, DOCX)}
+        ).json()["id"]
+
+        text = client.get(f"/assets/asset/{asset_id}/text")
+        assert text.status_code == 200
+        assert text.text == "The onboarding checklist requires a signed laptop agreement."
+
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "HR", "asset_ids": [asset_id]}).json()["id"]
+        response = client.post(
+            "/rag/query",
+            json={"query": "laptop agreement", "kit_id": kit_id, "use_llm": False}
+        ).json()
+        assert "signed laptop agreement" in response["citations"][0]["text"]
+        assert "UEsDB" not in response["answer"]  # Not the base64 of the zip
+
+    def test_malformed_upload_does_not_break_kit_queries(self, client, workspace_id):
+        broken = client.post(
+            f"/assets/{workspace_id}/upload", files={"file": ("broken.docx", b"not a zip", DOCX)}
+        ).json()["id"]
+        good = client.post(
+            f"/assets/{workspace_id}", json={"name": "Policy", "content": "Expense reports are due monthly."}
+        ).json()["id"]
+        assert client.get(f"/assets/asset/{broken}/index").json()["status"] == "done"
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Mixed", "asset_ids": [broken, good]}).json()["id"]
+
+        response = client.post("/rag/query", json={"query": "expense reports", "kit_id": kit_id, "use_llm": False})
+        assert response.status_code == 200
+        assert response.json()["citations"][0]["asset_id"] == good
+
+    def test_legacy_base64_upload_is_decoded(self, client, db_session, workspace_id):
+        legacy = Asset(
+            workspace_id=workspace_id,
+            name="legacy.xlsx",
+            asset_type="document",
+            mime_type=XLSX,
+            file_path="legacy.xlsx",
+            content=base64.b64encode(make_xlsx([["Budget", 500]])).decode()
+        )
+        db_session.add(legacy)
+        db_session.commit()
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Finance", "asset_ids": [legacy.id]}).json()["id"]
+
+        response = client.post(
+            "/rag/query",
+            json={"query": "budget", "kit_id": kit_id, "use_llm": False}
+        ).json()
+        assert response["citations"][0]["text"] == "Budget\t500"
+        db_session.expire_all()  # Indexed by the query's own session
+        assert client.get(f"/assets/asset/{legacy.id}/text").text == "Budget\t500"
+
+    def test_inline_asset_text(self, client, workspace_id):
+        asset_id = client.post(
+            f"/assets/{workspace_id}", json={"name": "Note", "content": "Plain note", "asset_type": "document"}
+        ).json()["id"]
+        assert client.get(f"/assets/asset/{asset_id}/text").text == "Plain note"
@@ -434,3 +434,121 @@ class TestFileIntegration:
         assert list_response.status_code == 200
         assets = list_response.json()
         assert len(assets) == 4
+
+
+class TestStreamingUpload:
+    """Test chunked upload ingest and content sniffing"""
+
+    def test_upload_spanning_multiple_chunks(self, client, workspace, db_session):
+        """Test a file larger than the upload chunk size round-trips intact"""
+        import hashlib
+        from app.routes.assets import UPLOAD_CHUNK_SIZE
+        workspace_id = workspace["id"]
+        data = bytes(range(256)) * (UPLOAD_CHUNK_SIZE * 2 // 256 + 3)
+
+        response = client.post(
+            f"/assets/{workspace_id}/upload",
+            files={"file": ("chunks.bin", io.BytesIO(data), "application/octet-stream")},
+        )
+        assert response.status_code == 201
+        body = response.json()
+        assert body["file_size"] == len(data)
+        assert body["blob_digest"] == hashlib.sha256(data).hexdigest()
+
+        download = client.get(f"/assets/asset/{body['id']}/download")
+        assert download.content == data
+
+    def test_generic_mime_type_is_sniffed(self, client, workspace, db_session):
+        """Test uploads sent as octet-stream are classified from their leading bytes"""
+        workspace_id = workspace["id"]
+        response = client.post(
+            f"/assets/{workspace_id}/upload",
+            files={"file": ("unknown", io.BytesIO(b"%PDF-1.7\n%sniff me"), "application/octet-stream")},
+        )
+        assert response.status_code == 201
+        data = response.json()
+        assert data["mime_type"] == "application/pdf"
+        assert data["asset_type"] == "document"
+
+    def test_declared_mime_type_is_kept(self, client, workspace, db_session):
+        """Test a specific client mime type is never overridden by sniffing"""
+        workspace_id = workspace["id"]
+        response = client.post(
+            f"/assets/{workspace_id}/upload",
+            files={"file": ("data.json", io.BytesIO(b'{"a": 1}'), "application/json")},
+        )
+        assert response.json()["mime_type"] == "application/json"
+
+
+class TestRangeDownloads:
+    """Test byte-range and conditional downloads"""
+
+    @pytest.fixture
+    def uploaded(self, client, workspace, db_session):
+        data = bytes(range(256)) * 40
+        response = client.post(
+            f"/assets/{workspace['id']}/upload",
+            files={"file": ("range.bin", io.BytesIO(data), "application/octet-stream")},
+        )
+        return response.json()["id"], data
+
+    def test_full_download_advertises_ranges(self, client, uploaded):
+        asset_id, data = uploaded
+        response = client.get(f"/assets/asset/{asset_id}/download")
+        assert response.status_code == 200
+        assert response.headers["accept-ranges"] == "bytes"
+        assert response.headers["content-length"] == str(len(data))
+        assert response.headers["etag"]
+        assert response.headers["last-modified"]
+
+    def test_single_range(self, client, uploaded):
+        asset_id, data = uploaded
+        response = client.get(f"/assets/asset/{asset_id}/download", headers={"Range": "bytes=100-199"})
+        assert response.status_code == 206
+        assert response.content == data[100:200]
+        assert response.headers["content-range"] == f"bytes 100-199/{len(data)}"
+
+    def test_open_ended_and_suffix_ranges(self, client, uploaded):
+        asset_id, data = uploaded
+        response = client.get(f"/assets/asset/{asset_id}/download", headers={"Range": "bytes=10000-"})
+        assert response.content == data[10000:]
+        response = client.get(f"/assets/asset/{asset_id}/download", headers={"Range": "bytes=-16"})
+        assert response.content == data[-16:]
+
+    def test_multiple_ranges(self, client, uploaded):
+        asset_id, data = uploaded
+        response = client.get(f"/assets/asset/{asset_id}/download", headers={"Range": "bytes=0-9,20-29"})
+        assert response.status_code == 206
+        assert response.headers["content-type"].startswith("multipart/byteranges")
+        assert response.headers["content-length"] == str(len(response.content))
+        assert data[0:10] in response.content
+        assert data[20:30] in response.content
+        assert f"bytes 20-29/{len(data)}".encode() in response.content
+
+    def test_unsatisfiable_range(self, client, uploaded):
+        asset_id, data = uploaded
+        response = client.get(f"/assets/asset/{asset_id}/download", headers={"Range": f"bytes={len(data)}-"})
+        assert response.status_code == 416
+        assert response.headers["content-range"] == f"bytes */{len(data)}"
+
+    def test_if_none_match_returns_304(self, client, uploaded):
+        asset_id, _ = uploaded
+        etag = client.get(f"/assets/asset/{asset_id}/download").headers["etag"]
+        response = client.get(f"/assets/asset/{asset_id}/download", headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.content == b""
+
+    def test_if_modified_since_returns_304(self, client, uploaded):
+        asset_id, _ = uploaded
+        last_modified = client.get(f"/assets/asset/{asset_id}/download").headers["last-modified"]
+        response = client.get(f"/assets/asset/{asset_id}/download", headers={"If-Modified-Since": last_modified})
+        assert response.status_code == 304
+
+    def test_stale_if_range_serves_full_body(self, client, uploaded):
+        asset_id, data = uploaded
+        response = client.get(
+            f"/assets/asset/{asset_id}/download",
+            headers={"Range": "bytes=0-9", "If-Range": '"stale-etag"'},
+        )
+        assert response.status_code == 200
+        assert response.content == data
@@ -0,0 +1,99 @@
+import time
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+from app.models import Asset, Chunk, IndexJob, Workspace
+from app.services import jobs
+
+
+@pytest.fixture
+def asset_id(client, db_session):
+    workspace_id = client.post("/workspaces/", json={"name": "Jobs WS"}).json()["id"]
+    return client.post(
+        f"/assets/{workspace_id}",
+        json={"name": "Notes", "content": "Compost needs nitrogen and carbon.", "asset_type": "document"}
+    ).json()["id"]
+
+
+class TestIndexJobs:
+    def test_create_runs_index_job(self, client, db_session, asset_id):
+        response = client.get(f"/assets/asset/{asset_id}/index")
+        assert response.status_code == 200
+        data = response.json()
+        assert data["status"] == "done"
+        assert data["attempts"] == 1
+        assert data["indexed_at"] is not None
+        assert db_session.query(Chunk).filter(Chunk.asset_id == asset_id).count() == 1
+
+    def test_status_unknown_asset(self, client):
+        assert client.get("/assets/asset/nonexistent-id/index").status_code == 404
+
+    def test_failures_retry_then_fail(self, client, db_session, asset_id, monkeypatch):
+        def broken(**payload):
+            raise RuntimeError("extractor crashed")
+
+        monkeypatch.setattr(jobs, "prepare_asset", broken)
+        job = jobs.enqueue_index_jobs(db_session, [asset_id])[0]
+        job_id = job.id
+
+        data = client.get(f"/assets/asset/{asset_id}/index").json()
+        assert data["status"] == "queued"
+        assert data["attempts"] == 1
+        assert "extractor crashed" in data["error"]
+
+        # Make the retries due and run them until attempts are exhausted
+        for _ in range(jobs.INDEX_MAX_ATTEMPTS - 1):
+            db_session.query(IndexJob).filter(IndexJob.id == job_id).update({IndexJob.run_after: IndexJob.created_at})
+            db_session.commit()
+            assert jobs._claim(db_session, job_id)
+            jobs._run_inline(db_session, job_id, asset_id)
+
+        data = client.get(f"/assets/asset/{asset_id}/index").json()
+        assert data["status"] == "failed"
+        assert data["attempts"] == jobs.INDEX_MAX_ATTEMPTS
+
+    def test_job_for_deleted_asset_is_cancelled(self, client, db_session, asset_id):
+        client.delete(f"/assets/asset/{asset_id}")
+        job = jobs.enqueue_index_jobs(db_session, [asset_id])[0]
+        db_session.refresh(job)
+        assert job.status == "cancelled"
+
+
+class TestIndexWorkerPool:
+    def test_pool_processes_queued_jobs(self, tmp_path):
+        engine = create_engine(f"sqlite:///{tmp_path / 'jobs.db'}", connect_args={"check_same_thread": False})
+        Base.metadata.create_all(bind=engine)
+        Session = sessionmaker(bind=engine)
+
+        db = Session()
+        workspace = Workspace(name="Pool WS")
+        db.add(workspace)
+        db.flush()
+        asset = Asset(workspace_id=workspace.id, name="Doc", asset_type="document", content="Bees pollinate flowers.")
+        db.add(asset)
+        db.flush()
+        job = IndexJob(asset_id=asset.id)
+        db.add(job)
+        db.commit()
+        job_id, asset_id = job.id, asset.id
+
+        pool = jobs.IndexWorkerPool(1, session_factory=Session)
+        pool.start()
+        try:
+            deadline = time.monotonic() + 60
+            while time.monotonic() < deadline:
+                db.expire_all()
+                if db.get(IndexJob, job_id).status not in ("queued", "running"):
+                    break
+                time.sleep(0.1)
+        finally:
+            pool.stop()
+
+        assert db.get(IndexJob, job_id).status == "done"
+        assert db.get(Asset, asset_id).indexed_at is not None
+        assert db.query(Chunk).filter(Chunk.asset_id == asset_id).count() == 1
+        db.close()
+        engine.dispose()
@@ -0,0 +1,365 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.services import providers
+from benchmarks.mock_llm import MockConfig, create_app
+from app.services.providers import AsyncLLMService, CircuitBreaker, GeminiProvider, OpenAIProvider, ProviderError
+
+
+def openai_reply(content):
+    return {"choices": [{"message": {"role": "assistant", "content": content}}]}
+
+
+class TestAsyncProviders:
+    def test_openai_request_and_response(self):
+        seen = {}
+
+        def handler(request):
+            seen["url"] = str(request.url)
+            seen["auth"] = request.headers["authorization"]
+            seen["body"] = json.loads(request.content)
+            return httpx.Response(200, json=openai_reply("Paris"))
+
+        provider = OpenAIProvider("sk-test", "http://llm.local/v1/", 4, transport=httpx.MockTransport(handler))
+        answer = asyncio.run(provider.complete("Capital of France?", "France's capital is Paris.", "gpt-4o-mini"))
+
+        assert answer == "Paris"
+        assert seen["url"] == "http://llm.local/v1/chat/completions"
+        assert seen["auth"] == "Bearer sk-test"
+        assert seen["body"]["model"] == "gpt-4o-mini"
+        assert "France's capital is Paris." in seen["body"]["messages"][1]["content"]
+
+    def test_gemini_request_and_response(self):
+        def handler(request):
+            assert request.url.path == "/v1beta/models/gemini-pro:generateContent"
+            assert request.headers["x-goog-api-key"] == "g-key"
+            return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": "Berlin"}]}}]})
+
+        provider = GeminiProvider("g-key", "http://gemini.local/v1beta", 4, transport=httpx.MockTransport(handler))
+        assert asyncio.run(provider.complete("Capital of Germany?", "", "gemini-pro")) == "Berlin"
+
+    def test_error_status_raises(self):
+        transport = httpx.MockTransport(lambda request: httpx.Response(429, text="rate limited"))
+        provider = OpenAIProvider("sk-test", "http://llm.local/v1", 4, transport=transport)
+        with pytest.raises(ProviderError, match="429"):
+            asyncio.run(provider.complete("q", "c", "gpt-3.5-turbo"))
+
+    def test_concurrency_is_bounded(self):
+        in_flight = 0
+        peak = 0
+
+        async def handler(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return httpx.Response(200, json=openai_reply("ok"))
+
+        provider = OpenAIProvider("sk-test", "http://llm.local/v1", 3, transport=httpx.MockTransport(handler))
+
+        async def run():
+            answers = await asyncio.gather(*(provider.complete("q", "c", "gpt-3.5-turbo") for _ in range(20)))
+            await provider.aclose()
+            return answers
+
+        assert asyncio.run(run()) == ["ok"] * 20
+        assert peak == 3
+
+
+def sse_body(events):
+    return "".join(f"data: {json.dumps(event)}\n\n" for event in events) + "data: [DONE]\n\n"
+
+
+class TestStreamingProviders:
+    def test_openai_stream(self):
+        seen = {}
+
+        def handler(request):
+            seen["body"] = json.loads(request.content)
+            chunks = [{"choices": [{"delta": {"role": "assistant"}}]}] + [
+                {"choices": [{"delta": {"content": piece}}]} for piece in ["Pa", "ris", "."]
+            ]
+            return httpx.Response(200, text=sse_body(chunks), headers={"content-type": "text/event-stream"})
+
+        provider = OpenAIProvider("sk-test", "http://llm.local/v1", 4, transport=httpx.MockTransport(handler))
+
+        async def run():
+            return [piece async for piece in provider.stream("Capital of France?", "ctx", "gpt-4o-mini")]
+
+        assert asyncio.run(run()) == ["Pa", "ris", "."]
+        assert seen["body"]["stream"] is True
+
+    def test_gemini_stream(self):
+        def handler(request):
+            assert request.url.path == "/v1beta/models/gemini-pro:streamGenerateContent"
+            assert request.url.params["alt"] == "sse"
+            chunks = [{"candidates": [{"content": {"parts": [{"text": piece}]}}]} for piece in ["Ber", "lin"]]
+            return httpx.Response(200, text="".join(f"data: {json.dumps(c)}\r\n\r\n" for c in chunks))
+
+        provider = GeminiProvider("g-key", "http://gemini.local/v1beta", 4, transport=httpx.MockTransport(handler))
+
+        async def run():
+            return [piece async for piece in provider.stream("q", "ctx", "gemini-pro")]
+
+        assert asyncio.run(run()) == ["Ber", "lin"]
+
+    def test_stream_error_status_raises(self):
+        transport = httpx.MockTransport(lambda request: httpx.Response(500, text="boom"))
+        provider = OpenAIProvider("sk-test", "http://llm.local/v1", 4, transport=transport)
+
+        async def run():
+            return [piece async for piece in provider.stream("q", "c", "gpt-3.5-turbo")]
+
+        with pytest.raises(ProviderError, match="500: boom"):
+            asyncio.run(run())
+
+
+def gemini_reply(text):
+    return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+
+class TestResilience:
+    def install(self, monkeypatch, openai_handler, gemini_handler):
+        self.openai = OpenAIProvider("sk-test", "http://llm.local/v1", 4, transport=httpx.MockTransport(openai_handler))
+        self.gemini = GeminiProvider("g-key", "http://gemini.local/v1beta", 4, transport=httpx.MockTransport(gemini_handler))
+        monkeypatch.setattr(providers, "openai_provider", self.openai)
+        monkeypatch.setattr(providers, "gemini_provider", self.gemini)
+
+    def test_breaker_opens_and_probes_after_reset(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr(providers.time, "monotonic", lambda: now[0])
+        breaker = CircuitBreaker(failures=2, reset_seconds=10)
+        breaker.record_failure()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == "open" and not breaker.allow()
+        now[0] += 10
+        assert breaker.allow() and breaker.state == "half_open"
+        assert not breaker.allow()  # One probe at a time
+        breaker.record_failure()
+        assert breaker.state == "open"
+        now[0] += 10
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == "closed"
+
+    def test_probe_without_verdict_reopens(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr(providers.time, "monotonic", lambda: now[0])
+        self.install(
+            monkeypatch,
+            lambda request: httpx.Response(400, text="bad request"),
+            lambda request: httpx.Response(200, json=gemini_reply("from gemini"))
+        )
+        breaker = self.openai.breaker
+        for _ in range(breaker.failures):
+            breaker.record_failure()
+        now[0] += breaker.reset_seconds
+        assert asyncio.run(AsyncLLMService.query_with_context("q", "ctx", "gpt-4o")) == "from gemini"
+        assert breaker.state == "open" and not breaker.allow()
+        now[0] += breaker.reset_seconds
+        assert breaker.allow()
+
+    def test_lost_probe_claim_expires(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr(providers.time, "monotonic", lambda: now[0])
+        breaker = CircuitBreaker(failures=1, reset_seconds=10, probe_timeout_seconds=60)
+        breaker.record_failure()
+        now[0] += 10
+        assert breaker.allow() and not breaker.allow()
+        now[0] += 60
+        assert breaker.allow()
+
+    def test_cancelled_hedged_probe_reopens(self, monkeypatch):
+        monkeypatch.setattr(providers, "LLM_HEDGE_DELAY_SECONDS", 0.05)
+
+        async def slow_openai(request):
+            await asyncio.sleep(1)
+            return httpx.Response(200, json=openai_reply("from openai"))
+
+        self.install(monkeypatch, slow_openai, lambda request: httpx.Response(200, json=gemini_reply("from gemini")))
+        breaker = self.openai.breaker
+        breaker.reset_seconds = 0
+        for _ in range(breaker.failures):
+            breaker.record_failure()
+
+        assert asyncio.run(AsyncLLMService.query_with_context("q", "ctx", "gpt-4o")) == "from gemini"
+        assert breaker.state == "open"
+        assert breaker.allow()  # The next probe is let through
+
+    def test_fails_over_to_other_provider(self, monkeypatch):
+        seen = []
+
+        def gemini(request):
+            seen.append(request.url.path)
+            return httpx.Response(200, json=gemini_reply("from gemini"))
+
+        self.install(monkeypatch, lambda request: httpx.Response(503, text="overloaded"), gemini)
+        answer = asyncio.run(AsyncLLMService.query_with_context("q", "ctx", "gpt-4o"))
+        assert answer == "from gemini"
+        assert seen == [f"/v1beta/models/{providers.GEMINI_FAILOVER_MODEL}:generateContent"]
+
+    def test_open_circuit_skips_provider(self, monkeypatch):
+        calls = []
+
+        def openai(request):
+            calls.append(1)
+            return httpx.Response(200, json=openai_reply("from openai"))
+
+        self.install(monkeypatch, openai, lambda request: httpx.Response(200, json=gemini_reply("from gemini")))
+        for _ in range(self.openai.breaker.failures):
+            self.openai.breaker.record_failure()
+        assert asyncio.run(AsyncLLMService.query_with_context("q", "ctx", "gpt-4o")) == "from gemini"
+        assert calls == []
+        assert providers.provider_status()["openai"]["circuit"] == "open"
+
+    def test_client_errors_do_not_trip_breaker(self, monkeypatch):
+        self.install(
+            monkeypatch,
+            lambda request: httpx.Response(400, text="bad model"),
+            lambda request: httpx.Response(200, json=gemini_reply("from gemini"))
+        )
+        for _ in range(10):
+            asyncio.run(AsyncLLMService.query_with_context("q", "ctx", "gpt-4o"))
+        assert self.openai.breaker.state == "closed"
+
+    def test_slow_request_is_hedged(self, monkeypatch):
+        monkeypatch.setattr(providers, "LLM_HEDGE_DELAY_SECONDS", 0.05)
+
+        async def slow_openai(request):
+            await asyncio.sleep(1)
+            return httpx.Response(200, json=openai_reply("from openai"))
+
+        self.install(monkeypatch, slow_openai, lambda request: httpx.Response(200, json=gemini_reply("from gemini")))
+
+        async def run():
+            loop = asyncio.get_running_loop()
+            start = loop.time()
+            answer = await AsyncLLMService.query_with_context("q", "ctx", "gpt-4o")
+            return answer, loop.time() - start
+
+        answer, elapsed = asyncio.run(run())
+        assert answer == "from gemini"
+        assert elapsed < 0.5
+
+    def test_hedge_delay_follows_p95(self):
+        provider = OpenAIProvider("sk-test", "http://llm.local/v1", 4)
+        assert provider.hedge_delay() == providers.LLM_HEDGE_DELAY_SECONDS
+        for i in range(100):
+            provider.latency.record((i + 1) / 100)
+        assert provider.hedge_delay() == pytest.approx(0.96)
+
+    def test_stream_fails_over_before_first_token(self, monkeypatch):
+        chunks = [gemini_reply("Ber"), gemini_reply("lin")]
+        self.install(
+            monkeypatch,
+            lambda request: httpx.Response(502, text="bad gateway"),
+            lambda request: httpx.Response(200, text="".join(f"data: {json.dumps(c)}\n\n" for c in chunks))
+        )
+
+        async def run():
+            return [piece async for piece in AsyncLLMService.stream_with_context("q", "ctx", "gpt-4o")]
+
+        assert asyncio.run(run()) == ["Ber", "lin"]
+
+
+class TestMockLLMServer:
+    def provider(self, **config):
+        app = create_app(MockConfig(latency_ms=0, tokens_per_second=0, seed=1, **config))
+        return OpenAIProvider("mock", "http://mock/v1", 4, transport=httpx.ASGITransport(app=app))
+
+    def test_completion(self):
+        answer = asyncio.run(self.provider(output_tokens=5).complete("What is BM25?", "ctx", "gpt-3.5-turbo"))
+        assert len(answer.split()) == 5
+
+    def test_stream(self):
+        provider = self.provider(output_tokens=4)
+
+        async def run():
+            return [piece async for piece in provider.stream("q", "ctx", "gpt-3.5-turbo")]
+
+        pieces = asyncio.run(run())
+        assert len(pieces) == 4
+        assert pieces[1].startswith(" ")
+
+    def test_error_rate(self):
+        with pytest.raises(ProviderError, match="429|503"):
+            asyncio.run(self.provider(error_rate=1.0).complete("q", "ctx", "gpt-3.5-turbo"))
+
+    def test_latency_distribution(self):
+        import random
+        config, rng = MockConfig(latency_ms=100, p99_ms=400), random.Random(7)
+        delays = sorted(config.first_token_delay(rng) for _ in range(5000))
+        assert delays[2500] == pytest.approx(0.1, rel=0.1)
+        assert delays[4950] == pytest.approx(0.4, rel=0.2)
+
+
+class TestAsyncRagEndpoint:
+    def test_query_uses_async_provider(self, client, monkeypatch):
+        def handler(request):
+            context = json.loads(request.content)["messages"][1]["content"]
+            return httpx.Response(200, json=openai_reply("Answer from: " + context.split("\n")[1][:20]))
+
+        monkeypatch.setattr(
+            providers, "openai_provider",
+            OpenAIProvider("sk-test", "http://llm.local/v1", 4, transport=httpx.MockTransport(handler))
+        )
+        workspace_id = client.post("/workspaces/", json={"name": "Async WS"}).json()["id"]
+        asset_id = client.post(
+            f"/assets/{workspace_id}", json={"name": "Doc", "content": "Owls hunt at night using silent flight."}
+        ).json()["id"]
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Owls", "asset_ids": [asset_id]}).json()["id"]
+
+        response = client.post(
+            "/rag/query",
+            json={"query": "How do owls hunt?", "kit_id": kit_id, "use_llm": True, "model": "gpt-3.5-turbo"}
+        )
+        assert response.status_code == 200
+        assert response.json()["answer"] == "Answer from: Owls hunt at night u"
+        assert response.json()["sources"] == [asset_id]
+
+    def test_provider_failure_is_500(self, client, monkeypatch):
+        transport = httpx.MockTransport(lambda request: httpx.Response(503, text="unavailable"))
+        monkeypatch.setattr(providers, "openai_provider", OpenAIProvider("sk-test", "http://llm.local/v1", 4, transport=transport))
+        workspace_id = client.post("/workspaces/", json={"name": "Async Fail WS"}).json()["id"]
+        asset_id = client.post(f"/assets/{workspace_id}", json={"name": "Doc", "content": "Some text"}).json()["id"]
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Kit", "asset_ids": [asset_id]}).json()["id"]
+
+        response = client.post(
+            "/rag/query", json={"query": "anything", "kit_id": kit_id, "use_llm": True, "model": "gpt-3.5-turbo"}
+        )
+        assert response.status_code == 500
+        assert "503" in response.json()["detail"]
+
+    def test_stream_endpoint_relays_provider_tokens(self, client, monkeypatch):
+        chunks = [{"choices": [{"delta": {"content": piece}}]} for piece in ["Silent ", "flight."]]
+        transport = httpx.MockTransport(lambda request: httpx.Response(200, text=sse_body(chunks)))
+        monkeypatch.setattr(providers, "openai_provider", OpenAIProvider("sk-test", "http://llm.local/v1", 4, transport=transport))
+        workspace_id = client.post("/workspaces/", json={"name": "Stream WS"}).json()["id"]
+        asset_id = client.post(f"/assets/{workspace_id}", json={"name": "Doc", "content": "Owls hunt at night."}).json()["id"]
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Owls", "asset_ids": [asset_id]}).json()["id"]
+
+        response = client.post(
+            "/rag/query/stream",
+            json={"query": "How do owls hunt?", "kit_id": kit_id, "model": "gpt-3.5-turbo"}
+        )
+        body = response.text
+        assert body.index("event: sources") < body.index("event: token")
+        assert 'data: {"text": "Silent "}' in body
+        assert 'event: done\ndata: {"answer": "Silent flight."}' in body
+
+    def test_stream_endpoint_reports_provider_failure_as_event(self, client, monkeypatch):
+        transport = httpx.MockTransport(lambda request: httpx.Response(503, text="unavailable"))
+        monkeypatch.setattr(providers, "openai_provider", OpenAIProvider("sk-test", "http://llm.local/v1", 4, transport=transport))
+        workspace_id = client.post("/workspaces/", json={"name": "Stream Fail WS"}).json()["id"]
+        asset_id = client.post(f"/assets/{workspace_id}", json={"name": "Doc", "content": "Some text"}).json()["id"]
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Kit", "asset_ids": [asset_id]}).json()["id"]
+
+        response = client.post("/rag/query/stream", json={"query": "anything", "kit_id": kit_id, "model": "gpt-3.5-turbo"})
+        assert response.status_code == 200
+        assert "event: error" in response.text
+        assert "event: done" not in response.text
@@ -0,0 +1,348 @@
+import os
+
+import numpy as np
+import pytest
+from app.models import Asset, Chunk, IndexJob
+from app.services import events, indexing, lexical, rag, vectors
+from app.services.chunking import split_text
+from app.services.lexical import BM25Index, tokenize
+from app.services.retrieval import reciprocal_rank_fusion, rerank, rerank_score
+from app.services.vectors import INITIAL_CAPACITY, HashingEmbedder, VectorIndex
+
+
+@pytest.fixture
+def index():
+    index = BM25Index()
+    index.add("python", "Python is a high-level programming language that emphasizes readability.")
+    index.add("ai", "Artificial intelligence and machine learning let systems learn from data.")
+    index.add("web", "Web development covers frontend interfaces and backend servers.")
+    return index
+
+
+class TestBM25Index:
+    def test_tokenize_drops_stopwords_and_case(self):
+        assert tokenize("What is the Python language?") == ["python", "language"]
+
+    def test_search_ranks_matching_document_first(self, index):
+        results = index.search("which programming language is readable python", k=3)
+        assert results[0][0] == "python"
+
+    def test_search_respects_doc_id_filter(self, index):
+        results = index.search("python machine learning", k=3, doc_ids=["ai", "web"])
+        assert [doc_id for doc_id, _ in results] == ["ai"]
+
+    def test_no_matches(self, index):
+        assert index.search("quantum chromodynamics") == []
+
+    def test_remove_drops_postings(self, index):
+        index.remove("python")
+        assert "python" not in index
+        assert len(index) == 2
+        assert index.search("python") == []
+
+    def test_re_adding_replaces_document(self, index):
+        index.add("web", "Rust systems programming")
+        assert index.search("frontend") == []
+        assert index.search("rust")[0][0] == "web"
+
+
+class TestHashingEmbedder:
+    def test_deterministic_and_normalized(self):
+        embedder = HashingEmbedder(dim=64)
+        first = embedder.embed(["machine learning models"])
+        second = embedder.embed(["machine learning models"])
+        assert first.dtype == np.float32
+        assert np.array_equal(first, second)
+        assert np.isclose(np.linalg.norm(first[0]), 1.0)
+
+    def test_empty_text_is_zero_vector(self):
+        assert not HashingEmbedder(dim=64).embed([""]).any()
+
+
+class TestVectorIndex:
+    @pytest.fixture
+    def embedder(self):
+        return HashingEmbedder(dim=256)
+
+    @pytest.fixture
+    def vector_index(self, tmp_path, embedder):
+        index = VectorIndex(str(tmp_path / "ws"), embedder.dim)
+        docs = {
+            "python": "Python is a high-level programming language that emphasizes readability.",
+            "ai": "Artificial intelligence and machine learning let systems learn from data.",
+            "web": "Web development covers frontend interfaces and backend servers.",
+        }
+        index.add(list(docs), embedder.embed(list(docs.values())))
+        return index
+
+    def test_batched_search(self, vector_index, embedder):
+        results = vector_index.search(embedder.embed(["python programming language", "machine learning data"]), k=2)
+        assert results[0][0][0] == "python"
+        assert results[1][0][0] == "ai"
+        assert all(len(hits) == 2 for hits in results)
+
+    def test_search_respects_doc_id_filter(self, vector_index, embedder):
+        results = vector_index.search(embedder.embed(["python programming"]), k=3, doc_ids=["web", "missing"])[0]
+        assert [doc_id for doc_id, _ in results] == ["web"]
+
+    def test_persists_and_reloads_from_disk(self, vector_index, embedder):
+        reloaded = VectorIndex(vector_index.path, embedder.dim)
+        assert len(reloaded) == 3
+        assert isinstance(reloaded._matrix, np.memmap)
+        assert reloaded.search(embedder.embed(["frontend backend"]), k=1)[0][0][0] == "web"
+
+    def test_remove_and_reuse_rows(self, vector_index, embedder):
+        vector_index.remove(["python"])
+        assert "python" not in vector_index
+        vector_index.add(["rust"], embedder.embed(["Rust systems programming language"]))
+        assert len(vector_index._ids) == 3
+        assert vector_index.search(embedder.embed(["programming language"]), k=1)[0][0][0] == "rust"
+
+    def test_updates_append_to_the_id_log(self, vector_index, embedder):
+        snapshot = os.stat(vector_index._ids_path).st_ino
+        vector_index.remove(["web"])
+        vector_index.add(["rust"], embedder.embed(["Rust systems programming language"]))
+        assert os.stat(vector_index._ids_path).st_ino == snapshot
+        with open(vector_index._log_path) as fh:
+            assert len(fh.readlines()) == 2
+        reloaded = VectorIndex(vector_index.path, embedder.dim)
+        assert "web" not in reloaded and "rust" in reloaded
+        assert reloaded._ids == vector_index._ids
+
+    def test_id_log_is_compacted(self, tmp_path, embedder):
+        index = VectorIndex(str(tmp_path / "churn"), embedder.dim)
+        vector = embedder.embed(["churn"])
+        for i in range(3 * INITIAL_CAPACITY):
+            index.add([f"doc-{i}"], vector)
+            index.remove([f"doc-{i}"])
+        assert len(index._ids) == 1
+        assert index._logged <= INITIAL_CAPACITY
+        index.add(["kept"], vector)
+        assert VectorIndex(index.path, embedder.dim)._rows == {"kept": 0}
+
+    def test_search_scores_large_and_small_candidate_sets(self, tmp_path, embedder):
+        index = VectorIndex(str(tmp_path / "mixed"), embedder.dim)
+        ids = [f"doc-{i}" for i in range(40)]
+        index.add(ids, embedder.embed([f"document number {i}" for i in range(40)]))
+        query = embedder.embed(["document number 3"])
+        assert index.search(query, k=1, doc_ids=["doc-3", "doc-9"])[0][0][0] == "doc-3"
+        assert index.search(query, k=1, doc_ids=ids[:30])[0][0][0] == "doc-3"
+
+    def test_grows_past_initial_capacity(self, tmp_path, embedder):
+        index = VectorIndex(str(tmp_path / "big"), embedder.dim)
+        ids = [f"doc-{i}" for i in range(150)]
+        index.add(ids, embedder.embed([f"document number {i}" for i in range(150)]))
+        assert len(index) == 150
+        assert index._matrix.shape[0] >= 150
+        assert VectorIndex(index.path, embedder.dim).search(embedder.embed(["document number 7"]), k=1)[0][0][0] == "doc-7"
+
+
+class TestChunking:
+    def test_short_text_is_one_chunk(self):
+        chunks = list(split_text("  Just a few words here. ", max_tokens=10, overlap=2))
+        assert len(chunks) == 1
+        assert chunks[0].text == "Just a few words here."
+        assert chunks[0].token_count == 5
+
+    def test_windows_overlap_and_offsets_index_source(self):
+        text = " ".join(f"w{i}" for i in range(25))
+        chunks = list(split_text(text, max_tokens=10, overlap=3))
+        assert [c.token_count for c in chunks] == [10, 10, 10, 4]
+        for chunk in chunks:
+            assert text[chunk.start:chunk.end] == chunk.text
+        assert chunks[0].text.split()[-3:] == chunks[1].text.split()[:3]
+        assert chunks[-1].text.endswith("w24")
+
+    def test_empty_text(self):
+        assert list(split_text("   ")) == []
+
+    def test_overlap_must_be_smaller_than_window(self):
+        with pytest.raises(ValueError):
+            list(split_text("a b c", max_tokens=5, overlap=5))
+
+
+class TestFusionAndRerank:
+    def test_rrf_rewards_agreement(self):
+        lexical_hits = [("a", 12.0), ("b", 9.0), ("c", 1.0)]
+        vector_hits = [("b", 0.9), ("c", 0.8), ("d", 0.7)]
+        fused = [doc_id for doc_id, _ in reciprocal_rank_fusion([lexical_hits, vector_hits], k=60)]
+        assert fused[0] == "b"
+        assert set(fused) == {"a", "b", "c", "d"}
+
+    def test_rerank_score_prefers_phrase_and_proximity(self):
+        terms = tokenize("reset the admin password")
+        exact = rerank_score(terms, "To reset admin password open settings.")
+        scattered = rerank_score(terms, "Password rules. Reset tokens expire. Contact your admin team.")
+        assert exact > scattered > 0
+        assert rerank_score(terms, "Unrelated passage about bees.") == 0
+
+    def test_rerank_keeps_fused_order_on_ties(self):
+        reranked = rerank("owls", [("x", "no match here", 0.2), ("y", "still nothing", 0.3), ("z", "owls hunt", 0.1)])
+        assert [doc_id for doc_id, _ in reranked] == ["z", "y", "x"]
+
+
+class TestHybridRetrieval:
+    def _kit(self, client, contents):
+        workspace_id = client.post("/workspaces/", json={"name": "Hybrid WS"}).json()["id"]
+        asset_ids = [
+            client.post(f"/assets/{workspace_id}", json={"name": f"Doc {i}", "content": content}).json()["id"]
+            for i, content in enumerate(contents)
+        ]
+        return client.post(f"/kits/{workspace_id}", json={"name": "Kit", "asset_ids": asset_ids}).json()["id"], asset_ids
+
+    def test_hybrid_ranks_exact_identifier_and_reports_timings(self, client):
+        kit_id, asset_ids = self._kit(client, [
+            "def parse_csv_header(row): return [cell.strip() for cell in row]",
+            "Reading spreadsheets: header rows describe the columns of the file.",
+            "Shipping policy: orders ship within two business days.",
+        ])
+        response = client.post(
+            "/rag/query",
+            json={"query": "parse_csv_header", "kit_id": kit_id, "use_llm": False, "bypass_cache": True}
+        ).json()
+        assert response["sources"][0] == asset_ids[0]
+        assert {"index", "lexical", "vector", "fusion", "rerank", "pack"} <= set(response["timings"])
+
+    def test_single_retriever_modes(self, client, monkeypatch):
+        kit_id, asset_ids = self._kit(client, ["Owls hunt at night.", "Bees dance to communicate."])
+        for mode, stage in (("lexical", "lexical"), ("vector", "vector")):
+            monkeypatch.setattr(rag, "RETRIEVAL_MODE", mode)
+            response = client.post(
+                "/rag/query",
+                json={"query": "how do bees communicate", "kit_id": kit_id, "use_llm": False, "bypass_cache": True}
+            ).json()
+            assert response["sources"][0] == asset_ids[1]
+            assert stage in response["timings"]
+            assert "fusion" not in response["timings"]
+
+
+class TestIndexMaintenance:
+    """Index updates driven by asset, kit and workspace change events"""
+
+    def _workspace(self, client, name):
+        return client.post("/workspaces/", json={"name": name}).json()["id"]
+
+    def _asset(self, client, workspace_id, content):
+        return client.post(
+            f"/assets/{workspace_id}", json={"name": "Doc", "content": content, "asset_type": "document"}
+        ).json()["id"]
+
+    def _chunk_ids(self, db_session, asset_id):
+        return [c.id for c in db_session.query(Chunk).filter(Chunk.asset_id == asset_id)]
+
+    def test_create_indexes_asset_chunks(self, client, db_session):
+        workspace_id = self._workspace(client, "Index Create WS")
+        asset_id = self._asset(client, workspace_id, "Solar panels convert sunlight into electricity.")
+
+        chunk_ids = self._chunk_ids(db_session, asset_id)
+        assert len(chunk_ids) == 1
+        assert chunk_ids[0] in lexical.get_index(workspace_id)
+        assert chunk_ids[0] in vectors.get_index(workspace_id)
+
+    def test_delete_removes_only_that_asset(self, client, db_session):
+        workspace_id = self._workspace(client, "Index Delete WS")
+        keep = self._asset(client, workspace_id, "Tidal energy uses ocean currents.")
+        drop = self._asset(client, workspace_id, "Geothermal plants tap heat from the earth.")
+        drop_chunks = self._chunk_ids(db_session, drop)
+
+        assert client.delete(f"/assets/asset/{drop}").status_code == 204
+        assert not any(c in lexical.get_index(workspace_id) for c in drop_chunks)
+        assert not any(c in vectors.get_index(workspace_id) for c in drop_chunks)
+        assert self._chunk_ids(db_session, drop) == []
+        assert all(c in lexical.get_index(workspace_id) for c in self._chunk_ids(db_session, keep))
+
+    def test_merge_workspaces_moves_index_entries(self, client, db_session):
+        source = self._workspace(client, "Index Merge Source")
+        target = self._workspace(client, "Index Merge Target")
+        asset_id = self._asset(client, source, "Hydroelectric dams store water in reservoirs.")
+        chunk_ids = self._chunk_ids(db_session, asset_id)
+        vector = vectors.get_index(source).take(chunk_ids)[1]
+
+        response = client.post("/workspaces/merge", json={"source_id": source, "target_id": target})
+        assert response.status_code == 200
+        assert all(c in lexical.get_index(target) for c in chunk_ids)
+        moved_ids, moved = vectors.get_index(target).take(chunk_ids)
+        assert moved_ids == chunk_ids
+        assert np.array_equal(moved, vector)
+
+    def test_kit_update_indexes_unindexed_assets(self, client, db_session):
+        workspace_id = self._workspace(client, "Index Kit WS")
+        legacy = Asset(
+            workspace_id=workspace_id, name="Legacy", asset_type="document", content="Wind turbines spin in the breeze."
+        )
+        db_session.add(legacy)
+        db_session.commit()
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Energy Kit"}).json()["id"]
+
+        response = client.put(f"/kits/kit/{kit_id}", json={"asset_ids": [legacy.id]})
+        assert response.status_code == 200
+        db_session.refresh(legacy)
+        assert legacy.indexed_at is not None
+        assert all(c in lexical.get_index(workspace_id) for c in self._chunk_ids(db_session, legacy.id))
+
+    def test_retrieval_skips_assets_with_pending_jobs(self, client, db_session):
+        workspace_id = self._workspace(client, "Index Pending WS")
+        indexed = db_session.get(Asset, self._asset(client, workspace_id, "Heat pumps move warmth indoors."))
+        pending = Asset(workspace_id=workspace_id, name="Pending", asset_type="document", content="Heat pumps in winter.")
+        db_session.add(pending)
+        db_session.flush()
+        db_session.add(IndexJob(asset_id=pending.id, status="failed", attempts=3))
+        db_session.commit()
+
+        citations = rag.RAGService.retrieve_many(db_session, ["heat pumps"], [indexed, pending])[0]
+        assert {c.asset_id for c in citations} == {indexed.id}
+        db_session.refresh(pending)
+        assert pending.indexed_at is None
+        assert db_session.query(IndexJob).filter(IndexJob.asset_id == pending.id).count() == 1
+
+    def test_retrieval_queues_assets_without_jobs(self, client, db_session):
+        workspace_id = self._workspace(client, "Index Legacy WS")
+        legacy = Asset(workspace_id=workspace_id, name="Legacy", asset_type="document", content="Biogas from waste.")
+        db_session.add(legacy)
+        db_session.commit()
+
+        rag.RAGService.retrieve_many(db_session, ["biogas"], [legacy])
+        assert db_session.query(IndexJob).filter(IndexJob.asset_id == legacy.id).count() == 1
+
+    def test_retrieval_does_not_fill_the_indexes(self, client, db_session, monkeypatch):
+        workspace_id = self._workspace(client, "Index Restart WS")
+        asset = db_session.get(Asset, self._asset(client, workspace_id, "Wave farms ride the swell."))
+        lexical.drop_index(workspace_id)  # As after a restart
+        vectors.get_index(workspace_id).remove(self._chunk_ids(db_session, asset.id))
+        original = HashingEmbedder.embed
+
+        def embed(self, texts):
+            assert texts == ["wave farms"], "only the query is embedded"
+            return original(self, texts)
+
+        monkeypatch.setattr(HashingEmbedder, "embed", embed)
+        rag.RAGService.retrieve_many(db_session, ["wave farms"], [asset])
+        assert len(lexical.get_index(workspace_id)) == 0
+
+    def test_warm_up_fills_missing_index_entries(self, client, db_session):
+        workspace_id = self._workspace(client, "Index Warm WS")
+        asset_id = self._asset(client, workspace_id, "Wave farms ride the swell.")
+        chunk_ids = self._chunk_ids(db_session, asset_id)
+        lexical.drop_index(workspace_id)
+        vectors.get_index(workspace_id).remove(chunk_ids)
+
+        assert indexing.warm_indexes(db_session) >= len(chunk_ids)
+        assert all(c in lexical.get_index(workspace_id) for c in chunk_ids)
+        assert all(c in vectors.get_index(workspace_id) for c in chunk_ids)
+        assert indexing.warm_indexes(db_session) == 0
+
+
+class TestEvents:
+    def test_handler_errors_do_not_propagate(self):
+        calls = []
+
+        @events.subscribe("test.event")
+        def failing(**payload):
+            raise RuntimeError("boom")
+
+        @events.subscribe("test.event")
+        def recording(**payload):
+            calls.append(payload)
+
+        events.emit("test.event", value=1)
+        assert calls == [{"value": 1}]
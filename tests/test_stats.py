@@ -0,0 +1,204 @@
+import io
+import json
+
+import pytest
+from sqlalchemy import event
+
+from app.models import Asset, AssetStats
+from app.services.stats import STATS_TOP_N, compute_stats, get_stats
+
+
+@pytest.fixture
+def workspace_id(client):
+    return client.post("/workspaces/", json={"name": "Stats Workspace"}).json()["id"]
+
+
+def upload(client, workspace_id, name, size, mime_type):
+    response = client.post(
+        f"/assets/{workspace_id}/upload",
+        files={"file": (name, io.BytesIO(b"x" * size), mime_type)}
+    )
+    assert response.status_code == 201
+    return response.json()["id"]
+
+
+class TestAssetStats:
+    """Test the statistics kept per workspace and kit"""
+
+    def test_asset_changes_update_workspace_stats(self, client, db_session, workspace_id):
+        pdf = upload(client, workspace_id, "report.pdf", 300, "application/pdf")
+        upload(client, workspace_id, "photo.png", 100, "image/png")
+        upload(client, workspace_id, "scan.png", 200, "image/png")
+
+        stats = db_session.get(AssetStats, ("workspace", workspace_id))
+        assert (stats.asset_count, stats.total_bytes) == (3, 600)
+        assert stats.mime_types == [["image/png", 2], ["application/pdf", 1]]
+        assert [a["name"] for a in stats.largest] == ["report.pdf", "scan.png", "photo.png"]
+        assert stats.newest[0]["name"] == "scan.png"
+
+        client.delete(f"/assets/asset/{pdf}")
+        db_session.refresh(stats)
+        assert (stats.asset_count, stats.total_bytes) == (2, 300)
+        assert stats.mime_types == [["image/png", 2]]
+
+    def test_kit_membership_updates_kit_stats(self, client, db_session, workspace_id):
+        small = upload(client, workspace_id, "small.txt", 10, "text/plain")
+        large = upload(client, workspace_id, "large.txt", 1000, "text/plain")
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Kit", "asset_ids": [small]}).json()["id"]
+        assert get_stats(db_session, "kit", kit_id).total_bytes == 10
+        assert get_stats(db_session, "workspace", workspace_id).kit_count == 1
+
+        client.put(f"/kits/kit/{kit_id}", json={"asset_ids": [small, large]})
+        stats = get_stats(db_session, "kit", kit_id)
+        db_session.refresh(stats)
+        assert (stats.asset_count, stats.total_bytes) == (2, 1010)
+        assert stats.largest[0]["id"] == large
+
+        client.delete(f"/kits/kit/{kit_id}")
+        assert db_session.get(AssetStats, ("kit", kit_id)) is None
+        assert get_stats(db_session, "workspace", workspace_id).kit_count == 0
+
+    def test_workspace_merge_moves_stats(self, client, db_session, workspace_id):
+        other = client.post("/workspaces/", json={"name": "Other Stats Workspace"}).json()["id"]
+        upload(client, workspace_id, "a.txt", 5, "text/plain")
+        upload(client, other, "b.txt", 7, "text/plain")
+        client.post(f"/kits/{other}", json={"name": "Other kit", "asset_ids": []})
+
+        client.post("/workspaces/merge", json={"source_id": other, "target_id": workspace_id})
+        db_session.expire_all()
+        stats = get_stats(db_session, "workspace", workspace_id)
+        assert (stats.asset_count, stats.total_bytes, stats.kit_count) == (2, 12, 1)
+        assert db_session.get(AssetStats, ("workspace", other)) is None
+
+    def test_top_n_is_bounded(self, client, db_session, workspace_id):
+        for i in range(STATS_TOP_N + 2):
+            upload(client, workspace_id, f"file{i}.bin", i + 1, "application/octet-stream")
+        stats = get_stats(db_session, "workspace", workspace_id)
+        assert len(stats.largest) == len(stats.newest) == STATS_TOP_N
+        assert stats.largest[0]["file_size"] == STATS_TOP_N + 2
+
+    def test_missing_stats_are_backfilled(self, client, db_session, workspace_id):
+        upload(client, workspace_id, "doc.txt", 42, "text/plain")
+        db_session.query(AssetStats).delete()
+        db_session.commit()
+        assert get_stats(db_session, "workspace", workspace_id).total_bytes == 42
+        assert get_stats(db_session, "workspace", "missing") is None
+
+    def test_deltas_match_a_full_recompute(self, client, db_session, workspace_id):
+        ids = [upload(client, workspace_id, f"f{i}.bin", 10 * (i + 1), "application/octet-stream") for i in range(STATS_TOP_N + 2)]
+        photo = upload(client, workspace_id, "photo.png", 5, "image/png")
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Kit", "asset_ids": ids[-3:] + [photo]}).json()["id"]
+
+        client.delete(f"/assets/asset/{ids[-1]}")  # Largest, and in the kit
+        client.put(f"/kits/kit/{kit_id}", json={"asset_ids": [ids[0], photo]})
+        largest = db_session.get(Asset, ids[-2])
+        largest.file_size = 1  # Drops out of the top N
+        largest.mime_type = "image/png"
+        db_session.commit()
+        small = db_session.get(Asset, ids[0])
+        db_session.expire(small)
+        small.file_size = 10_000  # Assigned while expired: its old size is read back from the database
+        db_session.commit()
+
+        for kind, scope_id in (("workspace", workspace_id), ("kit", kit_id)):
+            db_session.expire_all()
+            stored = get_stats(db_session, kind, scope_id)
+            expected = compute_stats(db_session.connection(), kind, scope_id)
+            for column in ("asset_count", "total_bytes", "kit_count", "mime_types", "largest", "newest"):
+                assert getattr(stored, column) == expected[column], (kind, column)
+        assert get_stats(db_session, "kit", kit_id).largest[0]["id"] == ids[0]
+
+    def test_insert_does_not_aggregate_the_scope(self, client, db_session, workspace_id):
+        for i in range(STATS_TOP_N + 1):
+            upload(client, workspace_id, f"f{i}.txt", 100, "text/plain")
+        statements = []
+
+        def record(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement.lower())
+
+        event.listen(db_session.get_bind(), "before_cursor_execute", record)
+        try:
+            upload(client, workspace_id, "small.txt", 1, "text/plain")
+        finally:
+            event.remove(db_session.get_bind(), "before_cursor_execute", record)
+        assert get_stats(db_session, "workspace", workspace_id).asset_count == STATS_TOP_N + 2
+        assert any("insert into assets" in s for s in statements)
+        assert not [s for s in statements if "group by" in s or "count(" in s or "sum(" in s]
+
+    def test_rolled_back_changes_leave_stats_alone(self, client, db_session, workspace_id):
+        upload(client, workspace_id, "kept.txt", 8, "text/plain")
+        db_session.add(Asset(workspace_id=workspace_id, name="dropped", file_size=1000))
+        db_session.flush()
+        assert db_session.get(AssetStats, ("workspace", workspace_id)).total_bytes == 1008
+        db_session.rollback()
+        assert get_stats(db_session, "workspace", workspace_id).total_bytes == 8
+
+
+class TestQuickQueries:
+    """Test quick queries answered from the statistics"""
+
+    @pytest.fixture
+    def kit_id(self, client, workspace_id):
+        ids = [
+            upload(client, workspace_id, "report.pdf", 3000, "application/pdf"),
+            upload(client, workspace_id, "photo.png", 1000, "image/png"),
+            upload(client, workspace_id, "notes.txt", 500, "text/plain"),
+        ]
+        return client.post(f"/kits/{workspace_id}", json={"name": "Quick kit", "asset_ids": ids}).json()["id"]
+
+    def ask(self, client, kit_id, query):
+        response = client.post("/rag/query", json={"query": query, "kit_id": kit_id, "model": "none"})
+        assert response.status_code == 200
+        return response.json()
+
+    def test_quick_queries_do_not_load_assets(self, client, db_session, kit_id):
+        db_session.expire_all()
+        loaded = []
+
+        def on_load(target, context):
+            loaded.append(target)
+
+        event.listen(Asset, "load", on_load)
+        try:
+            data = self.ask(client, kit_id, "Count Assets")
+        finally:
+            event.remove(Asset, "load", on_load)
+        assert data["answer"].startswith("You have 3 assets")
+        assert "4.4 KB" in data["answer"]
+        assert len(data["sources"]) == 3
+        assert loaded == []
+
+    def test_quick_query_answers(self, client, kit_id):
+        assert "image/png: 1 files" in self.ask(client, kit_id, "File Types")["answer"]
+        summary = self.ask(client, kit_id, "Basic Summary")["answer"]
+        assert "Total Assets: 3" in summary and "Kits Available: 1" in summary
+        assert [a["name"] for a in json.loads(self.ask(client, kit_id, "Largest Files")["answer"])] == [
+            "report.pdf", "photo.png", "notes.txt"
+        ]
+        assert json.loads(self.ask(client, kit_id, "Recent Files")["answer"])[0]["name"] == "notes.txt"
+        assert [a["name"] for a in json.loads(self.ask(client, kit_id, "List PDFs")["answer"])] == ["report.pdf"]
+        assert [a["name"] for a in json.loads(self.ask(client, kit_id, "List Images")["answer"])] == ["photo.png"]
+
+    def test_listing_sources_are_the_listed_assets(self, client, kit_id):
+        for query in ("Largest Files", "Recent Files", "List PDFs", "List Images"):
+            data = self.ask(client, kit_id, query)
+            assert data["sources"] == [a["id"] for a in json.loads(data["answer"])]
+        assert len(self.ask(client, kit_id, "List PDFs")["sources"]) == 1
+        assert len(self.ask(client, kit_id, "File Types")["sources"]) == 3
+
+    def test_aggregate_sources_are_bounded(self, client, workspace_id):
+        ids = [upload(client, workspace_id, f"f{i}.txt", i + 1, "text/plain") for i in range(STATS_TOP_N + 2)]
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Big kit", "asset_ids": ids}).json()["id"]
+        for query in ("Count Assets", "File Types", "Basic Summary"):
+            assert self.ask(client, kit_id, query)["sources"] == ids[::-1][:STATS_TOP_N]
+
+    def test_listing_nothing_has_no_sources(self, client, workspace_id):
+        asset_id = upload(client, workspace_id, "notes.txt", 10, "text/plain")
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Text kit", "asset_ids": [asset_id]}).json()["id"]
+        data = self.ask(client, kit_id, "List PDFs")
+        assert (data["answer"], data["sources"]) == ("[]", [])
+
+    def test_empty_kit_is_rejected(self, client, workspace_id):
+        kit_id = client.post(f"/kits/{workspace_id}", json={"name": "Empty kit"}).json()["id"]
+        response = client.post("/rag/query", json={"query": "Count Assets", "kit_id": kit_id})
+        assert response.status_code == 400
@@ -0,0 +1,224 @@
+import hashlib
+import io
+import os
+import pytest
+from app.models import Asset
+from app.services.storage import LocalBlobStore, S3BlobStore, BlobNotFound, blob_store
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocalBlobStore(str(tmp_path / "blobs"))
+
+
+@pytest.fixture
+def workspace_id(client):
+    response = client.post("/workspaces/", json={"name": "Storage Workspace"})
+    return response.json()["id"]
+
+
+class TestLocalBlobStore:
+    def test_put_returns_sha256_digest(self, store):
+        data = b"hello blob"
+        digest = store.put(data)
+        assert digest == hashlib.sha256(data).hexdigest()
+        assert store.exists(digest)
+        assert store.size(digest) == len(data)
+
+    def test_blobs_are_sharded_by_digest_prefix(self, store):
+        digest = store.put(b"sharded")
+        path = store.path(digest)
+        assert path.endswith(os.path.join(digest[:2], digest[2:4], digest))
+        assert os.path.exists(path)
+
+    def test_put_is_idempotent(self, store):
+        assert store.put(b"same bytes") == store.put(b"same bytes")
+
+    def test_iter_chunks_round_trip(self, store):
+        data = os.urandom(10_000)
+        digest = store.put(data)
+        assert b"".join(store.iter_chunks(digest, chunk_size=1024)) == data
+
+    def test_delete(self, store):
+        digest = store.put(b"to delete")
+        store.delete(digest)
+        assert not store.exists(digest)
+        with pytest.raises(BlobNotFound):
+            store.open(digest)
+
+    def test_rejects_invalid_digest(self, store):
+        with pytest.raises(ValueError):
+            store.path("../../etc/passwd")
+
+
+class _FakeS3:
+    """Just enough of an S3 client to list and delete keys, 1000 per page."""
+
+    def __init__(self, keys):
+        self.keys = set(keys)
+
+    def get_paginator(self, operation):
+        assert operation == "list_objects_v2"
+        return self
+
+    def paginate(self, Bucket, Prefix):
+        keys = sorted(key for key in self.keys if key.startswith(Prefix))
+        for start in range(0, len(keys), 1000):
+            yield {"Contents": [{"Key": key} for key in keys[start:start + 1000]]}
+
+    def delete_objects(self, Bucket, Delete):
+        assert len(Delete["Objects"]) <= 1000
+        self.keys -= {obj["Key"] for obj in Delete["Objects"]}
+
+
+class TestS3BlobStore:
+    def test_delete_parts_pages_through_the_listing(self):
+        upload_id = "0f8fad5b-d9cb-469f-a165-70867728950e"
+        client = _FakeS3([f"blobs/uploads/{upload_id}/{n:05d}" for n in range(1, 2501)] + ["blobs/uploads/other/00001"])
+        S3BlobStore("bucket", client=client).delete_parts(upload_id)
+        assert client.keys == {"blobs/uploads/other/00001"}
+
+
+class TestUploadStorage:
+    def test_upload_stores_pointer_not_content(self, client, workspace_id, db_session):
+        data = b"\x00\x01binary payload"
+        response = client.post(
+            f"/assets/{workspace_id}/upload",
+            files={"file": ("payload.bin", io.BytesIO(data), "application/octet-stream")},
+        )
+        assert response.status_code == 201
+        body = response.json()
+        assert body["content"] is None
+        assert body["blob_digest"] == hashlib.sha256(data).hexdigest()
+
+        asset = db_session.query(Asset).filter(Asset.id == body["id"]).first()
+        assert asset.content is None
+        assert blob_store.exists(asset.blob_digest)
+
+    def test_download_reads_from_blob_store(self, client, workspace_id):
+        data = os.urandom(3 * 1024 * 1024 + 17)
+        response = client.post(
+            f"/assets/{workspace_id}/upload",
+            files={"file": ("random.bin", io.BytesIO(data), "application/octet-stream")},
+        )
+        asset_id = response.json()["id"]
+
+        download = client.get(f"/assets/asset/{asset_id}/download")
+        assert download.status_code == 200
+        assert download.content == data
+
+
+class TestSendfileResponse:
+    def _serve(self, response, extensions):
+        import asyncio
+        messages = []
+
+        async def receive():
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {"type": "http", "method": "GET", "headers": [], "extensions": extensions}
+        asyncio.run(response(scope, receive, send))
+        return messages
+
+    def test_hands_file_descriptor_to_zerocopy_server(self, store):
+        from app.services.sendfile import SendfileResponse
+        digest = store.put(b"0123456789")
+        response = SendfileResponse(store.local_path(digest), offset=2, length=5)
+
+        messages = self._serve(response, {"http.response.zerocopysend": {}})
+        assert messages[0]["type"] == "http.response.start"
+        assert (b"content-length", b"5") in messages[0]["headers"]
+        assert messages[1]["type"] == "http.response.zerocopysend"
+        assert (messages[1]["offset"], messages[1]["count"]) == (2, 5)
+
+    def test_falls_back_to_chunked_reads(self, store):
+        from app.services.sendfile import SendfileResponse
+        data = os.urandom(2500)
+        digest = store.put(data)
+        response = SendfileResponse(store.local_path(digest), offset=100, length=2000)
+        response.chunk_size = 512
+
+        messages = self._serve(response, {})
+        body = b"".join(m["body"] for m in messages if m["type"] == "http.response.body")
+        assert body == data[100:2100]
+        assert messages[-1]["more_body"] is False
+
+
+class TestDeduplication:
+    def _upload(self, client, workspace_id, data, name="dup.bin"):
+        response = client.post(
+            f"/assets/{workspace_id}/upload",
+            files={"file": (name, io.BytesIO(data), "application/octet-stream")},
+        )
+        assert response.status_code == 201
+        return response.json()
+
+    def test_identical_uploads_share_one_refcounted_blob(self, client, db_session):
+        from app.models import Blob
+        ws1 = client.post("/workspaces/", json={"name": "Dedup 1"}).json()["id"]
+        ws2 = client.post("/workspaces/", json={"name": "Dedup 2"}).json()["id"]
+        data = os.urandom(4096)
+
+        first = self._upload(client, ws1, data)
+        second = self._upload(client, ws2, data, name="copy.bin")
+        assert first["blob_digest"] == second["blob_digest"]
+
+        blobs = db_session.query(Blob).all()
+        assert len(blobs) == 1
+        assert blobs[0].ref_count == 2
+        assert blobs[0].size == len(data)
+
+    def test_blob_removed_when_last_reference_dropped(self, client, db_session):
+        from app.models import Blob
+        ws1 = client.post("/workspaces/", json={"name": "GC 1"}).json()["id"]
+        ws2 = client.post("/workspaces/", json={"name": "GC 2"}).json()["id"]
+        data = os.urandom(2048)
+        first = self._upload(client, ws1, data)
+        self._upload(client, ws2, data)
+        digest = first["blob_digest"]
+
+        assert client.delete(f"/assets/asset/{first['id']}").status_code == 204
+        assert blob_store.exists(digest)
+        assert db_session.query(Blob).filter(Blob.digest == digest).one().ref_count == 1
+
+        assert client.delete(f"/workspaces/{ws2}").status_code == 204
+        assert not blob_store.exists(digest)
+        assert db_session.query(Blob).filter(Blob.digest == digest).first() is None
+
+    def test_upload_restores_blob_collected_after_dedupe_check(self, client, workspace_id, db_session):
+        from app.models import Blob
+        from app.services.blobs import acquire_written_blob, collect_garbage, release_blob
+        data = os.urandom(1024)
+        asset = self._upload(client, workspace_id, data)
+        digest = asset["blob_digest"]
+
+        # A second upload of the same bytes finds the file already stored...
+        writer = blob_store.writer()
+        writer.write(data)
+        assert writer.commit(keep=True) == digest
+        # ...then the last reference is dropped and the blob collected before it acquires one
+        release_blob(db_session, digest)
+        db_session.commit()
+        assert collect_garbage(db_session, [digest]) == 1
+        assert not blob_store.exists(digest)
+
+        acquire_written_blob(db_session, writer)
+        db_session.commit()
+        assert db_session.query(Blob).filter(Blob.digest == digest).one().ref_count == 1
+        with blob_store.open(digest) as fh:
+            assert hashlib.sha256(fh.read()).hexdigest() == digest
+        assert not os.path.exists(writer.tmp_path)
+
+    def test_rebuild_ref_counts(self, client, workspace_id, db_session):
+        from app.models import Blob
+        from app.services.blobs import rebuild_ref_counts
+        asset = self._upload(client, workspace_id, os.urandom(512))
+        db_session.query(Blob).delete()
+        db_session.commit()
+
+        rebuild_ref_counts(db_session)
+        blob = db_session.query(Blob).filter(Blob.digest == asset["blob_digest"]).one()
+        assert blob.ref_count == 1
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import pytest
+
+
+@pytest.fixture
+def workspace_id(client):
+    response = client.post("/workspaces/", json={"name": "Upload Sessions"})
+    return response.json()["id"]
+
+
+def create_session(client, workspace_id, **extra):
+    payload = {"filename": "movie.mp4", "mime_type": "video/mp4"}
+    payload.update(extra)
+    response = client.post(f"/uploads/{workspace_id}", json=payload)
+    assert response.status_code == 201
+    return response.json()
+
+
+class TestUploadSessions:
+    def test_parts_out_of_order_assemble_in_order(self, client, workspace_id):
+        data = os.urandom(250_000)
+        parts = [data[:100_000], data[100_000:200_000], data[200_000:]]
+        session = create_session(client, workspace_id)
+
+        for number in (3, 1, 2):
+            response = client.put(f"/uploads/{session['id']}/parts/{number}", content=parts[number - 1])
+            assert response.status_code == 200
+            assert response.json()["size"] == len(parts[number - 1])
+
+        commit = client.post(f"/uploads/{session['id']}/commit")
+        assert commit.status_code == 201
+        asset = commit.json()
+        assert asset["name"] == "movie.mp4"
+        assert asset["asset_type"] == "video"
+        assert asset["file_size"] == len(data)
+        assert asset["blob_digest"] == hashlib.sha256(data).hexdigest()
+
+        download = client.get(f"/assets/asset/{asset['id']}/download")
+        assert download.content == data
+
+        status = client.get(f"/uploads/{session['id']}").json()
+        assert status["status"] == "committed"
+        assert status["asset_id"] == asset["id"]
+
+    def test_resume_lists_received_parts(self, client, workspace_id):
+        session = create_session(client, workspace_id)
+        client.put(f"/uploads/{session['id']}/parts/1", content=b"first")
+        client.put(f"/uploads/{session['id']}/parts/3", content=b"third")
+
+        status = client.get(f"/uploads/{session['id']}").json()
+        assert [p["part_number"] for p in status["parts"]] == [1, 3]
+
+        commit = client.post(f"/uploads/{session['id']}/commit")
+        assert commit.status_code == 400
+        assert "2" in commit.json()["detail"]
+
+        client.put(f"/uploads/{session['id']}/parts/2", content=b"second")
+        commit = client.post(f"/uploads/{session['id']}/commit")
+        assert commit.status_code == 201
+        assert client.get(f"/assets/asset/{commit.json()['id']}/download").content == b"firstsecondthird"
+
+    def test_resent_part_replaces_previous(self, client, workspace_id):
+        session = create_session(client, workspace_id, filename="notes.txt", mime_type="text/plain")
+        client.put(f"/uploads/{session['id']}/parts/1", content=b"corrupted")
+        client.put(f"/uploads/{session['id']}/parts/1", content=b"good")
+
+        commit = client.post(f"/uploads/{session['id']}/commit")
+        assert client.get(f"/assets/asset/{commit.json()['id']}/download").content == b"good"
+
+    def test_part_checksum_mismatch_rejected(self, client, workspace_id):
+        session = create_session(client, workspace_id)
+        response = client.put(
+            f"/uploads/{session['id']}/parts/1",
+            content=b"payload",
+            headers={"X-Part-SHA256": hashlib.sha256(b"other").hexdigest()},
+        )
+        assert response.status_code == 400
+        assert client.get(f"/uploads/{session['id']}").json()["parts"] == []
+
+    def test_abort_rejects_further_parts(self, client, workspace_id):
+        session = create_session(client, workspace_id)
+        assert client.delete(f"/uploads/{session['id']}").status_code == 204
+        response = client.put(f"/uploads/{session['id']}/parts/1", content=b"late")
+        assert response.status_code == 409
+
+    def test_session_for_missing_workspace(self, client):
+        response = client.post("/uploads/nonexistent-id", json={"filename": "x.bin"})
+        assert response.status_code == 404
+
+    def test_expired_sessions_are_swept(self, client, db_session, workspace_id):
+        from datetime import datetime, timedelta
+        from app.models import UploadSession
+        from app.routes.uploads import expire_upload_sessions
+        from app.services.storage import blob_store
+        expired, live = create_session(client, workspace_id), create_session(client, workspace_id)
+        for session in (expired, live):
+            client.put(f"/uploads/{session['id']}/parts/1", content=b"staged")
+        db_session.get(UploadSession, expired["id"]).expires_at = datetime.utcnow() - timedelta(minutes=1)
+        db_session.commit()
+
+        assert expire_upload_sessions(db_session) == 1
+        assert client.get(f"/uploads/{expired['id']}").json()["status"] == "aborted"
+        assert not os.path.exists(blob_store.part_path(expired["id"], 1))
+        assert os.path.exists(blob_store.part_path(live["id"], 1))
+
+    def test_deleting_workspace_discards_staged_parts(self, client, workspace_id):
+        from app.services.storage import blob_store
+        session = create_session(client, workspace_id)
+        client.put(f"/uploads/{session['id']}/parts/1", content=b"staged")
+        assert os.path.exists(blob_store.part_path(session["id"], 1))
+        assert client.delete(f"/workspaces/{workspace_id}").status_code == 204
+        assert not os.path.exists(blob_store.part_path(session["id"], 1))
+
+    def test_merging_workspaces_moves_upload_sessions(self, client, workspace_id):
+        from app.services.storage import blob_store
+        target = client.post("/workspaces/", json={"name": "Merge Target"}).json()["id"]
+        session = create_session(client, workspace_id)
+        client.put(f"/uploads/{session['id']}/parts/1", content=b"staged")
+        assert client.post("/workspaces/merge", json={"source_id": workspace_id, "target_id": target}).status_code == 200
+        assert os.path.exists(blob_store.part_path(session["id"], 1))
+
+        response = client.post(f"/uploads/{session['id']}/commit")
+        assert response.status_code == 201
+        assert response.json()["workspace_id"] == target